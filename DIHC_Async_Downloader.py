@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Async_Downloader.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 10:05 am
+"""
+
+
+""" Asynchronous nested file downloader from nested directories of a web directory
+
+This script contains a class that does the same job as DIHC_Downloader but on an asyncio event loop with the aiohttp
+client. Exploring the directories, finding the content types and downloading the files are all coroutines, so a single
+thread keeps hundreds of requests in flight while waiting on the round-trips to far away servers.
+The file type filters, folder indicators, credentials and the resume behaviour are the same as in DIHC_Downloader.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import asyncio
+import os
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from DIHC_Downloader import DIHC_Downloader
+from DIHC_File_Writer import move_file_in_place
+from DIHC_Retry import backoff_delay
+
+
+class AsyncDIHCDownloader(DIHC_Downloader):
+    """ Downloader class that does all the requests of DIHC_Downloader on an asyncio event loop
+
+    This class takes the same properties as DIHC_Downloader. Instead of worker threads it runs every request as a
+    coroutine and limits the number of requests in flight with a semaphore. It needs the optional aiohttp package.
+
+    Properties
+    -----------
+    Same as DIHC_Downloader
+    Optional
+    ---------
+    max_concurrency: int
+        Number of requests (header checks, directory listings and file downloads) in flight at the same time
+    bandwidth_limit: int
+        Total download rate in bytes per second (None for no limit)
+
+    Methods
+    --------
+    __init()__
+        Takes- Minimum two of the parameter values from above parameter list | Returns- Object of this class | Func-
+        Creates an object with the corresponding parameter values assigned to it
+    download()
+        Takes- optional max_concurrency | Returns- none | Func- Runs download_async() in a new event loop
+    download_async()
+        Takes- optional max_concurrency | Returns- none | Func- Coroutine that traverses thru the web directory
+        concurrently, downloads the files and sort them accordingly in the local download directory.
+    """
+
+
+    # ### For concurrent requests
+    # Number of requests in flight at the same time on the event loop
+    max_concurrency = 100
+    # Limits the requests in flight, created inside the running event loop
+    _semaphore = None
+
+    # ###
+    # ### Initialize url - optionally username & password if authenticatoin needed
+    # ###
+    def __init__(self, url_to_download, download_directory='./', username='', password='', file_types_to_download=[],
+                 file_types_not_to_download=[], folder_indicator=[], url_not_to_consider=[], is_need_html=False,
+                 max_concurrency=100, bandwidth_limit=None, include_paths=[], exclude_paths=[]):
+        """Creates an object with the corresponding parameter values assigned to it
+
+        Parameters
+        ----------
+        Same as DIHC_Downloader
+        Optional
+        ---------
+        max_concurrency: int
+            Number of requests (header checks, directory listings and file downloads) in flight at the same time
+        bandwidth_limit: int
+            Total download rate in bytes per second (None for no limit)
+        include_paths: list(str or re.Pattern)
+            Glob or regex ('re:...') rules on the relative paths of the files to download
+        exclude_paths: list(str or re.Pattern)
+            Rules of the paths not to download, the excluded directories are never listed
+
+        Returns
+        -------
+        object
+            Object of this current class
+
+        Examples
+        --------
+            url = 'https://www.physionet.org/files/chbmit/1.0.0/'
+            directory = './'
+            unusual_folders = ['1.0.0']
+            downloader = AsyncDIHCDownloader(url, download_directory=directory, folder_indicator=unusual_folders, max_concurrency=200)
+        """
+
+
+        if aiohttp is None:
+            raise ImportError('AsyncDIHCDownloader needs the aiohttp package, install it with "pip install aiohttp".')
+
+        super().__init__(url_to_download, download_directory=download_directory, username=username,
+                         password=password, file_types_to_download=file_types_to_download,
+                         file_types_not_to_download=file_types_not_to_download, folder_indicator=folder_indicator,
+                         url_not_to_consider=url_not_to_consider, is_need_html=is_need_html,
+                         bandwidth_limit=bandwidth_limit, include_paths=include_paths, exclude_paths=exclude_paths)
+
+        if max_concurrency and max_concurrency > 0:
+            self.max_concurrency = int(max_concurrency)
+
+    # ###
+    # ### Download all the enlisted files and explore directories if any
+    # ###
+    def download(self, max_concurrency=None):
+        """Runs download_async() in a new event loop. Use download_async() directly if an event loop is already
+        running (e.g. in a notebook).
+
+        Parameters
+        ----------
+        max_concurrency: int
+            Optional, number of requests in flight at the same time (overrides the value given at creation)
+
+        Returns
+        -------
+        None
+
+        Examples
+        --------
+            downloader.download()
+        """
+
+
+        asyncio.run(self.download_async(max_concurrency))
+
+    async def download_async(self, max_concurrency=None):
+        """Traverse thru the web directory concurrently to find the nested directories and their contents. Downloads
+        them and sort accordingly in the local download directory.
+
+        Parameters
+        ----------
+        max_concurrency: int
+            Optional, number of requests in flight at the same time (overrides the value given at creation)
+
+        Returns
+        -------
+        None
+
+        Examples
+        --------
+            await downloader.download_async()
+        """
+
+
+        if max_concurrency and max_concurrency > 0:
+            self.max_concurrency = int(max_concurrency)
+
+        print(
+            '\n########################################\n      Download begins...      \n########################################\n')
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        auth = None
+        if self.username:
+            auth = aiohttp.BasicAuth(self.username, self._password)
+
+        self.given_up = []
+        async with aiohttp.ClientSession(connector=connector, auth=auth) as session:
+            await self._process_download_async(session, self.url_to_download, self.download_directory)
+        self._report_given_up(('listing', 'file'))
+        print(
+            '\n########################################\nFinished with all downloads...\n########################################\n')
+        return
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Download the url if it is a file or explore all its contents concurrently if it is a directory
+    # ###
+    async def _process_download_async(self, session, specific_url, download_directory, listing_entry=None):
+        # ### The listing columns tell most of the content types, the headers are asked only when they do not
+        content_type = None
+        if listing_entry:
+            content_type = self._find_content_type_and_info_in_listing(specific_url, listing_entry)[0]
+        if content_type is None:
+            content_type = await self._find_content_type_of_the_url_async(session, specific_url)
+
+        # ### Checks for file/directory, ==1 means file and ==2 means excluded file
+        if (content_type != 0):
+            print('file...', specific_url)
+
+            path = os.path.relpath(download_directory + '/' + self._get_filename_from_url(specific_url),
+                                   self.download_directory).replace('\\', '/')
+            if (content_type == 1 and self._is_path_wanted(path, False)):
+                is_downloaded = await self._retry_async(
+                    lambda: self._download_specific_file_async(session, specific_url, download_directory),
+                    specific_url, 'file', 0)
+                self._report_download_result(specific_url, is_downloaded)
+        else:
+            print('directory...', specific_url)
+            loc = specific_url.rstrip('/').split('/')[-1]
+            if loc:
+                download_directory += '/' + loc
+            relative_directory = os.path.relpath(download_directory, self.download_directory).replace('\\', '/')
+            if not self._is_path_wanted(relative_directory, True):
+                return
+
+            listing_entries = await self._retry_async(
+                lambda: self._explore_and_show_all_files_and_directories_async(session, specific_url),
+                specific_url, 'listing', None)
+            listing_entries = self._filter_listing_entries(listing_entries or [], relative_directory)
+
+            if not os.path.exists(download_directory):
+                os.makedirs(download_directory, exist_ok=True)
+
+            await asyncio.gather(*[self._process_download_async(session, entry['url'], download_directory, entry)
+                                   for entry in listing_entries])
+            print('$$$ Finished downloading directory--- ', download_directory)
+
+    # ###
+    # ### Runs a request again after its backoff while it returns failed_result; a failed request sleeps on its own
+    # ### coroutine, the other transfers go on
+    # ###
+    async def _retry_async(self, request, url, kind, failed_result):
+        result = await request()
+
+        for attempt in range(self.max_retries):
+            if result != failed_result:
+                break
+            delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+            print('### Retrying {} in {:.1f} s (retry {} of {}) {}'.format(kind, delay, attempt + 1, self.max_retries,
+                                                                          url))
+            await asyncio.sleep(delay)
+            result = await request()
+
+        if result == failed_result:
+            self.given_up.append({'url': url, 'kind': kind, 'attempts': self.max_retries + 1})
+        return result
+
+    # ###
+    # ### Finds the type of the url is file or directory, =0 folder, =1 file & =2 excluded file
+    # ###
+    async def _find_content_type_of_the_url_async(self, session, content_url):
+        filename = self._get_filename_from_url(content_url)
+        is_the_url_a_file = self._find_content_type_by_name(filename)
+
+        try:
+            async with self._semaphore:
+                async with session.head(content_url, allow_redirects=False) as req:
+                    if req.status == 200:
+                        is_the_url_a_file = self._find_content_type_by_headers(filename, req.headers, is_the_url_a_file)
+                    else:
+                        print('Status code {}: Something went wrong getting header information.'.format(req.status))
+        except Exception:
+            print('Sorry, something went wrong getting header information.')
+
+        return is_the_url_a_file
+
+    # ###
+    # ### Explore all files and directories in specific web location, returns their listing entries (None if the
+    # ### request failed and can be retried)
+    # ###
+    async def _explore_and_show_all_files_and_directories_async(self, session, web_url):
+        listing_entries = []
+
+        try:
+            async with self._semaphore:
+                async with session.get(web_url) as req:
+                    if req.status == 200:
+                        web_page = await req.text()
+                    else:
+                        web_page = None
+                        print('Status code {}: Something went wrong during url request.'.format(req.status))
+                        if self._is_retryable_status(req.status):
+                            listing_entries = None
+
+            # Parsing a big listing is CPU work, keep it off the event loop
+            if web_page is not None:
+                loop = asyncio.get_running_loop()
+                listing_entries = await loop.run_in_executor(None, self._find_entries_in_web_page, web_url, web_page)
+        except Exception:
+            print('Sorry, something went wrong during url request.')
+            listing_entries = None
+
+        return listing_entries
+
+    # ###
+    # ### Download a specific file with url =1 complete, =2 already downloaded, =0 problem downloading
+    # ###
+    async def _download_specific_file_async(self, session, file_url, download_directory):
+        filename = download_directory + '/' + self._get_filename_from_url(file_url)
+
+        if (os.path.exists(filename)):
+            return 2
+
+        # ### Resuming file download, the If-Range validator makes a changed file come whole (200)
+        tmp_filename = filename + self._tmp_suffix
+        partial_state = self._load_partial_state(tmp_filename)
+        if partial_state and partial_state.get('segments'):
+            # The preallocated .tmp file of a segmented download can not be continued in one connection
+            self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+            partial_state = None
+        request_headers = None
+        resume_byte_pos = 0
+        if (os.path.exists(tmp_filename)):
+            # A preallocated .tmp file of the threaded engine has the full size, its state keeps the bytes written
+            resume_byte_pos = self._find_downloaded_size(tmp_filename, partial_state)
+        if resume_byte_pos > 0:
+            request_headers = self._make_range_headers(resume_byte_pos, None, partial_state)
+
+        try:
+            async with self._semaphore:
+                async with session.get(file_url, headers=request_headers) as req:
+                    # 416 with the downloaded size of the .tmp file means nothing is left to download
+                    if req.status == 416 and resume_byte_pos > 0:
+                        if self._find_content_range(req.headers)[1] != resume_byte_pos:
+                            print('Can not resume, the file will be downloaded again %s' % file_url)
+                            self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+                            return 0
+                        os.truncate(tmp_filename, resume_byte_pos)
+                    elif (req.status not in (200, 206) or
+                          (req.status == 206 and self._find_content_range(req.headers)[0] != resume_byte_pos)):
+                        print('Status code {}: Something went wrong downloading file.'.format(req.status))
+                        return 0
+                    else:
+                        # 206 continues the partial file, 200 means the server sent the whole file again
+                        file_writing_mode = 'ab' if req.status == 206 else 'wb'
+                        if file_writing_mode == 'wb' or partial_state is None:
+                            partial_state = {'size': None, 'etag': req.headers.get('ETag'),
+                                             'last_modified': req.headers.get('Last-Modified'), 'segments': None}
+                        # The .tmp file is cut at the resume position, so its size is the downloaded bytes from now on
+                        partial_state['downloaded'] = None
+                        self._save_partial_state(tmp_filename, partial_state)
+                        # The disk writes run on the writer thread; handing them over can wait for a free buffer, so
+                        # it runs off the event loop too
+                        loop = asyncio.get_running_loop()
+                        writer = self._open_file_writer(tmp_filename, resume_byte_pos if req.status == 206 else 0,
+                                                        None, None)
+                        try:
+                            async for data in req.content.iter_chunked(self.buffer_size):
+                                await loop.run_in_executor(None, writer.write, data)
+                                if self._bandwidth_bucket is not None:
+                                    await asyncio.sleep(self._bandwidth_bucket.reserve(len(data)))
+                        finally:
+                            await loop.run_in_executor(None, writer.close)
+        except Exception:
+            print('Sorry, something went wrong downloading file.')
+            return 0
+
+        self._remove_partial_state(tmp_filename)
+        move_file_in_place(tmp_filename, filename, self.fsync_policy != 'none')
+        return 1
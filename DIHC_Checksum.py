@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Checksum.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 5:10 pm
+"""
+
+
+""" Checksums of the downloaded files
+
+This script contains what the downloader needs to check the downloaded files against a checksum manifest like the
+SHA256SUMS.txt of the PhysioNet datasets. A streaming hasher takes the bytes of a file in order while they are written,
+so a downloaded file is not read back from the disk just to be hashed. The files already on the disk are hashed with
+hash_file(), which can run on a process pool.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import hashlib
+import threading
+
+
+# Size of the reads when a file (or the part of it not seen while writing) is hashed from the disk
+_read_size = 1024 ** 2
+
+
+# ###
+# ### Reads a checksum manifest
+# ###
+def parse_checksum_manifest(text):
+    """Reads a checksum manifest in the sha256sum format, one '<hex digest>  <path>' (or '<hex digest> *<path>') per
+    line
+
+    Parameters
+    ----------
+    text : str
+        Content of the manifest
+
+    Returns
+    -------
+    dict
+        {path relative to the manifest: lower case hex digest}
+    """
+
+
+    checksums = {}
+    for line in text.splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) != 2 or line.startswith('#'):
+            continue
+        digest, path = parts
+        path = path.strip()
+        if path.startswith('*'):
+            path = path[1:]
+        if path.startswith('./'):
+            path = path[2:]
+        checksums[path] = digest.lower()
+
+    return checksums
+
+
+# ###
+# ### Hash of a file on the disk
+# ###
+def hash_file(filename, algorithm='sha256'):
+    """Hash of a file on the disk, a module level function so it can run on a process pool
+
+    Parameters
+    ----------
+    filename : str
+        Path of the file
+    algorithm : str
+        Name of the hashlib algorithm
+
+    Returns
+    -------
+    str
+        Hex digest, None if the file can not be read
+    """
+
+
+    hasher = hashlib.new(algorithm)
+    try:
+        with open(filename, 'rb') as f:
+            buffer = bytearray(_read_size)
+            view = memoryview(buffer)
+            while True:
+                length = f.readinto(buffer)
+                if not length:
+                    break
+                hasher.update(view[:length])
+    except OSError:
+        return None
+
+    return hasher.hexdigest()
+
+
+class StreamingHasher:
+    """ Hasher of a file that takes the bytes in order while they are written
+
+    The writers pass every written block with its offset. A block that starts where the hash has reached is hashed
+    from memory; the blocks written ahead of it (the later segments of a segmented download) and the bytes already on
+    the disk before a resume are read from the file once, when the hash needs them.
+
+    Properties
+    -----------
+    algorithm : str
+        Name of the hashlib algorithm
+    position : int
+        Number of bytes hashed from the start of the file
+
+    Methods
+    --------
+    update()
+        Takes- offset, written bytes | Returns- none | Func- Hashes the bytes if they are the next ones
+    catch_up()
+        Takes- filename, end position | Returns- none | Func- Hashes the bytes from the disk up to the end position
+    hexdigest()
+        Takes- filename, size of the file | Returns- hex digest | Func- Hashes the rest of the file from the disk and
+        gives the digest
+    """
+
+
+    def __init__(self, algorithm='sha256'):
+        self.algorithm = algorithm
+        self.position = 0
+        self._hasher = hashlib.new(algorithm)
+        self._lock = threading.Lock()
+
+    def update(self, offset, data):
+        with self._lock:
+            if offset == self.position:
+                self._hasher.update(data)
+                self.position += len(data)
+
+    def catch_up(self, filename, end):
+        with self._lock:
+            if self.position >= end:
+                return
+            with open(filename, 'rb') as f:
+                f.seek(self.position)
+                while self.position < end:
+                    data = f.read(min(_read_size, end - self.position))
+                    if not data:
+                        break
+                    self._hasher.update(data)
+                    self.position += len(data)
+
+    def hexdigest(self, filename, size):
+        self.catch_up(filename, size)
+        with self._lock:
+            return self._hasher.hexdigest()
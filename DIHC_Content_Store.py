@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Content_Store.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 10:30 pm
+"""
+
+
+""" Content-addressed store of the downloaded files
+
+This script contains a local store that keeps one copy of every downloaded file by its content- its checksum (e.g.
+'sha256:<hex digest>' from a SHA256SUMS manifest) or, without a checksum, its ETag and size on a host. A file of
+another dataset root or version with the same key is linked into place (hardlink, reflink or copy) instead of being
+downloaded again. The store counts the local files referring to each of its objects; collect_garbage() drops the
+references of the files removed or replaced since and the objects nothing refers to any more.
+
+The objects are read-only. With link_mode='hardlink' a stored file and its object are the same inode, so the files
+linked from (or added to) the store are read-only too- an edit in place would change every dataset sharing them; copy
+such a file (or use link_mode 'reflink' or 'copy', whose files are independent and writable) before editing it.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import hashlib
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# ioctl of Linux that makes a file share the blocks of another (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+class ContentStore:
+    """ Store class that keeps the objects (one file per content) and their references in a directory
+
+    The objects are under '<directory>/objects/', the keys, objects and references in '<directory>/store.sqlite'. The
+    same object can have several keys (a checksum and an ETag). The same store can be used by several downloaders,
+    processes or dataset versions at once.
+
+    Properties
+    -----------
+    directory : str
+        Directory of the store
+    link_mode : str
+        How an object is put in place and how a file is stored- 'hardlink' (reflink, then copy if the store is on
+        another file system; the files share the read-only inode of their object), 'reflink' (copy if the file system
+        can not) or 'copy'
+
+    Methods
+    --------
+    __init()__
+        Takes- directory, optional link_mode | Returns- Object of this class | Func- Opens (or creates) the store
+    find()
+        Takes- list of keys | Returns- object id or None | Func- Object stored under any of the keys
+    link()
+        Takes- list of keys, filename | Returns- bool | Func- Puts the stored object in place of the file and refers
+        to it, False if none of the keys is stored
+    add()
+        Takes- list of keys, filename | Returns- object id | Func- Stores a downloaded file (linked, not copied, if
+        possible) under its keys and refers to it
+    release()
+        Takes- filename | Returns- none | Func- Drops the reference of a file
+    get_reference_count()
+        Takes- object id | Returns- int | Func- Number of files referring to the object
+    collect_garbage()
+        Takes- none | Returns- dict | Func- Drops the references of the files removed or replaced and the objects
+        without references
+    close()
+        Takes- none | Returns- none | Func- Closes the database
+    """
+
+
+    _link_modes = ('hardlink', 'reflink', 'copy')
+
+    # ###
+    # ### Open or create the store
+    # ###
+    def __init__(self, directory, link_mode='hardlink'):
+        """Opens (or creates) the store in a directory
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the store, created if missing
+        link_mode : str
+            'hardlink', 'reflink' or 'copy'
+
+        Returns
+        -------
+        object
+            Object of this current class
+
+        Examples
+        --------
+            store = ContentStore('/data/dihc_store')
+        """
+
+
+        if link_mode not in self._link_modes:
+            raise ValueError('Unknown link mode "{}", expected one of {}.'.format(link_mode, self._link_modes))
+        self.directory = os.path.abspath(directory)
+        self.link_mode = link_mode
+        os.makedirs(self.directory + '/objects', exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Waits for the other processes of the same store instead of failing on a locked database
+        self._connection = sqlite3.connect(self.directory + '/store.sqlite', timeout=60, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('create table if not exists objects (id text primary key, size integer, '
+                                     'reference_count integer)')
+            self._connection.execute('create table if not exists object_keys (key text primary key, id text)')
+            self._connection.execute('create table if not exists file_references (path text primary key, id text, '
+                                     'inode integer)')
+
+    def find(self, keys):
+        """Object stored under any of the keys
+
+        Parameters
+        ----------
+        keys : list(str)
+            Keys of the content, like- 'sha256:<hex digest>' or 'etag:<host>:<etag>:<size>'
+
+        Returns
+        -------
+        str
+            Object id, None if none of the keys is stored (or its object file is gone)
+        """
+
+
+        with self._lock:
+            return self._find_object(keys)
+
+    def link(self, keys, filename):
+        """Puts the stored object of the keys in place of the file (atomically) and records the reference
+
+        Parameters
+        ----------
+        keys : list(str)
+            Keys of the content
+        filename : str
+            Path of the file to create
+
+        Returns
+        -------
+        bool
+            True if the file was put in place, False if the content is not stored or could not be linked
+        """
+
+
+        with self._lock:
+            object_id = self._find_object(keys)
+            if object_id is None:
+                return False
+
+            filename = os.path.abspath(filename)
+            tmp_filename = filename + '.link.tmp'
+            try:
+                self._place_object(self._get_object_filename(object_id), tmp_filename, self.link_mode)
+                os.replace(tmp_filename, filename)
+            except OSError:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+                return False
+
+            with self._connection:
+                self._add_keys(keys, object_id)
+                self._add_reference(filename, object_id)
+            return True
+
+    def add(self, keys, filename):
+        """Stores a downloaded file under its keys and records the reference. The object is made by link_mode- a
+        hardlink of the file (no copy, the file becomes read-only with its object), or a reflink or copy of it (the
+        file stays writable and independent of the object). A file whose content is already stored only refers to the
+        stored object.
+
+        Parameters
+        ----------
+        keys : list(str)
+            Keys of the content
+        filename : str
+            Path of the complete file
+
+        Returns
+        -------
+        str
+            Object id, None if the file could not be stored
+        """
+
+
+        filename = os.path.abspath(filename)
+        with self._lock:
+            object_id = self._find_object(keys)
+            if object_id is None:
+                object_id = keys[0]
+                object_filename = self._get_object_filename(object_id)
+                os.makedirs(os.path.dirname(object_filename), exist_ok=True)
+                try:
+                    self._place_object(filename, object_filename + '.tmp', self.link_mode)
+                    # An object shared by several files must never be edited in place
+                    self._make_read_only(object_filename + '.tmp')
+                    os.replace(object_filename + '.tmp', object_filename)
+                except OSError:
+                    if os.path.exists(object_filename + '.tmp'):
+                        os.remove(object_filename + '.tmp')
+                    return None
+                with self._connection:
+                    self._connection.execute('insert or replace into objects (id, size, reference_count) '
+                                             'values (?, ?, 0)', (object_id, os.path.getsize(object_filename)))
+
+            with self._connection:
+                self._add_keys(keys, object_id)
+                self._add_reference(filename, object_id)
+            return object_id
+
+    def release(self, filename):
+        """Drops the reference of a file (e.g. before it is removed)
+
+        Parameters
+        ----------
+        filename : str
+            Path of the file
+
+        Returns
+        -------
+        None
+        """
+
+
+        with self._lock, self._connection:
+            self._remove_reference(os.path.abspath(filename))
+
+    def get_reference_count(self, object_id):
+        """Number of files referring to an object
+
+        Parameters
+        ----------
+        object_id : str
+            Id of the object (its first key)
+
+        Returns
+        -------
+        int
+        """
+
+
+        with self._lock:
+            row = self._connection.execute('select reference_count from objects where id = ?',
+                                           (object_id,)).fetchone()
+        return row[0] if row else 0
+
+    def collect_garbage(self):
+        """Drops the references of the files that were removed or replaced by another file since they were recorded,
+        then removes the objects (and their keys) no file refers to any more
+
+        Returns
+        -------
+        dict
+            {'references_removed', 'objects_removed', 'bytes_freed'}
+        """
+
+
+        results = {'references_removed': 0, 'objects_removed': 0, 'bytes_freed': 0}
+        with self._lock, self._connection:
+            for path, inode in self._connection.execute('select path, inode from file_references').fetchall():
+                try:
+                    is_stale = os.stat(path).st_ino != inode
+                except OSError:
+                    is_stale = True
+                if is_stale:
+                    self._remove_reference(path)
+                    results['references_removed'] += 1
+
+            for object_id, size in self._connection.execute('select id, size from objects where '
+                                                            'reference_count <= 0').fetchall():
+                try:
+                    os.remove(self._get_object_filename(object_id))
+                except OSError:
+                    pass
+                self._connection.execute('delete from object_keys where id = ?', (object_id,))
+                self._connection.execute('delete from objects where id = ?', (object_id,))
+                results['objects_removed'] += 1
+                results['bytes_freed'] += size or 0
+
+        return results
+
+    def close(self):
+        """Closes the database
+
+        Returns
+        -------
+        None
+        """
+
+
+        with self._lock:
+            self._connection.close()
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Object of the first stored key whose object file exists, the keys of a lost object file are forgotten
+    # ###
+    def _find_object(self, keys):
+        for key in keys:
+            row = self._connection.execute('select id from object_keys where key = ?', (key,)).fetchone()
+            if not row:
+                continue
+            if os.path.isfile(self._get_object_filename(row[0])):
+                return row[0]
+            with self._connection:
+                self._connection.execute('delete from object_keys where id = ?', (row[0],))
+                self._connection.execute('delete from objects where id = ?', (row[0],))
+        return None
+
+    def _add_keys(self, keys, object_id):
+        for key in keys:
+            self._connection.execute('insert or replace into object_keys (key, id) values (?, ?)', (key, object_id))
+
+    def _add_reference(self, filename, object_id):
+        row = self._connection.execute('select id from file_references where path = ?', (filename,)).fetchone()
+        if row and row[0] != object_id:
+            self._connection.execute('update objects set reference_count = reference_count - 1 where id = ?',
+                                     (row[0],))
+        if not row or row[0] != object_id:
+            self._connection.execute('update objects set reference_count = reference_count + 1 where id = ?',
+                                     (object_id,))
+        self._connection.execute('insert or replace into file_references (path, id, inode) values (?, ?, ?)',
+                                 (filename, object_id, os.stat(filename).st_ino))
+
+    def _remove_reference(self, filename):
+        row = self._connection.execute('select id from file_references where path = ?', (filename,)).fetchone()
+        if row:
+            self._connection.execute('update objects set reference_count = reference_count - 1 where id = ?',
+                                     (row[0],))
+            self._connection.execute('delete from file_references where path = ?', (filename,))
+
+    def _make_read_only(self, filename):
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+        os.chmod(filename, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def _get_object_filename(self, object_id):
+        digest = hashlib.sha1(object_id.encode('utf-8')).hexdigest()
+        return '{}/objects/{}/{}'.format(self.directory, digest[:2], digest)
+
+    # ###
+    # ### Makes the target a hardlink, reflink or copy of the source, falling back in that order; a reflink or copy
+    # ### keeps its own (default) permissions, so the copy of a read-only object is writable
+    # ###
+    def _place_object(self, source_filename, target_filename, link_mode):
+        if os.path.exists(target_filename):
+            os.remove(target_filename)
+        if link_mode == 'hardlink':
+            try:
+                os.link(source_filename, target_filename)
+                return
+            except OSError:
+                pass
+        if link_mode in ('hardlink', 'reflink') and fcntl is not None:
+            try:
+                with open(source_filename, 'rb') as source, open(target_filename, 'wb') as target:
+                    fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+                return
+            except OSError:
+                os.remove(target_filename)
+        shutil.copyfile(source_filename, target_filename)
+        source_stat = os.stat(source_filename)
+        os.utime(target_filename, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
@@ -22,12 +22,34 @@ been interrupted, if the download directory contains the already downloaded file
 """ Importing necessary modules
 """
 # #%%
-from tqdm import tqdm
 import requests
 # from requests.auth import HTTPDigestAuth
+from requests.adapters import HTTPAdapter
 import os
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+import codecs
+import csv
+import json
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, unquote, urlparse
+from DIHC_Checksum import StreamingHasher, hash_file, parse_checksum_manifest
+from DIHC_File_Writer import DIHC_File_Writer, preallocate_file, move_file_in_place
+from DIHC_Index import DIHC_Index
+from DIHC_Retry import CircuitBreaker, RetryScheduler, backoff_delay
+from DIHC_Throttle import HostLimiter, TokenBucket
+from DIHC_Path_Filter import PathFilter
+from DIHC_Metrics import DIHC_Metrics, FileProgress, JobProgress, NullProgress
+from DIHC_Tar_Shards import TarMemberSpool, TarShardWriter, read_tar_index
+from DIHC_Remote_File import BlockCache, RemoteFile
+from DIHC_Content_Store import ContentStore
+from DIHC_Scheduler import SCHEDULE_POLICIES, estimate_makespan, order_entries
+from DIHC_Mirrors import MirrorPool
+from DIHC_Listing_Parser import LISTING_PARSERS, SoupListingParser
 
 
 # The base url and base directory will be provided later
@@ -62,15 +84,127 @@ class DIHC_Downloader:
     is_need_html: bool
         If the web directory contains html file and instead of traversing thru the link to find folders, that html files
         are needed to be downloaded
+    max_workers: int
+        Number of files downloaded in parallel
+    crawl_workers: int
+        Number of urls (header checks and directory listings) explored in parallel while crawling
+    use_index: bool
+        Keeps a SQLite index (dihc_index.sqlite) in the download directory, so the next run only sends conditional
+        requests for the listings and skips the unchanged files without asking the server
+    listing_parser: str or class
+        Parser of the directory listings- 'stream' (default, reads the page chunk by chunk), 'soup' (BeautifulSoup) or
+        a class whose objects have feed(text_chunk) and close() returning the listing entries
+    segments: int
+        Number of connections a large file is downloaded with, in byte ranges, if the server accepts them
+    segment_threshold: int
+        Files of at least this size (in bytes) are downloaded in segments
+    buffer_size: int
+        Size (in bytes) of each read from the connection, written to the disk by a write-behind thread
+    fsync_policy: str
+        When the downloaded bytes are flushed to the disk- 'none' (default, left to the OS), 'file' (every finished
+        file before it is renamed from .tmp) or 'checkpoint' (also before every saved resume state)
+    max_connections_per_host: int
+        Requests open to the same host at most at the same time (0 for no limit)
+    bandwidth_limit: int
+        Total download rate of all the connections in bytes per second (None for no limit)
+    adaptive_concurrency: bool
+        Tunes the connections of each host up to max_connections_per_host- one more while the throughput improves,
+        fewer when the host answers 429/503 or its latency grows
+    max_retries: int
+        Retries of a failed directory listing, header check or file download; the failed ones wait in a delayed queue
+        for their backoff while the others go on, the urls given up on are listed at the end (given_up). Only the
+        failures worth a retry are retried- no response, 429 or a 5xx status (a file answering 404 fails at once)
+    retry_base_delay: float
+        Seconds of the first backoff, doubled for every retry with random jitter
+    verify_checksums: bool
+        Hashes the files while they are written and checks them against the checksum manifest, a corrupted file is
+        removed to be downloaded again on the next run
+    checksum_manifest: str
+        Local path or url of a checksum manifest (sha256sum format, paths relative to url_to_download); by default
+        the SHA256SUMS.txt files found in the crawl are used
+    metrics: object
+        Collector of the timers, counters and latency histograms of the requests, listing parsing, transfers, disk
+        writes and queue depths (DIHC_Metrics by default, NullMetrics to turn it off)
+    include_paths: list(str or re.Pattern)
+        Glob ('*', '**', '?', '[...]') or regex ('re:...') rules on the paths relative to url_to_download, only the
+        matching files are downloaded and the directories no rule can match under are never listed
+    exclude_paths: list(str or re.Pattern)
+        Rules of the same kind for the files and directories (with everything under them) not to download
+    metrics_file: str
+        File the metrics are exported to after every download, Prometheus text if it ends with .prom, JSON lines
+        otherwise
+    progress: str
+        'job' for one progress bar of the whole download, 'file' for one bar per file, None for no bar
+    shard_index: int
+        Shard of the files downloaded by this object (0 to num_shards - 1); every shard keeps its own manifest, index
+        and .tmp files, so several processes or machines can download into the same directory at once
+    num_shards: int
+        Number of shards the files of the crawl are split into (1- no sharding)
+    shard_by: str
+        'hash' of the relative path (a file stays in its shard when others are added) or 'size' (largest files first
+        to the shard with the fewest bytes, the shards must see the same crawl)
+    output_format: str
+        'files' (default) or 'tar'- the files up to tar_member_max_size are appended to tar shards (dihc-000000.tar,
+        ...) with an index of the shard and offset of every path (dihc-index.jsonl) instead of being created one by one;
+        DIHC_Tar_Shards.TarShardReader reads them back or recovers the nested layout
+    tar_shard_size: int
+        Size (in bytes) each tar shard is kept under (1 GB by default)
+    block_cache_directory: str
+        Directory of the block cache of open() on the disk (.dihc_block_cache in the download directory by default)
+    block_cache_size: int
+        Bytes of blocks the cache keeps on the disk, least recently used ones removed first (0- memory only)
+    content_store: str or ContentStore
+        Content-addressed store (or its directory) shared by several dataset roots or versions; a file whose checksum
+        (or ETag or listing mtime, and size at the same path of another version) is already stored is hardlinked (or
+        reflinked) into place instead of downloaded, and every downloaded file is added to it (not in the tar output).
+        The hardlinked files are read-only, like the objects they share the inode with.
+    schedule: str or function
+        Order the files are handed to the download workers once their sizes are known- 'path' (default, manifest
+        order), 'largest_first' (shortest total time of a parallel download, no big file left for the end),
+        'smallest_first' (most files done early) or a function of a manifest entry giving its priority (lower first);
+        the expected makespan of the order is reported before downloading (schedule_estimate)
+    directory_priorities: dict
+        {rule: priority} on the relative paths (rules as in include_paths), the files of the lowest priority are
+        downloaded first (0 for the files matching no rule), the schedule orders the files of the same priority
+    mirrors: list(str)
+        Base urls of mirrors serving the same tree as url_to_download; the files and the byte range segments are spread
+        over the origin and the mirrors by their measured throughput, a failing mirror is skipped and a mirror whose
+        sizes (or ETags) do not agree is left out. The directory listings come from url_to_download only.
 
     Methods
     --------
     __init()__
         Takes- Minimum two of the parameter values from above parameter list | Returns- Object of this class | Func-
         Creates an object with the corresponding parameter values assigned to it
+    crawl()
+        Takes- optional crawl_workers | Returns- list of manifest entries | Func- Explores the whole web directory
+        breadth-first and saves the manifest of the files (url, relative path, size, mtime) before downloading
+    iter_remote_entries()
+        Takes- optional crawl_workers | Returns- generator of manifest entries | Func- Yields every file as soon as its
+        listing is parsed, iterative traversal whose memory is bounded by the width of the tree, nothing saved or
+        downloaded
+    iter_downloads()
+        Takes- optional max_workers | Returns- generator of local paths | Func- Runs download() and yields the path of
+        every file as soon as it lands, so the processing of the files overlaps with the transfer
     download()
-        Takes- none | Returns- none | Func- Traverse thru the web directory to find the nested directories and their
+        Takes- optional max_workers | Returns- none | Func- Traverse thru the web directory to find the nested directories and their
         contents. Downloads them and sort accordingly in the local download directory.
+    verify()
+        Takes- optional processes, is_corrupted_removed | Returns- dict of ok/corrupted/missing paths | Func- Hashes
+        the downloaded files on a process pool and checks them against the checksum manifest without downloading
+    plan()
+        Takes- optional plan_file, throughput, probe_size | Returns- dict of the plan | Func- Dry run, crawls without
+        downloading the files and sums up their count and size per directory and extension, the part already
+        present locally and the ETA from the measured throughput; exports it as JSON or CSV
+    open()
+        Takes- remote path or url, optional block_size, read_ahead | Returns- read-only file-like object | Func- Reads a
+        remote file lazily with byte range requests thru a block cache, without downloading the whole file
+    merge_shards()
+        Takes- none | Returns- dict of the merged shards | Func- Merges the manifests and results saved by the shards
+        into the manifest and index of the whole download and lists the shards and files not done yet
+    probe_mirrors()
+        Takes- optional remote path, probe_size | Returns- dict by mirror | Func- Measures the latency and throughput of
+        the origin and every mirror on one file and leaves out the mirrors whose size of it differs
     """
 
 
@@ -94,15 +228,215 @@ class DIHC_Downloader:
     _url_not_to_consider = ['../', 'mailto:']
     # If anytime needed to download the HTML files without .html extension
     _is_need_html = False
+    # Glob/regex rules on the paths relative to url_to_download (like- 'chb0[1-5]/*.edf' / '*/_DOCS/**'), the excluded
+    # directories are never listed
+    include_paths = []
+    exclude_paths = []
+    _path_filter = PathFilter()
 
     # ### For session url management
     _download_session = None
+    # Each download worker keeps its own pooled session in here, and if the failure of its current file is worth a
+    # retry (False for a status like 404 or a checksum mismatch)
+    _thread_local = None
+
+    # ### For concurrent downloading
+    # Number of worker threads downloading files in parallel / One file at a time by default
+    max_workers = 1
+    # Connections kept alive in each session's pool
+    _pool_size = 4
+    # Crawled file urls waiting for a worker (bounded) and per-file results waiting to be reported
+    _file_queue = None
+    _result_queue = None
+    _workers = []
+
+    # ### For crawling
+    # Number of urls explored in parallel from the breadth-first frontier
+    crawl_workers = 8
+    # Files found by the last crawl, each entry- {'url', 'path' (relative to download directory), 'size', 'mtime'}
+    manifest = []
+    # The manifest is also saved in the download directory with this name
+    _manifest_filename = 'dihc_manifest.json'
+
+    # ### For reading the remote files lazily (open())
+    # Size (in bytes) of the blocks fetched with range requests and most blocks fetched ahead by a sequential read
+    block_size = 256 * 1024
+    read_ahead = 16
+    # Blocks are cached in memory up to _block_cache_memory_size and on the disk up to block_cache_size (0- memory only)
+    block_cache_directory = None
+    block_cache_size = 1024 ** 3
+    _block_cache_directory_name = '.dihc_block_cache'
+    _block_cache_memory_size = 64 * 1024 ** 2
+    _block_cache = None
+
+    # ### For sharing the files between dataset roots and versions
+    # Content-addressed store (DIHC_Content_Store.ContentStore), a file already stored under its checksum or ETag and
+    # size is linked into place instead of downloaded / None for no store
+    content_store = None
+    # Keys of the content of every file of the download by url
+    _content_keys = {}
+
+    # ### For the output of the downloaded files
+    # 'files'- every file in its directory, 'tar'- the files up to tar_member_max_size go into tar shards (with an index
+    # of their offsets) instead of being created one by one
+    output_format = 'files'
+    _output_formats = ('files', 'tar')
+    # Size (in bytes) a tar shard is kept under and largest file put into a shard, the larger ones are saved as files
+    tar_shard_size = 1024 ** 3
+    tar_member_max_size = 64 * 1024 ** 2
+    # Name of the shards ('dihc-000000.tar') and their index ('dihc-index.jsonl') in the download directory
+    _tar_prefix = 'dihc'
+    # A file is kept in memory up to this size before it goes into a shard, in a temporary file after
+    _tar_spool_size = 8 * 1024 ** 2
+    _tar_writer = None
+    # Files in the tar shards by relative path
+    _tar_members = {}
+
+    # ### For sharding a download between processes or machines writing to the same directory
+    # This object downloads the files of shard shard_index out of num_shards, split by 'hash' (of the path) or 'size'
+    # (the bytes balanced between the shards)
+    shard_index = 0
+    num_shards = 1
+    shard_by = 'hash'
+    _shard_by_policies = ('hash', 'size')
+    # Suffix of the files being downloaded, each shard has its own, so two shards never write the same .tmp file
+    _tmp_suffix = '.tmp'
+    # Files of a shard and their results are saved with this name after its download, merge_shards() reads them all
+    _shard_state_filename = 'dihc_shard_{}_of_{}.json'
+    # Result of every file of the last download by url- =1 downloaded, =2 already downloaded, =0 failed
+    _download_results = {}
+
+    # ### For the order of the downloads
+    # 'path' (manifest order), 'largest_first', 'smallest_first' or a function of a manifest entry (lower first)
+    schedule = 'path'
+    # {rule on the relative paths (as in include_paths): priority}, the lower priorities go first (0 for the others)
+    directory_priorities = {}
+    # Expected makespan of the last download by its order- {'makespan', 'lower_bound', 'efficiency', 'unit'}
+    schedule_estimate = None
+
+    # ### For spreading the downloads over mirrors
+    # Base urls of the mirrors of url_to_download, the file requests go to the one expected to serve them the soonest
+    mirrors = []
+    # Pool of the origin and the mirrors with their measured throughput (DIHC_Mirrors.MirrorPool) / None for no mirrors
+    _mirror_pool = None
+    # Size of every file by url (from the crawl or open()) and the ETag each mirror gave for it by (mirror, url), a
+    # mirror response that does not agree with them is not used
+    _mirror_file_sizes = {}
+    _mirror_etags = {}
+    _mirror_lock = None
+
+    # ### For streaming the completed files (iter_downloads())
+    # Local paths of the files done, given to the consumer as they land, and the path of every file by url
+    _completed_paths = None
+    _download_paths = {}
+    # Set when the consumer stops, the files not handed to the workers yet are left out
+    _is_stop_requested = False
+
+    # ### For incremental re-sync
+    # Keep the crawl/download index in the download directory
+    use_index = True
+    _index_filename = 'dihc_index.sqlite'
+    _index = None
+    # Files of the last crawl that changed on the server since they were indexed
+    _changed_urls = set()
+
+    # ### For reading the directory listings
+    # Name of the parser in DIHC_Listing_Parser.LISTING_PARSERS or a parser class
+    listing_parser = 'stream'
+    # Listing pages are read in chunks of this size (in bytes)
+    _listing_chunk_size = 64 * 1024
+
+    # ### For segmented downloading of large files
+    # Number of byte range segments (connections) per large file / One connection by default
+    segments = 1
+    # Minimum file size (in bytes) for segmented downloading and minimum size of a segment
+    segment_threshold = 64 * 1024 ** 2
+    _min_segment_size = 8 * 1024 ** 2
+    # Validators of a .tmp file and the completed bytes of every segment are saved in '<file>.tmp' + this suffix, so
+    # only the same version of the file is resumed and each segment resumes on its own
+    _partial_state_suffix = '.state'
+    # ### For politeness to the hosts and the network
+    # Requests open to the same host at most at the same time / 0 for no limit
+    max_connections_per_host = 8
+    # Total download rate in bytes per second / None for no limit
+    bandwidth_limit = None
+    # Tune the connections of each host by its throughput, 429/503 responses and latency
+    adaptive_concurrency = True
+    # Connection limiter of every host and the shared bandwidth token bucket
+    _host_limiters = {}
+    _host_limiters_lock = None
+    _bandwidth_bucket = None
+
+    # ### For retrying the failed requests
+    # Retries of a failed directory listing, header check or file download before giving up on it
+    max_retries = 3
+    # Seconds of the first backoff, doubled for every retry (with random jitter) up to the longest
+    retry_base_delay = 1.0
+    retry_max_delay = 60.0
+    # Failures in a row that pause the requests to a host, and for how many seconds at first
+    _breaker_failure_threshold = 5
+    _breaker_reset_timeout = 30.0
+    _circuit_breakers = {}
+    # Delayed queue of the failed tasks, retries done per (request, url) and files in the hands of the workers
+    _retry_scheduler = None
+    _retry_attempts = {}
+    _downloads_in_flight = 0
+    # Urls given up on after all their retries, each- {'url', 'kind' ('listing', 'header' or 'file'), 'attempts'}
+    given_up = []
+
+    # ### For checking the downloaded files
+    # Checks the files against the checksum manifest given or the SHA256SUMS files found in the crawl
+    verify_checksums = True
+    # Local path or url of a checksum manifest (sha256sum format) of the files under url_to_download
+    checksum_manifest = None
+    _checksum_filenames = ('SHA256SUMS.txt', 'SHA256SUMS')
+    _checksum_algorithm = 'sha256'
+    # Expected checksums by file url, streaming hashers of the .tmp files being downloaded
+    _checksums = {}
+    _hashers = {}
+
+    # ### For planning a download (dry run)
+    # Bytes downloaded from each probed file to measure the throughput, rows of each table printed
+    _probe_size = 8 * 1024 ** 2
+    _plan_rows_printed = 20
+
+    # ### For the metrics and the progress view
+    # Collector of the timers, counters and histograms (DIHC_Metrics, NullMetrics or any object with their methods)
+    metrics = None
+    # File the metrics are exported to after every download, Prometheus text if it ends with .prom, JSON lines otherwise
+    metrics_file = None
+    # 'job'- one progress bar for the whole download, 'file'- one bar per file, None- no bar
+    progress = 'job'
+    _progress_views = ('job', 'file', None)
+    _job_progress = None
+
+    # ### For writing the downloaded files
+    # Size (in bytes) of each read from the connection into a reusable buffer
+    buffer_size = 1024 ** 2
+    # Buffers in flight between the connection and the write-behind thread of each file
+    write_buffers = 4
+    # Reserve the disk space of files of known size before writing them
+    preallocate = True
+    # When the written bytes are flushed to the disk- 'none' (left to the OS), 'file' (every finished file before its
+    # rename) or 'checkpoint' (also before every saved .tmp state, so the state survives a power cut)
+    fsync_policy = 'none'
+    _fsync_policies = ('none', 'file', 'checkpoint')
+    # The state of a .tmp file is saved every time this many new bytes are written
+    _partial_state_save_interval = 8 * 1024 ** 2
 
     # ###
     # ### Initialize url - optionally username & password if authenticatoin needed
     # ###
     def __init__(self, url_to_download, download_directory='./', username='', password='', file_types_to_download=[],
-                 file_types_not_to_download=[], folder_indicator=[], url_not_to_consider=[], is_need_html=False):
+                 file_types_not_to_download=[], folder_indicator=[], url_not_to_consider=[], is_need_html=False,
+                 max_workers=1, crawl_workers=8, use_index=True, listing_parser='stream', segments=1,
+                 segment_threshold=64 * 1024 ** 2, buffer_size=1024 ** 2, fsync_policy='none',
+                 max_connections_per_host=8, bandwidth_limit=None, adaptive_concurrency=True, max_retries=3,
+                 retry_base_delay=1.0, verify_checksums=True, checksum_manifest=None, metrics=None, metrics_file=None,
+                 progress='job', include_paths=[], exclude_paths=[], shard_index=0, num_shards=1, shard_by='hash',
+                 output_format='files', tar_shard_size=1024 ** 3, block_cache_directory=None,
+                 block_cache_size=1024 ** 3, content_store=None, schedule='path', directory_priorities={},
+                 mirrors=[]):
         """Creates an object with the corresponding parameter values assigned to it
 
         Parameters
@@ -129,6 +463,69 @@ class DIHC_Downloader:
         is_need_html: bool
             If the web directory contains html file and instead of traversing thru the link to find folders, that html files
             are needed to be downloaded
+        max_workers: int
+            Number of files downloaded in parallel
+        crawl_workers: int
+            Number of urls (header checks and directory listings) explored in parallel while crawling
+        use_index: bool
+            Keeps a SQLite index in the download directory for incremental re-sync
+        listing_parser: str or class
+            Parser of the directory listings- 'stream', 'soup' or a parser class with feed() and close()
+        segments: int
+            Number of connections a large file is downloaded with, in byte ranges, if the server accepts them
+        segment_threshold: int
+            Files of at least this size (in bytes) are downloaded in segments
+        buffer_size: int
+            Size (in bytes) of each read from the connection, written to the disk by a write-behind thread
+        fsync_policy: str
+            When the downloaded bytes are flushed to the disk- 'none', 'file' or 'checkpoint'
+        max_connections_per_host: int
+            Requests open to the same host at most at the same time (0 for no limit)
+        bandwidth_limit: int
+            Total download rate of all the connections in bytes per second (None for no limit)
+        adaptive_concurrency: bool
+            Tunes the connections of each host up to max_connections_per_host by the throughput, 429/503 and latency
+        max_retries: int
+            Retries of a failed directory listing, header check or file download before giving up on it
+        retry_base_delay: float
+            Seconds of the first backoff, doubled for every retry with random jitter
+        verify_checksums: bool
+            Hashes the files while they are written and checks them against the checksum manifest
+        checksum_manifest: str
+            Local path or url of a checksum manifest (sha256sum format, paths relative to url_to_download)
+        metrics: object
+            Collector of the metrics (DIHC_Metrics by default, NullMetrics to turn it off)
+        metrics_file: str
+            File the metrics are exported to after every download (.prom- Prometheus text, otherwise JSON lines)
+        progress: str
+            'job', 'file' or None
+        include_paths: list(str or re.Pattern)
+            Glob or regex ('re:...') rules on the relative paths of the files to download, like- 'chb0[1-5]/*.edf'
+        exclude_paths: list(str or re.Pattern)
+            Rules of the paths not to download, like- '*/_DOCS/**', the excluded directories are never listed
+        shard_index: int
+            Shard of the files this object downloads, from 0 to num_shards - 1
+        num_shards: int
+            Number of shards the files are split into, one download (process or machine) per shard
+        shard_by: str
+            'hash' (of the relative path, stable whatever the other files) or 'size' (balances the bytes, needs the same
+            crawl in every shard)
+        output_format: str
+            'files' or 'tar' (the files up to 64 MB go into tar shards with an index instead of separate files)
+        tar_shard_size: int
+            Size (in bytes) each tar shard is kept under
+        block_cache_directory: str
+            Directory of the blocks read by open() on the disk (.dihc_block_cache in the download directory by default)
+        block_cache_size: int
+            Bytes of blocks kept in the block cache on the disk (0 for a memory only cache)
+        content_store: str or ContentStore
+            Directory (or object) of a content-addressed store shared by the dataset roots and versions
+        schedule: str or function
+            Order of the downloads- 'path', 'largest_first', 'smallest_first' or a priority function of an entry
+        directory_priorities: dict
+            {rule: priority} of the paths downloaded first (lower priority first), like- {'**/*.txt': -1}
+        mirrors: list(str)
+            Base urls serving the same tree as url_to_download, like- ['https://mirror.example.org/chbmit/1.0.0/']
 
         Returns
         -------
@@ -151,11 +548,23 @@ class DIHC_Downloader:
             username = 'nedc_tuh_eeg'
             password = 'nedc_tuh_eeg'
             downloader = DIHC_Downloader(url, download_directory=directory, username=username, password=password, folder_indicator=unusual_folders, url_not_to_consider=unusual_url)
+
+        Example-3:
+            url = 'https://www.physionet.org/files/chbmit/1.0.0/'
+            directory = './'
+            unusual_folders = ['1.0.0']
+            downloader = DIHC_Downloader(url, download_directory=directory, folder_indicator=unusual_folders, max_workers=8)
+
+        Example-4:
+            # On each of 4 machines sharing the directory, with its own shard_index
+            downloader = DIHC_Downloader(url, download_directory=directory, folder_indicator=unusual_folders, shard_index=0, num_shards=4)
         """
 
 
         self.url_to_download = url_to_download
-        self._download_session = requests.Session()
+        self._download_session = self._create_session()
+        self._thread_local = threading.local()
+        self._thread_local.session = self._download_session
         self._url_list = [url_to_download]
         self.download_directory = os.path.abspath(download_directory)
         if not(os.path.exists(self.download_directory)):
@@ -166,27 +575,250 @@ class DIHC_Downloader:
             self.username = username
         if password:
             self._password = password
+        # ### New lists, so the lists of the class (and of the other objects) are not extended
         if file_types_to_download:
-            self._file_types_to_download += file_types_to_download
+            self._file_types_to_download = self._file_types_to_download + list(file_types_to_download)
         if file_types_not_to_download:
-            self._file_types_not_to_download += file_types_not_to_download
+            self._file_types_not_to_download = self._file_types_not_to_download + list(file_types_not_to_download)
         if folder_indicator:
-            self._folder_indicator += folder_indicator
+            self._folder_indicator = self._folder_indicator + list(folder_indicator)
         if url_not_to_consider:
-            self._url_not_to_consider += url_not_to_consider
+            self._url_not_to_consider = self._url_not_to_consider + list(url_not_to_consider)
+        self.include_paths = list(include_paths or [])
+        self.exclude_paths = list(exclude_paths or [])
+        self._path_filter = PathFilter(self.include_paths, self.exclude_paths)
         if is_need_html:
             self._is_need_html = True
+        if max_workers and max_workers > 1:
+            self.max_workers = int(max_workers)
+        if crawl_workers and crawl_workers > 0:
+            self.crawl_workers = int(crawl_workers)
+        self.use_index = bool(use_index)
+        if isinstance(listing_parser, str) and listing_parser not in LISTING_PARSERS:
+            raise ValueError('Unknown listing parser "{}", expected one of {} or a parser class.'.format(
+                listing_parser, sorted(LISTING_PARSERS)))
+        self.listing_parser = listing_parser
+        if segments and segments > 1:
+            self.segments = int(segments)
+        if segment_threshold and segment_threshold > 0:
+            self.segment_threshold = int(segment_threshold)
+        if buffer_size and buffer_size > 0:
+            self.buffer_size = int(buffer_size)
+        if fsync_policy not in self._fsync_policies:
+            raise ValueError('Unknown fsync policy "{}", expected one of {}.'.format(fsync_policy,
+                                                                                     self._fsync_policies))
+        self.fsync_policy = fsync_policy
+        if progress not in self._progress_views:
+            raise ValueError('Unknown progress view "{}", expected one of {}.'.format(progress, self._progress_views))
+        self.progress = progress
+        self.metrics = metrics if metrics is not None else DIHC_Metrics()
+        self.metrics_file = metrics_file
+        if shard_by not in self._shard_by_policies:
+            raise ValueError('Unknown shard policy "{}", expected one of {}.'.format(shard_by, self._shard_by_policies))
+        if not 0 <= int(shard_index) < int(num_shards):
+            raise ValueError('Shard index {} is out of range for {} shards.'.format(shard_index, num_shards))
+        self.shard_index = int(shard_index)
+        self.num_shards = int(num_shards)
+        self.shard_by = shard_by
+        if self.num_shards > 1:
+            self._tmp_suffix = '.shard{}.tmp'.format(self.shard_index)
+        self._download_results = {}
+        if output_format not in self._output_formats:
+            raise ValueError('Unknown output format "{}", expected one of {}.'.format(output_format,
+                                                                                     self._output_formats))
+        self.output_format = output_format
+        if tar_shard_size and tar_shard_size > 0:
+            self.tar_shard_size = int(tar_shard_size)
+        self._tar_members = {}
+        self.block_cache_directory = block_cache_directory or (self.download_directory + '/'
+                                                               + self._block_cache_directory_name)
+        self.block_cache_size = max(0, int(block_cache_size or 0))
+        self._block_cache = None
+        if isinstance(content_store, str):
+            content_store = ContentStore(content_store)
+        self.content_store = content_store
+        self._content_keys = {}
+        if isinstance(schedule, str) and schedule not in SCHEDULE_POLICIES:
+            raise ValueError('Unknown schedule "{}", expected one of {} or a function.'.format(
+                schedule, sorted(SCHEDULE_POLICIES)))
+        self.schedule = schedule
+        self.directory_priorities = dict(directory_priorities or {})
+        self.schedule_estimate = None
+        self.mirrors = [mirror.rstrip('/') for mirror in (mirrors or []) if mirror.rstrip('/') !=
+                        url_to_download.rstrip('/')]
+        self._mirror_pool = MirrorPool([url_to_download.rstrip('/')] + self.mirrors) if self.mirrors else None
+        self._mirror_file_sizes = {}
+        self._mirror_etags = {}
+        self._mirror_lock = threading.Lock()
+        self.max_connections_per_host = max(0, int(max_connections_per_host or 0))
+        self.bandwidth_limit = bandwidth_limit
+        self.adaptive_concurrency = bool(adaptive_concurrency)
+        self._host_limiters = {}
+        self._host_limiters_lock = threading.Lock()
+        self._bandwidth_bucket = None
+        if bandwidth_limit:
+            self._bandwidth_bucket = TokenBucket(bandwidth_limit)
+        if max_retries is not None and max_retries >= 0:
+            self.max_retries = int(max_retries)
+        if retry_base_delay and retry_base_delay > 0:
+            self.retry_base_delay = float(retry_base_delay)
+        self._circuit_breakers = {}
+        self._retry_attempts = {}
+        self.given_up = []
+        self.verify_checksums = bool(verify_checksums)
+        self.checksum_manifest = checksum_manifest
+        self._checksums = {}
+        self._hashers = {}
+        self.manifest = []
+
+    # ###
+    # ### Explore all the directories and make the manifest of the files before downloading
+    # ###
+    def crawl(self, crawl_workers=None):
+        """Explores the whole web directory breadth-first, many urls at a time, and makes the manifest of the files to
+        be downloaded. The manifest is kept in this object and saved in the download directory, no file is downloaded.
+
+        Parameters
+        ----------
+        crawl_workers: int
+            Optional, number of urls explored in parallel (overrides the value given at creation)
+
+        Returns
+        -------
+        list(dict)
+            Manifest entries sorted by path- {'url': str, 'path': str relative to the download directory,
+            'size': int or None, 'mtime': float (epoch seconds) or None, 'etag': str or None}
+
+        Examples
+        --------
+            manifest = downloader.crawl()
+            print(len(manifest), sum(entry['size'] or 0 for entry in manifest))
+        """
+
+
+        print(
+            '\n########################################\n      Crawling begins...      \n########################################\n')
+        start_time = time.perf_counter()
+        is_index_opened = self._open_index()
+        try:
+            manifest = list(self.iter_remote_entries(crawl_workers))
+            manifest.sort(key=lambda entry: entry['path'])
+            if self._index:
+                self._changed_urls = set(self._index.save_files(manifest))
+        finally:
+            if is_index_opened:
+                self._close_index()
+
+        self.manifest = manifest
+        self.metrics.set_gauge('dihc_crawl_seconds', time.perf_counter() - start_time)
+        self.metrics.set_gauge('dihc_manifest_files', len(manifest))
+        self._save_manifest(manifest)
+        print('$$$ Found {} files to download'.format(len(manifest)))
+        return manifest
+
+    # ###
+    # ### Generator of the remote files, each one as soon as its listing is parsed
+    # ###
+    def iter_remote_entries(self, crawl_workers=None):
+        """Explores the web directory like crawl() and yields the manifest entry of every file as soon as it is found,
+        without keeping the manifest. The traversal is iterative (no recursion whatever the depth of the tree) and goes
+        breadth-first with a bounded number of urls in flight; the files are not kept once yielded. The memory is
+        bounded by the width of the tree, not by its number of files: the frontier holds the urls found and not
+        explored yet (up to a whole level of the tree) and the directory urls are remembered, to not explore a
+        directory twice. Nothing is saved or downloaded.
+
+        Parameters
+        ----------
+        crawl_workers: int
+            Optional, number of urls explored in parallel (overrides the value given at creation)
+
+        Yields
+        ------
+        dict
+            Manifest entry- {'url', 'path', 'size', 'mtime', 'etag'}, in the order the files are found
+
+        Examples
+        --------
+            for entry in downloader.iter_remote_entries():
+                print(entry['path'], entry['size'])
+        """
+
+
+        if crawl_workers and crawl_workers > 0:
+            self.crawl_workers = int(crawl_workers)
+
+        visited_urls = set(self._url_list)
+        is_index_opened = self._open_index()
+        self.given_up = []
+        self._retry_attempts = {}
+        self._retry_scheduler = RetryScheduler()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.crawl_workers) as executor:
+                # ### Breadth-first frontier of the urls waiting to be explored and the ones in flight; a failed url
+                # ### goes to the delayed queue of the retries, the others go on
+                waiting_tasks = deque()
+                pending = {}
+
+                def submit(task):
+                    if self._is_host_available(task[0], task):
+                        pending[executor.submit(self._crawl_url, *task)] = task
+
+                # The root is checked against the index as if its parent listing did not change
+                for url in self._url_list:
+                    waiting_tasks.append((url, '', True, None))
+                while waiting_tasks or pending or len(self._retry_scheduler):
+                    waiting_tasks.extend(self._retry_scheduler.pop_ready())
+                    while waiting_tasks and len(pending) < 2 * self.crawl_workers:
+                        submit(waiting_tasks.popleft())
+                    if not pending:
+                        time.sleep(self._retry_scheduler.time_to_next() or 0)
+                        continue
+
+                    self.metrics.set_gauge('dihc_crawl_frontier', len(pending) + len(waiting_tasks))
+                    done = wait(pending, timeout=self._retry_scheduler.time_to_next(),
+                                return_when=FIRST_COMPLETED)[0]
+                    for future in done:
+                        task = pending.pop(future)
+                        entry, children, failed_request = future.result()
+                        if failed_request:
+                            self._schedule_retry(task[0], failed_request, task)
+                            continue
+
+                        self._get_circuit_breaker(task[0]).record_success()
+                        if entry:
+                            yield entry
+                        if children:
+                            visited_urls.add(task[0])
+                        listing_urls = set()
+                        for child in children:
+                            child_url = child[0]
+                            if child_url in visited_urls or child_url in listing_urls:
+                                continue
+                            listing_urls.add(child_url)
+                            if child_url.endswith('/'):
+                                visited_urls.add(child_url)
+                            waiting_tasks.append(child)
+        finally:
+            if is_index_opened:
+                self._close_index()
+
+        self._report_given_up(('listing', 'header'))
 
     # ###
     # ### Download all the enlisted files and explore directories if any
     # ###
-    def download(self):
+    def download(self, max_workers=None):
         """Traverse thru the web directory to find the nested directories and their contents. Downloads them and sort
         accordingly in the local download directory.
 
+        The whole web directory is crawled first (see crawl()), then the files of the manifest are handed to a pool
+        of download workers thru a bounded queue.
+
         Parameters
         ----------
-        None
+        max_workers: int
+            Optional, number of files downloaded in parallel (overrides the value given at creation)
 
         Returns
         -------
@@ -195,295 +827,2385 @@ class DIHC_Downloader:
         Examples
         --------
             downloader.download()
+            downloader.download(max_workers=8)
         """
 
 
+        if max_workers and max_workers > 0:
+            self.max_workers = int(max_workers)
+
         print(
             '\n########################################\n      Download begins...      \n########################################\n')
-        self._process_download(self._url_list)
+        is_index_opened = self._open_index()
+        try:
+            manifest = self.crawl()
+            if self.verify_checksums:
+                self._load_checksums(manifest)
+            manifest = self._select_shard(manifest)
+            manifest = self._order_downloads(manifest)
+            self.schedule_estimate = self._estimate_makespan(manifest, self._find_known_throughput(), 0.0)
+            self._print_makespan(self.schedule_estimate)
+            if self.content_store is not None:
+                self._content_keys = {entry['url']: self._find_content_keys(entry) for entry in manifest}
+            if self._mirror_pool is not None:
+                self._mirror_file_sizes.update({entry['url']: entry['size'] for entry in manifest})
+                remaining_entries = [entry for entry in manifest if entry['size'] and not self._is_file_present(entry)]
+                if remaining_entries:
+                    self.probe_mirrors(max(remaining_entries, key=lambda entry: entry['size'])['url'])
+            if self.output_format == 'tar':
+                self._tar_writer = TarShardWriter(self.download_directory, self._get_tar_prefix(), self.tar_shard_size)
+                self._tar_members = self._tar_writer.members
+
+            start_time = time.perf_counter()
+            self._download_results = {}
+            received_size = self._find_received_size()
+            self._retry_scheduler = RetryScheduler()
+            if self.progress == 'job':
+                self._job_progress = JobProgress({entry['url']: entry['size'] for entry in manifest})
+            if self._completed_paths is not None:
+                self._download_paths = {entry['url']: entry['path'] for entry in manifest}
+            self._start_download_workers()
+            try:
+                for entry in manifest:
+                    if self._is_stop_requested:
+                        break
+                    self._submit_file_download(entry)
+                self._wait_for_downloads()
+            finally:
+                self._stop_download_workers()
+                if self._job_progress is not None:
+                    self._job_progress.close()
+                    self._job_progress = None
+        finally:
+            if self._tar_writer is not None:
+                self._tar_writer.close()
+                self._tar_writer = None
+            if is_index_opened:
+                self._close_index()
+        self._report_given_up(('file',))
+        if self.num_shards > 1:
+            self._save_shard_state(manifest)
+
+        # ### Throughput of the transfers of this download, the crawl left out
+        elapsed_time = time.perf_counter() - start_time
+        self.metrics.set_gauge('dihc_download_seconds', elapsed_time)
+        if elapsed_time > 0:
+            self.metrics.set_gauge('dihc_throughput_bytes_per_second',
+                                   (self._find_received_size() - received_size) / elapsed_time)
+        self._export_metrics()
         print(
             '\n########################################\nFinished with all downloads...\n########################################\n')
         return
 
+    # ###
+    # ### Generator of the local paths of the files, each one as soon as it is downloaded
+    # ###
+    def iter_downloads(self, max_workers=None):
+        """Runs download() on a background thread and yields the local path of every file as soon as it lands (or is
+        found already downloaded), so the processing of the first files overlaps with the transfer of the others. The
+        failed files are not yielded, see given_up. Closing the generator early (e.g. break) stops handing new files to
+        the workers and waits for the ones in flight.
+
+        Parameters
+        ----------
+        max_workers: int
+            Optional, number of files downloaded in parallel (overrides the value given at creation)
 
+        Yields
+        ------
+        str
+            Absolute path of the file; with output_format='tar' the path of a file in the tar shards is relative to the
+            download directory (read it with DIHC_Tar_Shards.TarShardReader)
+
+        Examples
+        --------
+            for filename in downloader.iter_downloads(max_workers=8):
+                extract_features(filename)
+        """
+
+
+        self._completed_paths = queue.Queue()
+        self._is_stop_requested = False
+        errors = []
+
+        def run_download():
+            try:
+                self.download(max_workers)
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                self._completed_paths.put(None)
+
+        download_thread = threading.Thread(target=run_download, name='DIHC_Download')
+        download_thread.daemon = True
+        download_thread.start()
+        try:
+            while True:
+                path = self._completed_paths.get()
+                if path is None:
+                    break
+                yield path
+        finally:
+            self._is_stop_requested = True
+            download_thread.join()
+            self._completed_paths = None
+            self._download_paths = {}
+            self._is_stop_requested = False
+        if errors:
+            raise errors[0]
 
-    # ######################################## Private methods zone ########################################
     # ###
-    # ### Download all the enlisted files and explore directories if any
+    # ### Check the files already downloaded against the checksum manifest
     # ###
-    def _process_download(self, url_list):
-        length_of_the_list = len(url_list)
-
-        while (length_of_the_list > 0):
-            specific_url = url_list[0]
-
-            content_type = self._find_content_type_of_the_url(specific_url)
-
-            # ### Checks for file/directory, ==1 means file
-            if (content_type == 1 or content_type == 3):
-                print('file...', specific_url)
-
-                if (content_type == 1):
-                    parser = urlparse(specific_url)
-                    filename = os.path.basename(parser.path)
-                    if filename.endswith('/'):
-                        filename = filename[:-1]
-                    if filename.startswith('/'):
-                        filename = filename[1:]
-                    filename = self.download_directory + '/' + filename
-
-                    is_downloaded = self._download_specific_file(specific_url)
-
-                    if (is_downloaded == 1):
-                        print('### Download successful %s' % specific_url)
-                        if os.path.exists((filename + '.tmp')):
-                            os.rename((filename + '.tmp'), filename)
-                    elif (is_downloaded == 2):
-                        print('$$$ Already downloaded %s' % specific_url)
-                    else:
-                        print('@@@ Problem downloading %s' % specific_url)
-                        # if os.path.exists((filename+'.tmp')):
-                        #    os.remove((filename+'.tmp'))
-
-                url_list.remove(specific_url)
-                length_of_the_list -= 1
-                # print('==>', len(url_list), length_of_the_list)
-
-                if len(url_list) == 0:
-                    res = self.download_directory.rfind('/', 0, len(self.download_directory))
-                    self.download_directory = self.download_directory[:res]
-                    print('$$$ Finished downloading directory--- ', self.download_directory)
-                    return
-                else:
-                    continue
+    def verify(self, processes=None, is_corrupted_removed=False):
+        """Verify-only mode, hashes the files already in the download directory on a process pool and compares them
+        with the checksum manifest (checksum_manifest if given, otherwise the SHA256SUMS files in the download
+        directory). Nothing is downloaded.
+
+        Parameters
+        ----------
+        processes: int
+            Optional, number of processes hashing the files (number of CPUs by default)
+        is_corrupted_removed: bool
+            Removes the corrupted files, so the next download() gets them again
+
+        Returns
+        -------
+        dict
+            {'ok': list, 'corrupted': list, 'missing': list} of the file paths relative to the download directory
+
+        Examples
+        --------
+            results = downloader.verify(processes=8)
+            print(results['corrupted'])
+        """
+
+
+        print(
+            '\n########################################\n      Verification begins...      \n########################################\n')
+        results = {'ok': [], 'corrupted': [], 'missing': []}
+        checksums = self._find_local_checksums()
+
+        present_paths = []
+        for path in sorted(checksums):
+            if os.path.isfile(self.download_directory + '/' + path):
+                present_paths.append(path)
             else:
-                print('directory...', specific_url)
-                temp_url = self._explore_and_show_all_files_and_directories(specific_url)
-                url_list.pop(0)
-                length_of_the_list = len(url_list)
+                results['missing'].append(path)
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            filenames = [self.download_directory + '/' + path for path in present_paths]
+            checksums_found = executor.map(hash_file, filenames, [self._checksum_algorithm] * len(filenames),
+                                           chunksize=16)
+            for path, checksum in zip(present_paths, checksums_found):
+                if checksum == checksums[path]:
+                    results['ok'].append(path)
+                else:
+                    print('@@@ Checksum does not match %s' % path)
+                    results['corrupted'].append(path)
+                    if is_corrupted_removed:
+                        os.remove(self.download_directory + '/' + path)
+
+        print('$$$ {} files correct, {} corrupted, {} missing'.format(len(results['ok']), len(results['corrupted']),
+                                                                    len(results['missing'])))
+        return results
+
+    # ###
+    # ### Dry run, what a download would transfer and how long it would take
+    # ###
+    def plan(self, plan_file=None, throughput=None, probe_size=None):
+        """Dry-run mode, crawls the web directory without downloading any file body and sums up the files to download
+        (after the file type filters) per directory and per extension, with the part of them already in the download
+        directory. The ETA comes from the throughput measured by downloading the first probe_size bytes of a few of the
+        remaining files in parallel (max_workers of them), the way download() would.
+
+        Parameters
+        ----------
+        plan_file: str
+            Optional, path to export the plan to, CSV if it ends with .csv, JSON otherwise
+        throughput: float
+            Optional, bytes per second to estimate the ETA with instead of measuring it
+        probe_size: int
+            Optional, bytes downloaded from each probed file to measure the throughput (8 MB by default, 0 to skip the
+            measurement)
 
-                # specific_url.strip(' /')
-                if specific_url.endswith('/'):
-                    specific_url = specific_url[:-1]
-                loc = (specific_url.split('/')[-1])
-                if loc:
-                    self.download_directory += '/' + loc
+        Returns
+        -------
+        dict
+            Plan- {'url_to_download', 'files', 'bytes', 'unknown_size_files', 'present_files', 'present_bytes',
+            'remaining_files', 'remaining_bytes', 'throughput' (bytes/s or None), 'latency' (seconds or None),
+            'eta' (seconds or None, the makespan of the files in the order of the schedule), 'makespan_efficiency'
+            (share of the time all the workers are busy), 'directories': {directory: totals}, 'extensions': {extension:
+            totals}}, the
+            totals of a directory or extension are {'files', 'bytes', 'present_files', 'present_bytes',
+            'remaining_bytes'}
 
-                if not os.path.exists(self.download_directory):
-                    os.mkdir(self.download_directory)
+        Examples
+        --------
+            plan = downloader.plan('./chbmit_plan.csv')
+            print(plan['remaining_bytes'] / 1024 ** 4, 'TB in', plan['eta'] / 3600, 'hours')
+        """
 
-                self._process_download(temp_url)
 
-        res = self.download_directory.rfind('/', 0, len(self.download_directory))
-        self.download_directory = self.download_directory[:res]
+        manifest = self._select_shard(self.crawl())
+        if self.output_format == 'tar':
+            self._tar_members = read_tar_index(self.download_directory, self._get_tar_prefix())
+        print(
+            '\n########################################\n      Planning begins...      \n########################################\n')
+        plan = self._make_plan(manifest)
+
+        latency = None
+        if throughput is None and probe_size != 0 and plan['remaining_files']:
+            throughput, latency = self._measure_throughput(manifest, probe_size or self._probe_size)
+        plan['throughput'] = throughput
+        plan['latency'] = latency
+        plan['eta'], plan['makespan_efficiency'] = None, None
+        if throughput:
+            makespan = self._estimate_makespan(self._order_downloads(manifest), throughput, latency or 0.0)
+            plan['eta'], plan['makespan_efficiency'] = makespan['makespan'], makespan['efficiency']
+
+        self._print_plan(plan)
+        if plan_file:
+            self._save_plan(plan, plan_file)
+        return plan
 
     # ###
-    # ### Finds the type of the url is file or directory, =0 folder, =1 file & =3 skip it
+    # ### Open a remote file for reading, only the parts read are fetched
     # ###
-    def _find_content_type_of_the_url(self, content_url):
-        is_the_url_a_file = 0
-        req = None
+    def open(self, remote_path, block_size=None, read_ahead=None):
+        """Opens a remote file as a read-only, seekable file-like object. Only the blocks read are fetched, with byte
+        range requests of the session (and credentials) of this object, and kept in an LRU block cache in memory and
+        on the disk shared by all the opened files; sequential reads fetch the next blocks ahead.
 
-        urlparser = urlparse(content_url)
-        filename = os.path.basename(urlparser.path)
-        if filename.endswith('/'):
-            filename = filename[:-1]
-        if filename.startswith('/'):
-            filename = filename[1:]
-        # filename.strip(' /')
-        # print(content_url, filename)
+        Parameters
+        ----------
+        remote_path: str
+            Path of the file relative to url_to_download (e.g. 'chb01/chb01_01.edf') or its url (e.g. the url of a
+            manifest entry)
+        block_size: int
+            Optional, size (in bytes) of the blocks fetched and cached (256 KB by default)
+        read_ahead: int
+            Optional, most blocks fetched in one request while the file is read sequentially (16 by default)
 
-        if (not filename):
-            pass
+        Returns
+        -------
+        DIHC_Remote_File.RemoteFile
+            File-like object with read(), readinto(), seek(), tell() and size; OSError if the file can not be opened
 
-        elif (any(x in filename for x in self._folder_indicator)):
-            pass
+        Examples
+        --------
+            with downloader.open('chb01/chb01_01.edf') as f:
+                header = f.read(256)
+                f.seek(256 * (int(header[252:256]) + 1))
+        """
 
-        elif (any(x in filename for x in self._file_types_not_to_download)):
-            is_the_url_a_file = 2
+
+        if '://' in remote_path:
+            file_url = remote_path
         else:
-            if (len(self._file_types_to_download) == 1):
-                is_the_url_a_file = 1
-            elif (len(self._file_types_to_download) > 1 and any(x in filename for x in self._file_types_to_download[1:])):
-                is_the_url_a_file = 1
-            else:
-                pass
+            file_url = self.url_to_download.rstrip('/') + '/' + quote(remote_path.lstrip('/'))
 
+        req = None
         try:
-            if not (self.username and self._password):
-                req = self._download_session.head(content_url, stream=True)
+            req = self._send_request('HEAD', file_url, {'Accept-Encoding': 'identity'}, request_type='head')
+            if req.status_code != 200:
+                raise OSError('Status code {}: the remote file can not be opened {}'.format(req.status_code, file_url))
+            file_info = self._find_file_info_in_headers(req.headers)
+        finally:
+            if req is not None:
+                self._close_response(req)
+        if file_info['size'] is None:
+            raise OSError('The size of the remote file is unknown {}'.format(file_url))
+
+        if self._block_cache is None:
+            self._block_cache = BlockCache(self._block_cache_memory_size,
+                                           self.block_cache_directory if self.block_cache_size else None,
+                                           self.block_cache_size)
+        version = file_info['etag'] or '{}:{}'.format(file_info['size'], file_info['mtime'])
+        self._mirror_file_sizes[file_url] = file_info['size']
+
+        def fetch_range(start, end):
+            return self._fetch_file_range(file_url, start, end, file_info['etag'])
+
+        return RemoteFile(file_url, file_info['size'], fetch_range, block_size or self.block_size,
+                          read_ahead or self.read_ahead, self._block_cache, version, self.metrics)
+
+    # ###
+    # ### Merge the results of the shards of a sharded download
+    # ###
+    def merge_shards(self):
+        """Merges the shard files (dihc_shard_<i>_of_<n>.json) saved in the download directory by the download() of
+        every shard into the manifest (dihc_manifest.json) and the index of the whole download, as if one object had
+        downloaded everything. Run it once all the shards are done, from any of them; num_shards tells how many are
+        expected.
+
+        Returns
+        -------
+        dict
+            {'num_shards', 'missing_shards': list of shard indexes not saved yet, 'files', 'complete', 'failed': list
+            of the urls not downloaded}
+
+        Examples
+        --------
+            downloader = DIHC_Downloader(url, download_directory=directory, num_shards=4)
+            summary = downloader.merge_shards()
+            print(summary['missing_shards'], summary['failed'])
+        """
+
+
+        summary = {'num_shards': self.num_shards, 'missing_shards': [], 'files': 0, 'complete': 0, 'failed': []}
+        manifest, results = [], {}
+        for shard_index in range(self.num_shards):
+            shard_file = self.download_directory + '/' + self._shard_state_filename.format(shard_index,
+                                                                                            self.num_shards)
+            try:
+                with open(shard_file) as f:
+                    shard_state = json.load(f)
+            except (OSError, ValueError):
+                summary['missing_shards'].append(shard_index)
+                continue
+            manifest.extend(shard_state['files'])
+            results.update(shard_state['results'])
+
+        manifest.sort(key=lambda entry: entry['path'])
+        for entry in manifest:
+            if results.get(entry['url']) in (1, 2):
+                summary['complete'] += 1
             else:
-                req = self._download_session.head(content_url, auth=(self.username, self._password), stream=True)
+                summary['failed'].append(entry['url'])
+        summary['files'] = len(manifest)
+
+        # ### Manifest and index of the whole download, written by a single (unsharded) view of this object
+        shard_index, num_shards = self.shard_index, self.num_shards
+        self.shard_index, self.num_shards = 0, 1
+        try:
+            self._save_manifest(manifest)
+            is_index_opened = self._open_index()
+            if self._index:
+                self._index.save_files(manifest)
+                for entry in manifest:
+                    is_complete = results.get(entry['url']) in (1, 2)
+                    self._index.set_file_state(entry['url'], DIHC_Index.STATE_COMPLETE if is_complete
+                                               else DIHC_Index.STATE_FAILED)
+            if is_index_opened:
+                self._close_index()
+        finally:
+            self.shard_index, self.num_shards = shard_index, num_shards
+
+        print('$$$ Merged {} of {} shards- {} files, {} complete, {} not downloaded'.format(
+            self.num_shards - len(summary['missing_shards']), self.num_shards, summary['files'], summary['complete'],
+            len(summary['failed'])))
+        if summary['missing_shards']:
+            print('@@@ Shards not done yet: %s' % summary['missing_shards'])
+        return summary
+
+    # ###
+    # ### Latency, throughput and consistency of the origin and the mirrors
+    # ###
+    def probe_mirrors(self, remote_path=None, probe_size=1024 ** 2):
+        """Asks the origin and every mirror for the headers of one file and its first probe_size bytes, one after the
+        other, to measure their latency and throughput; the downloads start from these measures instead of spreading
+        evenly. A mirror whose size (Content-Length) of the file differs from the origin's is left out of the download.
+        download() calls it with the largest remaining file once the crawl is done.
+
+        Parameters
+        ----------
+        remote_path: str
+            Optional, path of the file relative to url_to_download or its url on the origin (the largest file of the
+            last crawl by default)
+        probe_size: int
+            Optional, bytes downloaded from each mirror to measure its throughput (1 MB by default)
+
+        Returns
+        -------
+        dict
+            {base url: {'latency' (seconds), 'throughput' (bytes/s), 'size', 'etag', 'is_consistent'}}, None for the
+            values of a mirror that did not answer
+
+        Examples
+        --------
+            downloader = DIHC_Downloader(url, download_directory=directory, mirrors=[mirror_url])
+            for mirror, result in downloader.probe_mirrors('chb01/chb01_01.edf').items():
+                print(mirror, result['throughput'], result['is_consistent'])
+        """
 
-            # print('Web url:', req.status_code, content_url)
-            if req.status_code == 200:
-                try:
-                    if (req.headers['Content-Encoding'].find('gzip') != -1 and req.headers['Content-Type'].find(
-                            'html') != -1):
-                        # print('-------> possibly folder')
-                        if (self._is_need_html or filename.find('html') != -1 or filename.find('htm') != -1):
-                            # print('-------> thought as folder but is file')
-                            is_the_url_a_file = 1
-                    else:
-                        # print('-------> file')
-                        is_the_url_a_file = 1
-                        # content_type = (req.headers['Content-Type'].split(';'))[0]
-                        # if (content_type.find('plain') != -1 or content_type.find('application') != -1):
-                        #    is_the_url_a_file = 1
-                except:
-                    print('File type in server not found.')
 
+        if self._mirror_pool is None:
+            return {}
+        if remote_path is None:
+            known_files = [(size, url) for url, size in self._mirror_file_sizes.items() if size]
+            if not known_files:
+                raise ValueError('No file to probe the mirrors with, crawl() first or give a remote path.')
+            file_url = max(known_files)[1]
+        elif '://' in remote_path:
+            file_url = remote_path
+        else:
+            file_url = self.url_to_download.rstrip('/') + '/' + quote(remote_path.lstrip('/'))
+
+        # ### The origin is probed first, its size is the one the mirrors must agree with if the crawl did not tell
+        results = {}
+        expected_size = self._mirror_file_sizes.get(file_url)
+        for mirror in self._mirror_pool.base_urls:
+            results[mirror] = self._probe_mirror(mirror, file_url, expected_size, probe_size)
+            if expected_size is None:
+                expected_size = results[mirror]['size']
+
+            result = results[mirror]
+            if result['size'] is None:
+                print('@@@ Mirror not answering {}'.format(mirror))
+            elif not result['is_consistent']:
+                print('@@@ Mirror left out, its size of the file {} is not {} {}'.format(result['size'], expected_size,
+                                                                                       mirror))
             else:
-                print('Status code {}: Something went wrong getting header information.'.format(req.status_code, req))
-        except:
-            print('Sorry, something went wrong getting header information.')
+                print('$$$ Mirror {:.2f} MB/s, {:.0f} ms latency {}'.format((result['throughput'] or 0) / 1024 ** 2,
+                                                                          result['latency'] * 1000, mirror))
+        return results
 
-        if req:
-            req.close()
 
-        return (is_the_url_a_file)
 
+    # ######################################## Private methods zone ########################################
     # ###
-    # ### Explore and display all files and directories in specific web location
+    # ### Explores one url of the frontier, returns its manifest entry if it is a file or its contents if a directory,
+    # ### and the request that failed and can be retried ('header' or 'listing') if any
     # ###
-    def _explore_and_show_all_files_and_directories(self, web_url):
-        new_url_list = []
-        req = None
+    def _crawl_url(self, specific_url, relative_directory, is_parent_unchanged=False, listing_entry=None):
+        # ### Urls of an unchanged listing are taken from the index, the others from the listing columns if possible,
+        # ### the server is asked for the headers only when both do not tell
+        content_type, file_info = None, None
+        if self._index and is_parent_unchanged:
+            content_type, file_info = self._find_content_type_and_info_in_index(specific_url)
+        if content_type is None and listing_entry:
+            content_type, file_info = self._find_content_type_and_info_in_listing(specific_url, listing_entry)
+        if content_type is None:
+            content_type, file_info = self._find_content_type_and_info_of_the_url(specific_url)
+            if content_type is None:
+                return None, [], 'header'
+
+        # ### Checks for file/directory, ==1 means file
+        if (content_type == 1 or content_type == 3):
+            self._print_file_line('file...', specific_url)
+            entry = None
+            path = self._join_relative_path(relative_directory, self._get_filename_from_url(specific_url))
+            if (content_type == 1 and self._is_path_wanted(path, False)):
+                entry = {'url': specific_url, 'path': path, 'size': file_info['size'], 'mtime': file_info['mtime'],
+                         'etag': file_info['etag']}
+            return entry, [], None
+
+        self._print_file_line('directory...', specific_url)
+        loc = specific_url
+        # specific_url.strip(' /')
+        if loc.endswith('/'):
+            loc = loc[:-1]
+        relative_directory = self._join_relative_path(relative_directory, loc.split('/')[-1])
+        if not self._is_path_wanted(relative_directory, True):
+            return None, [], None
+        listing_entries, is_unchanged, is_failed = self._explore_directory(specific_url, relative_directory)
+        if is_failed:
+            return None, [], 'listing'
+        listing_entries = self._filter_listing_entries(listing_entries, relative_directory)
+
+        return None, [(entry['url'], relative_directory, is_unchanged, entry) for entry in listing_entries], None
 
-        try:
-            if (not self.username):
-                req = self._download_session.get(web_url, stream=True)
+    # ###
+    # ### If the include/exclude rules let a path (relative to the download directory) thru; the first part of the path
+    # ### is the directory of url_to_download, the rules are on the rest of it
+    # ###
+    def _is_path_wanted(self, path, is_directory):
+        if not self._path_filter:
+            return True
+
+        root_directory = self._find_root_directory()
+        if root_directory and (path == root_directory or path.startswith(root_directory + '/')):
+            path = path[len(root_directory) + 1:]
+        path = unquote(path)
+        if is_directory:
+            return self._path_filter.is_directory_wanted(path)
+        return self._path_filter.is_file_wanted(path)
+
+    # ###
+    # ### Listing entries the include/exclude rules let thru, a pruned directory is never requested; an entry of
+    # ### unknown type is kept if it is wanted as a file or as a directory
+    # ###
+    def _filter_listing_entries(self, listing_entries, relative_directory):
+        if not self._path_filter:
+            return listing_entries
+
+        wanted_entries = []
+        for entry in listing_entries:
+            path = self._join_relative_path(relative_directory, urlparse(entry['url']).path.rstrip('/').split('/')[-1])
+            if entry['is_dir'] is None:
+                is_wanted = self._is_path_wanted(path, False) or self._is_path_wanted(path, True)
             else:
-                req = self._download_session.get(web_url, auth=(self.username, self._password), stream=True)
+                is_wanted = self._is_path_wanted(path, entry['is_dir'])
 
-            if req.status_code == 200:
-                web_page = req.text
+            if is_wanted:
+                wanted_entries.append(entry)
+            else:
+                self.metrics.increment('dihc_pruned_total', kind='directory' if entry['is_dir'] else 'file')
+        return wanted_entries
 
-                if not web_url.endswith('/'):
-                    web_url += '/'
+    # ###
+    # ### Content type and file information of an already indexed url, (None, None) if it is not indexed
+    # ###
+    def _find_content_type_and_info_in_index(self, content_url):
+        if self._index.get_listing(content_url):
+            return 0, None
 
-                soup = BeautifulSoup(web_page, 'html.parser')
-                urls_from_webpage = [web_url + node.get('href') for node in soup.find_all('a')]
+        indexed_file = self._index.get_file(content_url)
+        if indexed_file:
+            return 1, {'size': indexed_file['size'], 'mtime': indexed_file['mtime'], 'etag': indexed_file['etag']}
 
-                for node in urls_from_webpage:
-                    # Test for text files only
-                    # if (node.find('.txt')>0 or (node.endswith('/') and not node.endswith('../'))):
-                    if (node.count('//') == 1 and not any(x in node for x in self._url_not_to_consider)):
-                        new_url_list.append(node)
-            else:
-                print('Status code {}: Something went wrong during url request.'.format(req.status_code, req))
+        return None, None
 
-        except:
-            print('Sorry, something went wrong during url request.')
+    # ###
+    # ### Content type and file information from the listing the url was found in, =0 folder, =1 file & =3 skip it
+    # ### (file not to download), (None, None) if the listing does not tell
+    # ###
+    def _find_content_type_and_info_in_listing(self, content_url, listing_entry):
+        if listing_entry['is_dir'] is None:
+            return None, None
+        if listing_entry['is_dir']:
+            return 0, None
 
-        if req:
-            req.close()
+        filename = self._get_filename_from_url(content_url)
+        is_the_url_a_file = 1
+        if (any(x in filename for x in self._file_types_not_to_download)):
+            is_the_url_a_file = 3
+        elif (len(self._file_types_to_download) > 1 and not any(x in filename for x in self._file_types_to_download[1:])):
+            is_the_url_a_file = 3
 
-        return new_url_list
+        return is_the_url_a_file, {'size': listing_entry['size'], 'mtime': listing_entry['mtime'], 'etag': None}
 
     # ###
-    # ### Download a specific file with url with its progress report =1 complete, =2 already downloaded, =0 problem downloading
+    # ### Explores a directory, conditionally if it is indexed; returns its listing entries, if it did not change and if
+    # ### the request failed and can be retried
     # ###
-    def _download_specific_file(self, file_url):
-        is_download_complete = 0
-        req = None
+    def _explore_directory(self, web_url, relative_directory):
+        if not self._index:
+            status_code, listing_entries = self._request_directory_listing(web_url)[:2]
+            return listing_entries, False, self._is_retryable_status(status_code)
+
+        listing = self._index.get_listing(web_url)
+        request_headers = {}
+        if listing and listing['etag']:
+            request_headers['If-None-Match'] = listing['etag']
+        if listing and listing['last_modified']:
+            request_headers['If-Modified-Since'] = listing['last_modified']
+
+        status_code, listing_entries, response_headers, digest = self._request_directory_listing(web_url,
+                                                                                                 request_headers)
+        if status_code == 304 and listing:
+            return listing['children'], True, False
+        if status_code != 200:
+            return listing_entries, False, self._is_retryable_status(status_code)
+
+        # ### Servers without validators still tell an unchanged listing by its digest
+        is_unchanged = bool(listing) and listing['digest'] == digest
+        self._index.save_listing(web_url, relative_directory, response_headers.get('ETag'),
+                                 response_headers.get('Last-Modified'), digest, listing_entries)
+        return listing_entries, is_unchanged, False
 
-        parser = urlparse(file_url)
-        filename = os.path.basename(parser.path)
-        if filename.endswith('/'):
-            filename = filename[:-1]
-        if filename.startswith('/'):
-            filename = filename[1:]
-        # filename = filename.strip(' /')
-        filename2 = self.download_directory + '/' + filename
+    # ###
+    # ### Opens the index of the download directory if needed, True if it was opened here
+    # ###
+    def _open_index(self):
+        if not self.use_index or self._index:
+            return False
 
         try:
-            if (not self.username):
-                req2 = self._download_session.head(file_url, stream=True)
-            else:
-                req2 = self._download_session.head(file_url, auth=(self.username, self._password), stream=True)
+            self._index = DIHC_Index(self.download_directory + '/' + self._get_shard_filename(self._index_filename))
+        except Exception:
+            print('Sorry, the index could not be opened, everything will be crawled again.')
+            self._index = None
+            return False
+        return True
+
+    def _close_index(self):
+        if self._index:
+            self._index.close()
+            self._index = None
 
-            if req2.status_code == 200:
-                chunk_size = 1024  # in bytes
-                total_size = 0
+    # ###
+    # ### Failed requests worth retrying- no response, too many requests or a server error
+    # ###
+    def _is_retryable_status(self, status_code):
+        return status_code == 0 or status_code == 429 or status_code >= 500
 
-                # ### Resuming file download
-                # accept_ranges = None
-                resume_header = None
-                resume_byte_pos = 0
-                try:
-                    # accept_ranges = req2.headers['Accept-Ranges']
-                    if (os.path.exists(filename2 + '.tmp')):
-                        resume_byte_pos = os.path.getsize(filename2 + '.tmp')
-                        resume_header = {'Range': 'bytes={}-'.format(resume_byte_pos)}
-                        # print('&&&& ', resume_byte_pos, resume_header)
-                except:
-                    print('Sorry, file download is not resumable in this server.')
+    # ###
+    # ### Notes for the worker if the failure of its current file is worth a retry, by the status code of the response
+    # ### (None- the file itself is wrong, e.g. its checksum)
+    # ###
+    def _record_failed_status(self, status_code):
+        self._thread_local.is_failure_retryable = status_code is not None and self._is_retryable_status(status_code)
 
-                try:
-                    total_size = int(req2.headers['content-length'])
-                except:
-                    print('File size in server not found.')
-                    total_size = 0
-
-                if (not self.username):
-                    req = self._download_session.get(file_url, headers=resume_header, stream=True)
-                    # req = self._download_session.get(file_url, stream=True)
-                else:
-                    req = self._download_session.get(file_url, auth=(self.username, self._password),
-                                                     headers=resume_header, stream=True)
-                    # req = self._download_session.get(file_url, auth=(self.username, self._password), stream=True)
-
-                tqdm_description = 'Downloading \"' + filename + '\"'
-                tqdm_task = tqdm(iterable=req.iter_content(chunk_size=chunk_size), total=total_size / chunk_size,
-                                 unit='KB', desc=tqdm_description)
-
-                filename = filename2  # self.download_directory+'/'+filename
-                # print('$$$-> ', filename, ' ', total_size, ' ', file_url)
-
-                if (os.path.exists(filename)):
-                    is_download_complete = 2
-                    tqdm_task.update(total_size / chunk_size)
-                    # print(filename, ' ', total_size, " ", (os.stat(filename).st_size))
-                    # print('Already downloaded!')
-                elif ((not os.path.exists(filename) and not os.path.exists(filename + '.tmp')) or (
-                        os.path.exists(filename + '.tmp'))):
-                    try:
-                        # print('Downloading...')
-                        file_writing_mode = 'ab'
-                        # if resume_byte_pos==0:
-                        #    file_writing_mode = 'wb'
-                        print('&&&&&', resume_byte_pos, filename + '.tmp')
-                        current_data_byte = 0
-
-                        with open((filename + '.tmp'), file_writing_mode) as f:
-                            for data in tqdm_task:
-                                if current_data_byte >= resume_byte_pos:
-                                    f.write(data)
-                                current_data_byte += len(data)
-
-                        # tqdm_task.update(total_size/chunk_size)
-                        is_download_complete = 1
-                    except:
-                        print('Sorry, something went wrong internally downloading file data.')
-                        is_download_complete = 0
+    # ###
+    # ### Circuit breaker of the host of the url
+    # ###
+    def _get_circuit_breaker(self, url):
+        host = urlparse(url).netloc
+        with self._host_limiters_lock:
+            circuit_breaker = self._circuit_breakers.get(host)
+            if circuit_breaker is None:
+                circuit_breaker = CircuitBreaker(self._breaker_failure_threshold, self._breaker_reset_timeout)
+                self._circuit_breakers[host] = circuit_breaker
+        return circuit_breaker
+
+    # ###
+    # ### If a request can be sent to the host of the url now, otherwise the task waits in the delayed queue
+    # ###
+    def _is_host_available(self, url, task):
+        circuit_breaker = self._get_circuit_breaker(url)
+        if circuit_breaker.is_allowed():
+            return True
+
+        self._retry_scheduler.schedule(task, max(circuit_breaker.time_to_retry(), self.retry_base_delay))
+        return False
+
+    # ###
+    # ### Puts a failed task in the delayed queue for its backoff, False if it has no retries left and is given up
+    # ###
+    def _schedule_retry(self, url, failed_request, task):
+        attempts = self._retry_attempts.get((failed_request, url), 0) + 1
+        self._retry_attempts[(failed_request, url)] = attempts
+        if self._get_circuit_breaker(url).record_failure():
+            self._print_file_line('@@@ Too many failures, pausing the requests to %s' % urlparse(url).netloc)
+
+        if attempts > self.max_retries:
+            self.given_up.append({'url': url, 'kind': failed_request, 'attempts': attempts})
+            self.metrics.increment('dihc_given_up_total', kind=failed_request)
+            return False
+
+        self.metrics.increment('dihc_retries_total', kind=failed_request)
+        delay = backoff_delay(attempts - 1, self.retry_base_delay, self.retry_max_delay)
+        self._print_file_line('### Retrying {} in {:.1f} s (retry {} of {}) {}'.format(failed_request, delay, attempts,
+                                                                                    self.max_retries, url))
+        self._retry_scheduler.schedule(task, delay)
+        return True
+
+    # ###
+    # ### Prints the urls given up on after all their retries
+    # ###
+    def _report_given_up(self, kinds):
+        given_up = [item for item in self.given_up if item['kind'] in kinds]
+        if not given_up:
+            return
+
+        print('\n@@@ Gave up on {} url(s) after {} retries:'.format(len(given_up), self.max_retries))
+        for item in given_up:
+            print('@@@   {} ({}) {}'.format(item['kind'], item['attempts'], item['url']))
+
+    # ###
+    # ### Expected checksums of the crawled files (by url) from the checksum manifest given or the ones crawled
+    # ###
+    def _load_checksums(self, manifest):
+        self._checksums = {}
+        urls_by_path = {unquote(entry['path']): entry['url'] for entry in manifest}
+
+        for checksum_path, checksum in self._find_checksums(manifest).items():
+            file_url = urls_by_path.get(checksum_path)
+            if file_url:
+                self._checksums[file_url] = checksum
 
+        if self._checksums:
+            print('$$$ Found the checksums of {} files'.format(len(self._checksums)))
+
+    # ###
+    # ### Checksums by the file path relative to the download directory, from the checksum manifest given or the
+    # ### manifest files found in the crawl
+    # ###
+    def _find_checksums(self, manifest):
+        checksum_sources = []
+        if self.checksum_manifest:
+            checksum_sources.append((self._find_root_directory(), self.checksum_manifest))
+        else:
+            for entry in manifest:
+                if os.path.basename(entry['path']) in self._checksum_filenames:
+                    checksum_sources.append((os.path.dirname(entry['path']), entry['url']))
+
+        return self._read_checksum_sources(checksum_sources)
+
+    # ###
+    # ### Checksums of the files in the download directory, from the checksum manifest given or the manifest files
+    # ### downloaded before
+    # ###
+    def _find_local_checksums(self):
+        checksum_sources = []
+        if self.checksum_manifest:
+            checksum_sources.append((self._find_root_directory(), self.checksum_manifest))
+        else:
+            for directory, _, filenames in os.walk(self.download_directory):
+                relative_directory = os.path.relpath(directory, self.download_directory).replace('\\', '/')
+                for filename in filenames:
+                    if filename in self._checksum_filenames:
+                        checksum_sources.append(('' if relative_directory == '.' else relative_directory,
+                                                 os.path.join(directory, filename)))
+
+        return self._read_checksum_sources(checksum_sources)
+
+    # ###
+    # ### Reads the checksum manifests (local files or urls), their paths are relative to the given directories
+    # ###
+    def _read_checksum_sources(self, checksum_sources):
+        checksums = {}
+
+        for relative_directory, checksum_source in checksum_sources:
+            try:
+                if checksum_source.startswith(('http://', 'https://')):
+                    req = self._send_request('GET', checksum_source, request_type='checksum')
+                    try:
+                        text = req.text if req.status_code == 200 else ''
+                    finally:
+                        self._close_response(req)
                 else:
-                    print('Sorry, can not download file.')
-                    is_download_complete = 0
-            else:
-                print('Status code {}: Something went wrong downloading file.'.format(req.status_code, req))
-                is_download_complete = 0;
+                    with open(checksum_source) as f:
+                        text = f.read()
+            except Exception:
+                print('Sorry, the checksum manifest could not be read %s' % checksum_source)
+                continue
 
-        except:
-            print('Sorry, something went wrong downloading file.')
-            is_download_complete = 0;
-            # if os.path.exists((filename+'.tmp')):
-            #    os.remove((filename+'.tmp'))
+            for path, checksum in parse_checksum_manifest(text).items():
+                checksums[unquote(self._join_relative_path(relative_directory, path))] = checksum
 
-        if req:
-            req.close()
-        return (is_download_complete)
+        return checksums
+
+    # ###
+    # ### Totals of the manifest per directory and per extension, with the bytes already in the download directory
+    # ###
+    def _make_plan(self, manifest):
+        plan = {'url_to_download': self.url_to_download, 'directories': {}, 'extensions': {}}
+        total = self._make_plan_totals()
+        for entry in manifest:
+            size = entry['size'] or 0
+            is_present = self._is_file_present(entry)
+            present_size = self._find_local_size(entry, is_present)
+            if entry['size'] is not None:
+                present_size = min(present_size, size)
+            extension = os.path.splitext(entry['path'])[1].lower() or '(none)'
+            for totals in (total, plan['directories'].setdefault(os.path.dirname(entry['path']),
+                                                                 self._make_plan_totals()),
+                           plan['extensions'].setdefault(extension, self._make_plan_totals())):
+                totals['files'] += 1
+                totals['bytes'] += size
+                totals['present_files'] += is_present
+                totals['present_bytes'] += present_size
+                totals['remaining_bytes'] = totals['bytes'] - totals['present_bytes']
+
+        plan.update(total)
+        plan['unknown_size_files'] = sum(entry['size'] is None for entry in manifest)
+        plan['remaining_files'] = total['files'] - total['present_files']
+        return plan
+
+    def _make_plan_totals(self):
+        return {'files': 0, 'bytes': 0, 'present_files': 0, 'present_bytes': 0, 'remaining_bytes': 0}
+
+    # ###
+    # ### A file download() would not request again, its local copy is complete
+    # ###
+    def _is_file_present(self, entry):
+        filename = self.download_directory + '/' + entry['path']
+        if entry['url'] in self._changed_urls:
+            return False
+        if entry['path'] in self._tar_members:
+            return entry['size'] is None or self._tar_members[entry['path']]['size'] == entry['size']
+        if not os.path.isfile(filename):
+            return False
+        return entry['size'] is None or os.path.getsize(filename) == entry['size']
+
+    # ###
+    # ### Bytes of a file already in the download directory, complete or in its .tmp file
+    # ###
+    def _find_local_size(self, entry, is_present):
+        filename = self.download_directory + '/' + entry['path']
+        if is_present and entry['path'] in self._tar_members:
+            return self._tar_members[entry['path']]['size']
+        if is_present:
+            return os.path.getsize(filename)
+        if entry['url'] in self._changed_urls or not os.path.isfile(filename + self._tmp_suffix):
+            return 0
+
+        partial_state = self._load_partial_state(filename + self._tmp_suffix)
+        if partial_state and partial_state.get('size') != entry['size']:
+            return 0
+        if partial_state and partial_state.get('segments'):
+            return sum(segment[2] for segment in partial_state['segments'])
+        return self._find_downloaded_size(filename + self._tmp_suffix, partial_state)
+
+    # ###
+    # ### Throughput (bytes/s) of max_workers files downloaded in parallel and the mean latency (seconds) of their
+    # ### requests, from the first probe_size bytes of the largest remaining files; (None, None) if nothing came
+    # ###
+    def _measure_throughput(self, manifest, probe_size):
+        remaining_entries = [entry for entry in manifest if not self._is_file_present(entry)]
+        remaining_entries.sort(key=lambda entry: entry['size'] or 0, reverse=True)
+        probe_entries = remaining_entries[:self.max_workers]
+
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(probe_entries)) as executor:
+            probe_results = list(executor.map(lambda entry: self._probe_file(entry['url'], probe_size),
+                                              probe_entries))
+        elapsed_time = time.monotonic() - start_time
+
+        probe_results = [result for result in probe_results if result]
+        received_size = sum(result[0] for result in probe_results)
+        if not probe_results or not received_size or elapsed_time <= 0:
+            return None, None
+        latency = sum(result[1] for result in probe_results) / len(probe_results)
+        print('$$$ Measured {:.2f} MB/s over {} files, {:.0f} ms latency'.format(received_size / elapsed_time / 1024 ** 2,
+                                                                              len(probe_results), latency * 1000))
+        return received_size / elapsed_time, latency
+
+    # ###
+    # ### Downloads the first bytes of a file without saving them, (received bytes, latency) or None if it failed
+    # ###
+    def _probe_file(self, file_url, probe_size):
+        try:
+            req = self._request_file(file_url, {'Range': 'bytes=0-{}'.format(probe_size - 1)})
+        except Exception:
+            return None
+
+        try:
+            if req.status_code not in (200, 206):
+                return None
+            req.raw.decode_content = True
+            received_size = 0
+            while received_size < probe_size:
+                data = req.raw.read(min(self.buffer_size, probe_size - received_size))
+                if not data:
+                    break
+                received_size += len(data)
+                self._count_received_bytes(req, len(data))
+            return received_size, req.elapsed.total_seconds()
+        except Exception:
+            return None
+        finally:
+            self._close_response(req)
+
+    # ###
+    # ### Manifest in the order of the schedule and the directory priorities
+    # ###
+    def _order_downloads(self, manifest):
+        return order_entries(manifest, self.schedule, self.directory_priorities, self._find_root_directory())
+
+    # ###
+    # ### Expected makespan of the files still to download in the given order, in seconds at the given total
+    # ### throughput (bytes/s) or in bytes if it is unknown
+    # ###
+    def _estimate_makespan(self, ordered_manifest, throughput, latency):
+        remaining_sizes = [(entry['size'] or 0) - min(self._find_local_size(entry, False), entry['size'] or 0)
+                           for entry in ordered_manifest if not self._is_file_present(entry)]
+        makespan = estimate_makespan(remaining_sizes, self.max_workers, throughput, latency)
+        makespan['unit'] = 'seconds' if throughput else 'bytes'
+        return makespan
 
+    # ###
+    # ### Throughput (bytes/s) known before downloading- the bandwidth limit or the one of the last download, if any
+    # ###
+    def _find_known_throughput(self):
+        if self.bandwidth_limit:
+            return self.bandwidth_limit
+        for series in self.metrics.snapshot():
+            if series['name'] == 'dihc_throughput_bytes_per_second' and series['value'] > 0:
+                return series['value']
+        return None
 
+    # ###
+    # ### Prints the expected makespan of a download
+    # ###
+    def _print_makespan(self, makespan):
+        if makespan['unit'] == 'seconds':
+            print('$$$ Expected makespan {:.0f}h {:02.0f}m {:02.0f}s with {} workers ({:.0%} of a perfect '
+                  'balance)'.format(makespan['makespan'] // 3600, makespan['makespan'] % 3600 // 60,
+                                    makespan['makespan'] % 60, self.max_workers, makespan['efficiency']))
+        else:
+            print('$$$ Expected makespan {:.2f} GB on the busiest of {} workers ({:.0%} of a perfect balance)'.format(
+                makespan['makespan'] / 1024 ** 3, self.max_workers, makespan['efficiency']))
 
+    # ###
+    # ### Prints the plan, the largest directories only
+    # ###
+    def _print_plan(self, plan):
+        row_format = '{:<48}{:>10}{:>14}{:>14}{:>14}'
+        for group, title in (('extensions', 'Extension'), ('directories', 'Directory')):
+            print(row_format.format(title, 'files', 'size (MB)', 'present (MB)', 'to get (MB)'))
+            rows = sorted(plan[group].items(), key=lambda item: item[1]['bytes'], reverse=True)
+            for name, totals in rows[:self._plan_rows_printed]:
+                print(row_format.format(name[-47:], totals['files'], '{:.1f}'.format(totals['bytes'] / 1024 ** 2),
+                                        '{:.1f}'.format(totals['present_bytes'] / 1024 ** 2),
+                                        '{:.1f}'.format(totals['remaining_bytes'] / 1024 ** 2)))
+            if len(rows) > self._plan_rows_printed:
+                print('... and {} more'.format(len(rows) - self._plan_rows_printed))
+            print()
+
+        print('$$$ {} files, {:.2f} GB ({} of unknown size)'.format(plan['files'], plan['bytes'] / 1024 ** 3,
+                                                                  plan['unknown_size_files']))
+        print('$$$ Already present {} files, {:.2f} GB'.format(plan['present_files'], plan['present_bytes'] / 1024 ** 3))
+        print('$$$ To download {} files, {:.2f} GB'.format(plan['remaining_files'], plan['remaining_bytes'] / 1024 ** 3))
+        if plan['eta'] is not None:
+            print('$$$ ETA {:.0f}h {:02.0f}m {:02.0f}s at {:.2f} MB/s, {} order ({:.0%} of a perfect balance)'.format(
+                plan['eta'] // 3600, plan['eta'] % 3600 // 60, plan['eta'] % 60, plan['throughput'] / 1024 ** 2,
+                self.schedule if isinstance(self.schedule, str) else 'custom', plan['makespan_efficiency']))
+
+    # ###
+    # ### Exports the plan, one CSV row per directory/extension/total or the whole plan as JSON
+    # ###
+    def _save_plan(self, plan, plan_file):
+        try:
+            with open(plan_file, 'w', newline='') as f:
+                if not plan_file.lower().endswith('.csv'):
+                    json.dump(plan, f, indent=1)
+                    return
+
+                fields = ['files', 'bytes', 'present_files', 'present_bytes', 'remaining_bytes']
+                writer = csv.writer(f)
+                writer.writerow(['group', 'name'] + fields)
+                writer.writerow(['total', self.url_to_download] + [plan[field] for field in fields])
+                for group, plan_group in (('directory', 'directories'), ('extension', 'extensions')):
+                    for name, totals in sorted(plan[plan_group].items()):
+                        writer.writerow([group, name] + [totals[field] for field in fields])
+        except OSError:
+            print('Sorry, the plan could not be saved in %s' % plan_file)
+            return
+        print('$$$ Plan saved in %s' % plan_file)
+
+    # ###
+    # ### Local directory of the url to download, relative to the download directory (first part of the manifest paths)
+    # ###
+    def _find_root_directory(self):
+        return self.url_to_download.rstrip('/').split('/')[-1]
+
+    # ###
+    # ### Joins the relative paths of the manifest with '/'
+    # ###
+    def _join_relative_path(self, relative_directory, name):
+        if not relative_directory:
+            return name
+        if not name:
+            return relative_directory
+        return relative_directory + '/' + name
+
+    # ###
+    # ### Files of the manifest in the shard of this object, all of them if not sharded
+    # ###
+    def _select_shard(self, manifest):
+        if self.num_shards <= 1:
+            return manifest
+
+        if self.shard_by == 'hash':
+            # The hash of the relative path puts a file in the same shard in every process, whatever the other files
+            shard_manifest = [entry for entry in manifest
+                              if int(hashlib.sha1(entry['path'].encode('utf-8')).hexdigest(), 16) % self.num_shards
+                              == self.shard_index]
+        else:
+            # Largest files first, each to the shard with the fewest bytes so far (ties- fewest files, lowest index);
+            # sorted by path too, so every shard makes the same assignment from the same crawl
+            shard_loads = [[0, 0, i] for i in range(self.num_shards)]
+            shard_manifest = []
+            for entry in sorted(manifest, key=lambda entry: (-(entry['size'] or 0), entry['path'])):
+                shard_load = min(shard_loads)
+                shard_load[0] += entry['size'] or 0
+                shard_load[1] += 1
+                if shard_load[2] == self.shard_index:
+                    shard_manifest.append(entry)
+            shard_manifest.sort(key=lambda entry: entry['path'])
+
+        print('$$$ Shard {} of {} has {} of the {} files'.format(self.shard_index, self.num_shards,
+                                                                  len(shard_manifest), len(manifest)))
+        return shard_manifest
+
+    # ###
+    # ### Name of a state file of this shard in the download directory, the name itself if not sharded
+    # ###
+    def _get_shard_filename(self, filename):
+        if self.num_shards <= 1:
+            return filename
+        name, extension = os.path.splitext(filename)
+        return '{}.shard{}{}'.format(name, self.shard_index, extension)
+
+    # ###
+    # ### Saves the files of this shard and their results for merge_shards()
+    # ###
+    def _save_shard_state(self, manifest):
+        shard_file = self.download_directory + '/' + self._shard_state_filename.format(self.shard_index,
+                                                                                        self.num_shards)
+        shard_state = {'url_to_download': self.url_to_download, 'shard_index': self.shard_index,
+                       'num_shards': self.num_shards, 'shard_by': self.shard_by, 'files': manifest,
+                       'results': {entry['url']: self._download_results.get(entry['url'], 0) for entry in manifest}}
+        try:
+            with open(shard_file + '.tmp', 'w') as f:
+                json.dump(shard_state, f)
+            os.replace(shard_file + '.tmp', shard_file)
+        except OSError:
+            print('Sorry, the shard state could not be saved in %s' % shard_file)
+
+    # ###
+    # ### Saves the manifest in the download directory
+    # ###
+    def _save_manifest(self, manifest):
+        manifest_file = self.download_directory + '/' + self._get_shard_filename(self._manifest_filename)
+        try:
+            with open(manifest_file + '.tmp', 'w') as f:
+                json.dump({'url_to_download': self.url_to_download, 'files': manifest}, f)
+            os.replace(manifest_file + '.tmp', manifest_file)
+        except OSError:
+            print('Sorry, the manifest could not be saved in %s' % manifest_file)
+
+    # ###
+    # ### Creates a session with a pool of keep-alive connections
+    # ###
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    # ###
+    # ### Session of the current thread, every download worker gets its own one
+    # ###
+    def _get_session(self):
+        session = getattr(self._thread_local, 'session', None)
+        if session is None:
+            session = self._create_session()
+            self._thread_local.session = session
+        return session
+
+    # ###
+    # ### Starts the download workers that take file urls from the bounded queue
+    # ###
+    def _start_download_workers(self):
+        self._file_queue = queue.Queue(maxsize=self.max_workers * 4)
+        self._result_queue = queue.Queue()
+        self._workers = []
+        self._downloads_in_flight = 0
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._download_worker, name='DIHC_Worker_{}'.format(i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    # ###
+    # ### Waits for the queued files to finish and reports the remaining results
+    # ###
+    def _stop_download_workers(self):
+        for _ in self._workers:
+            self._file_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._report_download_results()
+
+    # ###
+    # ### Worker loop, downloads files until it finds the stop signal (None) in the queue
+    # ###
+    def _download_worker(self):
+        while True:
+            task = self._file_queue.get()
+            if task is None:
+                break
+
+            file_url, download_directory, total_size = task
+            self._thread_local.is_failure_retryable = True
+            try:
+                is_downloaded = self._download_and_save_file(file_url, download_directory, total_size)
+            except Exception:
+                is_downloaded = 0
+            self._result_queue.put((task, is_downloaded, self._thread_local.is_failure_retryable))
+
+    # ###
+    # ### Queues a file of the manifest with the local directory it belongs to
+    # ###
+    def _submit_file_download(self, entry):
+        if self._is_file_up_to_date(entry):
+            if entry['path'] not in self._tar_members:
+                self._add_to_content_store(entry['url'], self.download_directory + '/' + entry['path'])
+            self._report_download_result(entry['url'], 2)
+            return
+
+        download_directory = self.download_directory
+        relative_directory = os.path.dirname(entry['path'])
+        if relative_directory:
+            download_directory += '/' + relative_directory
+
+        # ### The local copy of a file that changed on the server is stale
+        if entry['url'] in self._changed_urls:
+            self._print_file_line('### Changed on the server, downloading again %s' % entry['url'])
+            filename = self.download_directory + '/' + entry['path']
+            if os.path.exists(filename):
+                os.remove(filename)
+            self._remove_partial_state(filename + self._tmp_suffix, is_tmp_removed=True)
+
+        self._queue_file_task((entry['url'], download_directory, entry['size']))
+        self._report_download_results()
+
+    # ###
+    # ### Hands a file task to the workers, or to the delayed queue while the circuit of its host is open
+    # ###
+    def _queue_file_task(self, task):
+        if self._is_host_available(task[0], task):
+            self._file_queue.put(task)
+            self._downloads_in_flight += 1
+        self._record_queue_depths()
+
+    # ###
+    # ### Bytes received so far according to the metrics, 0 if they are not kept
+    # ###
+    def _find_received_size(self):
+        for series in self.metrics.snapshot():
+            if series['name'] == 'dihc_received_bytes_total':
+                return series['value']
+        return 0
+
+    # ###
+    # ### Exports the metrics to the metrics file, if any
+    # ###
+    def _export_metrics(self):
+        if not self.metrics_file:
+            return
+        try:
+            self.metrics.export(self.metrics_file)
+        except OSError:
+            print('Sorry, the metrics could not be saved in %s' % self.metrics_file)
+
+    # ###
+    # ### Depths of the queues of the download, sampled when they change
+    # ###
+    def _record_queue_depths(self):
+        self.metrics.set_gauge('dihc_file_queue_depth', self._file_queue.qsize())
+        self.metrics.set_gauge('dihc_downloads_in_flight', self._downloads_in_flight)
+        self.metrics.set_gauge('dihc_retry_queue_depth', len(self._retry_scheduler))
+
+    # ###
+    # ### Progress view of a file- its own bar, its share of the bar of the job or nothing
+    # ###
+    def _open_file_progress(self, file_url, description, total_size, initial_size):
+        if self.progress == 'file':
+            return FileProgress(description, total_size or 0, initial_size)
+        if self._job_progress is not None:
+            return self._job_progress.open_file(file_url, initial_size)
+        return NullProgress()
+
+    # ###
+    # ### Prints a line about one file; while the bar of the job is shown the line goes above it (thru tqdm.write)
+    # ### instead of breaking it
+    # ###
+    def _print_file_line(self, *values):
+        job_progress = self._job_progress
+        if job_progress is not None:
+            job_progress.write(' '.join(str(value) for value in values))
+        else:
+            print(*values)
+
+    # ###
+    # ### Reports the results and queues the due retries until every file is downloaded or given up
+    # ###
+    def _wait_for_downloads(self):
+        while self._downloads_in_flight > 0 or len(self._retry_scheduler):
+            for task in self._retry_scheduler.pop_ready():
+                self._queue_file_task(task)
+
+            wait_time = self._retry_scheduler.time_to_next()
+            if self._downloads_in_flight > 0:
+                self._report_download_results(wait_time)
+            elif wait_time:
+                time.sleep(wait_time)
+
+    # ###
+    # ### An indexed file that is complete, unchanged on the server and still present locally needs no request
+    # ###
+    def _is_file_up_to_date(self, entry):
+        if not self._index:
+            return False
+
+        indexed_file = self._index.get_file(entry['url'])
+        if not indexed_file or indexed_file['state'] != DIHC_Index.STATE_COMPLETE:
+            return False
+
+        if entry['path'] in self._tar_members:
+            return (entry['size'] is None or self._tar_members[entry['path']]['size'] == entry['size'])
+        filename = self.download_directory + '/' + entry['path']
+        if not os.path.exists(filename):
+            return False
+        return (entry['size'] is None or os.path.getsize(filename) == entry['size'])
+
+    # ###
+    # ### Prints the results the workers have finished so far =1 complete, =2 already downloaded, =0 problem downloading
+    # ### (after its last retry, or at once if the failure is not worth a retry), waiting up to wait_time seconds for
+    # ### the first one
+    # ###
+    def _report_download_results(self, wait_time=0):
+        while True:
+            try:
+                # Waits for the first result only (None- until it comes)
+                if wait_time == 0:
+                    task, is_downloaded, is_failure_retryable = self._result_queue.get_nowait()
+                else:
+                    task, is_downloaded, is_failure_retryable = self._result_queue.get(timeout=wait_time)
+                    wait_time = 0
+            except queue.Empty:
+                break
+
+            self._downloads_in_flight -= 1
+            self._record_queue_depths()
+            # ### A missing file (404, 403...) or a wrong checksum fails again on a retry, and its host is working
+            if is_downloaded == 0 and is_failure_retryable and self._schedule_retry(task[0], 'file', task):
+                continue
+            if is_downloaded != 0 or not is_failure_retryable:
+                self._get_circuit_breaker(task[0]).record_success()
+            self._report_download_result(task[0], is_downloaded)
+
+    def _report_download_result(self, file_url, is_downloaded):
+        self._download_results[file_url] = is_downloaded
+        if self._completed_paths is not None and is_downloaded in (1, 2):
+            self._completed_paths.put(self._find_completed_path(self._download_paths[file_url]))
+        self.metrics.increment('dihc_files_total', result={1: 'downloaded', 2: 'present'}.get(is_downloaded, 'failed'))
+        if self._job_progress is not None:
+            self._job_progress.file_done(file_url, is_downloaded)
+        if self._index:
+            state = DIHC_Index.STATE_COMPLETE if is_downloaded in (1, 2) else DIHC_Index.STATE_FAILED
+            self._index.set_file_state(file_url, state)
+
+        if (is_downloaded == 1):
+            self._print_file_line('### Download successful %s' % file_url)
+        elif (is_downloaded == 2):
+            self._print_file_line('$$$ Already downloaded %s' % file_url)
+        else:
+            self._print_file_line('@@@ Problem downloading %s' % file_url)
+
+    # ###
+    # ### Downloads a file into the given directory and renames it from .tmp when complete
+    # ###
+    def _download_and_save_file(self, file_url, download_directory, total_size=None):
+        if self._tar_writer is not None and (total_size is None or total_size <= self.tar_member_max_size):
+            return self._download_file_into_tar(file_url, download_directory, total_size)
+
+        filename = download_directory + '/' + self._get_filename_from_url(file_url)
+        if not os.path.exists(download_directory):
+            os.makedirs(download_directory, exist_ok=True)
+
+        # ### The same content downloaded for another dataset root or version is linked from the store
+        content_keys = self._content_keys.get(file_url)
+        if content_keys and not os.path.exists(filename) and self.content_store.link(content_keys, filename):
+            self.metrics.increment('dihc_store_linked_files_total')
+            self.metrics.increment('dihc_store_linked_bytes_total', os.path.getsize(filename))
+            self._print_file_line('### Linked from the content store %s' % file_url)
+            return 1
+
+        is_downloaded = self._download_specific_file(file_url, download_directory, total_size)
+
+        if (is_downloaded == 1):
+            if os.path.exists((filename + self._tmp_suffix)):
+                move_file_in_place((filename + self._tmp_suffix), filename, self.fsync_policy != 'none')
+        if is_downloaded in (1, 2):
+            self._add_to_content_store(file_url, filename)
+        # elif (is_downloaded == 0):
+        #    if os.path.exists((filename+'.tmp')):
+        #        os.remove((filename+'.tmp'))
+
+        return is_downloaded
+
+    # ###
+    # ### Downloads a file into memory (or a temporary file) and appends it to the current tar shard, =1 complete,
+    # ### =2 already in a shard, =0 problem downloading
+    # ###
+    def _download_file_into_tar(self, file_url, download_directory, total_size=None):
+        relative_path = self._join_relative_path(download_directory[len(self.download_directory) + 1:],
+                                                 self._get_filename_from_url(file_url))
+        if relative_path in self._tar_writer and file_url not in self._changed_urls:
+            return 2
+
+        expected_checksum = self._checksums.get(file_url)
+        hasher = StreamingHasher(self._checksum_algorithm) if expected_checksum else None
+        spool = TarMemberSpool(self._tar_spool_size, self.buffer_size, self.download_directory, hasher)
+        req = None
+        try:
+            req = self._request_file(file_url)
+            if req.status_code != 200:
+                self._print_file_line('Status code {}: Something went wrong downloading file.'.format(req.status_code))
+                self._record_failed_status(req.status_code)
+                return 0
+            file_info = self._find_file_info_in_headers(req.headers)
+            if req.headers.get('Content-Encoding', 'identity') != 'identity':
+                file_info['size'] = total_size
+
+            file_progress = self._open_file_progress(file_url, 'Downloading \"' + self._get_filename_from_url(file_url)
+                                                     + '\"', file_info['size'] or total_size, 0)
+            try:
+                file_progress.update(self._write_response(req, spool))
+            finally:
+                file_progress.close()
+
+            if file_info['size'] is not None and spool.written_size != file_info['size']:
+                self._print_file_line('Sorry, the connection closed before the whole file was downloaded.')
+                return 0
+            if hasher is not None and hasher.hexdigest(None, spool.written_size) != expected_checksum:
+                self._print_file_line('@@@ Checksum does not match, the file will be downloaded on the next run %s'
+                                      % file_url)
+                self.metrics.increment('dihc_checksum_mismatches_total')
+                self._record_failed_status(None)
+                return 0
+
+            self._tar_writer.add(relative_path, spool.file, spool.written_size, file_info['mtime'])
+            return 1
+
+        except Exception:
+            self._print_file_line('Sorry, something went wrong downloading file.')
+            return 0
+
+        finally:
+            spool.close()
+            if req is not None:
+                self._close_response(req)
+
+    # ###
+    # ### Path iter_downloads() gives for a file of the manifest- absolute on the disk, relative in the tar shards
+    # ###
+    def _find_completed_path(self, path):
+        if path in self._tar_members:
+            return path
+        return self.download_directory + '/' + path
+
+    # ###
+    # ### Keys of the content of a file in the store- its checksum if known, and its (strong) ETag and size, or its
+    # ### modification time and size, at the same path of the dataset (any version root). An ETag only names a version
+    # ### of one url (nginx and Apache make it from the mtime and size), two files with the same ETag at different
+    # ### paths can differ. The files classified from the listing have no ETag, their listing mtime and size are used.
+    # ###
+    def _find_content_keys(self, entry):
+        content_keys = []
+        if self._checksums.get(entry['url']):
+            content_keys.append('{}:{}'.format(self._checksum_algorithm, self._checksums[entry['url']]))
+        if entry['size'] is None:
+            return content_keys
+
+        # The root directory (the version) is left out, the same path of another version can share the content
+        root_directory = self._find_root_directory()
+        relative_path = entry['path'][len(root_directory) + 1:] \
+            if entry['path'].startswith(root_directory + '/') else entry['path']
+        base_url = urlparse(self.url_to_download)
+        path_key = '{}{}/*/{}'.format(base_url.netloc, base_url.path.rstrip('/').rsplit('/', 1)[0], relative_path)
+        etag = entry.get('etag')
+        if etag and not etag.startswith('W/'):
+            content_keys.append('etag:{}:{}:{}'.format(path_key, etag, entry['size']))
+        if entry.get('mtime') is not None:
+            content_keys.append('mtime:{}:{}:{}'.format(path_key, entry['mtime'], entry['size']))
+        return content_keys
+
+    # ###
+    # ### Adds a complete file to the content store under its keys, if any
+    # ###
+    def _add_to_content_store(self, file_url, filename):
+        content_keys = self._content_keys.get(file_url)
+        if not content_keys or not os.path.isfile(filename):
+            return
+        if self.content_store.add(content_keys, filename) is None:
+            self._print_file_line('Sorry, the file could not be added to the content store %s' % filename)
+
+    # ###
+    # ### Prefix of the tar shards of this object, every shard of a sharded download writes its own
+    # ###
+    def _get_tar_prefix(self):
+        return os.path.splitext(self._get_shard_filename(self._tar_prefix + '.tar'))[0]
+
+    # ###
+    # ### Finds the type of the url is file or directory, =0 folder, =1 file & =3 skip it
+    # ###
+    def _find_content_type_of_the_url(self, content_url):
+        return self._find_content_type_and_info_of_the_url(content_url)[0]
+
+    # ###
+    # ### Finds the type of the url with its file information (size, mtime in epoch seconds, etag) if it is a file,
+    # ### None if the request failed and can be retried
+    # ###
+    def _find_content_type_and_info_of_the_url(self, content_url):
+        req = None
+        file_info = {'size': None, 'mtime': None, 'etag': None}
+
+        filename = self._get_filename_from_url(content_url)
+        is_the_url_a_file = self._find_content_type_by_name(filename)
+
+        try:
+            req = self._send_request('HEAD', content_url, request_type='head')
+
+            # print('Web url:', req.status_code, content_url)
+            if req.status_code == 200:
+                is_the_url_a_file = self._find_content_type_by_headers(filename, req.headers, is_the_url_a_file)
+                if is_the_url_a_file == 1:
+                    file_info = self._find_file_info_in_headers(req.headers)
+            else:
+                print('Status code {}: Something went wrong getting header information {}'.format(req.status_code,
+                                                                                                   content_url))
+                if self._is_retryable_status(req.status_code):
+                    is_the_url_a_file = None
+        except:
+            print('Sorry, something went wrong getting header information.')
+            is_the_url_a_file = None
+
+        if req is not None:
+            self._close_response(req)
+
+        return is_the_url_a_file, file_info
+
+    # ###
+    # ### Size, modification time (epoch seconds) and etag of a file from the response headers, None if not found
+    # ###
+    def _find_file_info_in_headers(self, headers):
+        file_info = {'size': None, 'mtime': None, 'etag': headers.get('ETag')}
+
+        try:
+            file_info['size'] = int(headers['Content-Length'])
+        except (KeyError, ValueError):
+            pass
+        try:
+            file_info['mtime'] = parsedate_to_datetime(headers['Last-Modified']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        return file_info
+
+    # ###
+    # ### Name of the file or directory at the end of the url
+    # ###
+    def _get_filename_from_url(self, content_url):
+        urlparser = urlparse(content_url)
+        filename = os.path.basename(urlparser.path)
+        if filename.endswith('/'):
+            filename = filename[:-1]
+        if filename.startswith('/'):
+            filename = filename[1:]
+        # filename.strip(' /')
+        return filename
+
+    # ###
+    # ### Content type guessed from the name and the file type filters, =0 folder, =1 file & =2 excluded file
+    # ###
+    def _find_content_type_by_name(self, filename):
+        is_the_url_a_file = 0
+
+        if (not filename):
+            pass
+
+        elif (any(x in filename for x in self._folder_indicator)):
+            pass
+
+        elif (any(x in filename for x in self._file_types_not_to_download)):
+            is_the_url_a_file = 2
+        else:
+            if (len(self._file_types_to_download) == 1):
+                is_the_url_a_file = 1
+            elif (len(self._file_types_to_download) > 1 and any(x in filename for x in self._file_types_to_download[1:])):
+                is_the_url_a_file = 1
+            else:
+                pass
+
+        return is_the_url_a_file
+
+    # ###
+    # ### Content type corrected with the header information from the server, gzip-ed html means a folder
+    # ###
+    def _find_content_type_by_headers(self, filename, headers, is_the_url_a_file):
+        try:
+            if (headers['Content-Encoding'].find('gzip') != -1 and headers['Content-Type'].find('html') != -1):
+                # print('-------> possibly folder')
+                if (self._is_need_html or filename.find('html') != -1 or filename.find('htm') != -1):
+                    # print('-------> thought as folder but is file')
+                    is_the_url_a_file = 1
+            else:
+                # print('-------> file')
+                is_the_url_a_file = 1
+                # content_type = (headers['Content-Type'].split(';'))[0]
+                # if (content_type.find('plain') != -1 or content_type.find('application') != -1):
+                #    is_the_url_a_file = 1
+        except:
+            print('File type in server not found.')
+
+        return is_the_url_a_file
+
+    # ###
+    # ### Explore and display all files and directories in specific web location
+    # ###
+    def _explore_and_show_all_files_and_directories(self, web_url):
+        return [entry['url'] for entry in self._request_directory_listing(web_url)[1]]
+
+    # ###
+    # ### Requests a directory listing with optional (conditional) headers; returns status code, listing entries found,
+    # ### response headers and digest of the page
+    # ###
+    def _request_directory_listing(self, web_url, request_headers=None):
+        status_code = 0
+        listing_entries = []
+        response_headers = {}
+        digest = None
+        req = None
+
+        try:
+            req = self._send_request('GET', web_url, request_headers, request_type='listing')
+
+            status_code = req.status_code
+            response_headers = req.headers
+            if req.status_code == 200:
+                # ### The page is parsed and hashed chunk by chunk as it arrives
+                page_digest = hashlib.sha1()
+                decoder = codecs.getincrementaldecoder(req.encoding or 'utf-8')(errors='replace')
+
+                def read_page_chunks():
+                    for chunk in req.iter_content(chunk_size=self._listing_chunk_size):
+                        self._count_received_bytes(req, len(chunk))
+                        page_digest.update(chunk)
+                        yield decoder.decode(chunk)
+                    yield decoder.decode(b'', final=True)
+
+                listing_entries = self._make_listing_entries(web_url, self._parse_listing_chunks(read_page_chunks()))
+                digest = page_digest.hexdigest()
+            elif req.status_code != 304:
+                print('Status code {}: Something went wrong during url request {}'.format(req.status_code,
+                                                                                           web_url))
+
+        except:
+            print('Sorry, something went wrong during url request.')
+            status_code = 0
+            listing_entries = []
+
+        if req is not None:
+            self._close_response(req)
+
+        return status_code, listing_entries, response_headers, digest
+
+    # ###
+    # ### Links of the web page that are files or directories to be explored
+    # ###
+    def _find_urls_in_web_page(self, web_url, web_page):
+        return [entry['url'] for entry in self._find_entries_in_web_page(web_url, web_page)]
+
+    # ###
+    # ### Listing entries of the web page with their urls, {'url', 'href', 'is_dir', 'size', 'mtime'}
+    # ###
+    def _find_entries_in_web_page(self, web_url, web_page):
+        return self._make_listing_entries(web_url, self._parse_listing_chunks([web_page]))
+
+    # ###
+    # ### Parses the text chunks of a listing page with the chosen parser, BeautifulSoup if it could not read all links
+    # ###
+    def _parse_listing_chunks(self, chunks):
+        if isinstance(self.listing_parser, str):
+            listing_parser = LISTING_PARSERS[self.listing_parser]()
+        else:
+            listing_parser = self.listing_parser()
+
+        # ### Only the time in the parser counts, not the time waiting for the next chunk from the network
+        page_chunks = []
+        parse_time = 0.0
+        for chunk in chunks:
+            start_time = time.perf_counter()
+            listing_parser.feed(chunk)
+            parse_time += time.perf_counter() - start_time
+            page_chunks.append(chunk)
+        start_time = time.perf_counter()
+        parsed_entries = listing_parser.close()
+
+        if getattr(listing_parser, 'is_incomplete', False):
+            self.metrics.increment('dihc_listing_parser_fallbacks_total')
+            listing_parser = SoupListingParser()
+            listing_parser.feed(''.join(page_chunks))
+            parsed_entries = listing_parser.close()
+
+        self.metrics.observe('dihc_listing_parse_seconds', parse_time + time.perf_counter() - start_time)
+        self.metrics.increment('dihc_listing_entries_total', len(parsed_entries))
+        return parsed_entries
+
+    # ###
+    # ### Listing entries with their full urls, links outside the directory or not to consider are left out
+    # ###
+    def _make_listing_entries(self, web_url, parsed_entries):
+        listing_entries = []
+
+        if not web_url.endswith('/'):
+            web_url += '/'
+
+        for entry in parsed_entries:
+            node = web_url + entry['href']
+            # Test for text files only
+            # if (node.find('.txt')>0 or (node.endswith('/') and not node.endswith('../'))):
+            if (node.count('//') == 1 and not any(x in node for x in self._url_not_to_consider)):
+                entry['url'] = node
+                listing_entries.append(entry)
+
+        return listing_entries
+
+    # ###
+    # ### Download a specific file with url with its progress report =1 complete, =2 already downloaded, =0 problem downloading
+    # ###
+    def _download_specific_file(self, file_url, download_directory=None, total_size=None):
+        if download_directory is None:
+            download_directory = self.download_directory
+        filename = download_directory + '/' + self._get_filename_from_url(file_url)
+        tmp_filename = filename + self._tmp_suffix
+
+        if (os.path.exists(filename)):
+            return 2
+
+        # ### A file with a known checksum is hashed by the writers while its bytes are written
+        expected_checksum = self._checksums.get(file_url)
+        if not expected_checksum:
+            return self._download_tmp_file(file_url, filename, total_size)
+
+        self._hashers[tmp_filename] = StreamingHasher(self._checksum_algorithm)
+        try:
+            is_download_complete = self._download_tmp_file(file_url, filename, total_size)
+            if is_download_complete == 1:
+                is_download_complete = self._verify_tmp_file(file_url, tmp_filename, expected_checksum)
+        finally:
+            self._hashers.pop(tmp_filename, None)
+
+        return is_download_complete
+
+    # ###
+    # ### Checks the hash of a downloaded .tmp file, a corrupted one is removed to be downloaded again, =1 correct,
+    # ### =0 corrupted
+    # ###
+    def _verify_tmp_file(self, file_url, tmp_filename, expected_checksum):
+        checksum = self._hashers[tmp_filename].hexdigest(tmp_filename, os.path.getsize(tmp_filename))
+        if checksum == expected_checksum:
+            return 1
+
+        self._print_file_line('@@@ Checksum does not match, the file will be downloaded on the next run %s' % file_url)
+        self.metrics.increment('dihc_checksum_mismatches_total')
+        self._record_failed_status(None)
+        self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+        return 0
+
+    # ###
+    # ### Downloads the file into its .tmp file in segments or in one connection, =1 complete, =0 problem downloading
+    # ###
+    def _download_tmp_file(self, file_url, filename, total_size):
+        tmp_filename = filename + self._tmp_suffix
+
+        # ### A complete .tmp file needs no request at all
+        partial_state = self._load_partial_state(tmp_filename)
+        is_appended_tmp = os.path.exists(tmp_filename) and not (partial_state and partial_state.get('segments'))
+        if is_appended_tmp and total_size and self._find_downloaded_size(tmp_filename, partial_state) == total_size:
+            self._remove_partial_state(tmp_filename)
+            return 1
+        if is_appended_tmp and total_size and self._find_downloaded_size(tmp_filename, partial_state) > total_size:
+            self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+            partial_state = None
+
+        # ### Large files of known size go thru several connections if the server accepts byte ranges
+        req = None
+        if (self.segments > 1 and total_size and total_size >= self.segment_threshold):
+            is_download_complete, req = self._download_file_in_segments(file_url, filename, total_size, partial_state)
+            if is_download_complete is not None:
+                return is_download_complete
+            partial_state = None
+
+        return self._download_file_in_one_connection(file_url, filename, total_size, partial_state, req)
+
+    # ###
+    # ### Download a file in one connection, resuming its .tmp file when the server sends the rest of the same version
+    # ### (206), =1 complete, =0 problem downloading
+    # ###
+    def _download_file_in_one_connection(self, file_url, filename, total_size, partial_state, req=None):
+        is_download_complete = 0
+        tmp_filename = filename + self._tmp_suffix
+        resume_byte_pos = 0
+
+        try:
+            if req is None:
+                # ### The preallocated .tmp file of a segmented download can not be continued in one connection
+                if partial_state and partial_state.get('segments'):
+                    self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+                    partial_state = None
+
+                request_headers = None
+                if os.path.exists(tmp_filename):
+                    resume_byte_pos = self._find_downloaded_size(tmp_filename, partial_state)
+                if resume_byte_pos > 0:
+                    request_headers = self._make_range_headers(resume_byte_pos, None, partial_state)
+                req = self._request_file(file_url, request_headers, (partial_state or {}).get('mirror'))
+
+                # ### 416- nothing is left after the bytes on disk, or the .tmp file is not of this file any more
+                if req.status_code == 416 and resume_byte_pos > 0:
+                    self._close_response(req)
+                    if self._find_content_range(req.headers)[1] == resume_byte_pos:
+                        self._remove_partial_state(tmp_filename)
+                        return 1
+                    self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+                    resume_byte_pos = 0
+                    partial_state = None
+                    req = self._request_file(file_url, None)
+
+            if req.status_code == 206 and self._find_content_range(req.headers)[0] == resume_byte_pos:
+                is_resumed = True
+                response_size = self._find_content_range(req.headers)[1]
+            elif req.status_code == 200:
+                # ### The whole file is sent- the server ignored the range or the file changed since the .tmp started
+                if resume_byte_pos > 0:
+                    self._print_file_line('Can not resume, downloading the whole file again %s' % file_url)
+                is_resumed = False
+                resume_byte_pos = 0
+                response_size = self._find_file_info_in_headers(req.headers)['size']
+            else:
+                self._print_file_line('Status code {}: Something went wrong downloading file.'.format(req.status_code))
+                self._record_failed_status(req.status_code)
+                return 0
+
+            # ### The hash of a resumed file starts with the bytes already on the disk
+            hasher = self._hashers.get(tmp_filename)
+            if hasher is not None and resume_byte_pos > 0:
+                hasher.catch_up(tmp_filename, resume_byte_pos)
+
+            # ### Compressed responses are checked by their decoded length only if the size was known before
+            if req.headers.get('Content-Encoding', 'identity') != 'identity':
+                response_size = total_size
+            if total_size is None:
+                total_size = response_size or 0
+
+            # ### The validators of the response (and the mirror they belong to) let the next run resume only the
+            # ### same version of the file; a preallocated .tmp file has the size of the whole file, so its state also
+            # ### keeps the downloaded bytes
+            preallocate_size = response_size if self.preallocate else None
+            if not is_resumed or partial_state is None or partial_state.get('mirror') != getattr(req, 'mirror', None):
+                partial_state = {'size': response_size, 'etag': req.headers.get('ETag'),
+                                 'last_modified': req.headers.get('Last-Modified'), 'segments': None,
+                                 'mirror': getattr(req, 'mirror', None)}
+            partial_state['downloaded'] = resume_byte_pos if preallocate_size else None
+            self._save_partial_state(tmp_filename, partial_state)
+
+            file_progress = self._open_file_progress(file_url, 'Downloading \"' + self._get_filename_from_url(file_url)
+                                                     + '\"', total_size, resume_byte_pos)
+            saved_size = [resume_byte_pos]
+
+            def written(number_of_bytes):
+                file_progress.update(number_of_bytes)
+                if preallocate_size:
+                    partial_state['downloaded'] += number_of_bytes
+                    if partial_state['downloaded'] - saved_size[0] >= self._partial_state_save_interval:
+                        self._checkpoint_partial_state(tmp_filename, partial_state, writer)
+                        saved_size[0] = partial_state['downloaded']
+
+            writer = self._open_file_writer(tmp_filename, resume_byte_pos, preallocate_size, written,
+                                            expected_size=response_size and response_size - resume_byte_pos)
+            try:
+                self._write_response(req, writer)
+            finally:
+                try:
+                    writer.close()
+                finally:
+                    file_progress.close()
+                    if preallocate_size and partial_state['downloaded'] < preallocate_size:
+                        self._save_partial_state(tmp_filename, partial_state)
+
+            if response_size and resume_byte_pos + writer.written_size != response_size:
+                self._print_file_line('Sorry, the connection closed before the whole file was downloaded.')
+                return 0
+
+            self._remove_partial_state(tmp_filename)
+            is_download_complete = 1
+
+        except Exception:
+            self._print_file_line('Sorry, something went wrong downloading file.')
+            is_download_complete = 0
+
+        finally:
+            if req is not None:
+                self._close_response(req)
+
+        return (is_download_complete)
+
+    # ###
+    # ### Bytes start to end (both included) of a remote file for open(), the version of the file with the ETag is
+    # ### checked by If-Range; the failed requests are retried with backoff
+    # ###
+    def _fetch_file_range(self, file_url, start, end, etag):
+        request_headers = {'Range': 'bytes={}-{}'.format(start, end), 'Accept-Encoding': 'identity'}
+        if etag:
+            request_headers['If-Range'] = etag
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, self.retry_base_delay, self.retry_max_delay))
+            req = None
+            try:
+                req = self._request_file(file_url, request_headers)
+                if req.status_code == 206 and self._find_content_range(req.headers)[0] == start:
+                    skip_size = 0
+                elif req.status_code == 200 and (not etag or req.headers.get('ETag') == etag):
+                    # The server does not take byte ranges, the bytes before the start are read and dropped
+                    skip_size = start
+                elif req.status_code == 200:
+                    raise OSError('The remote file changed since it was opened {}'.format(file_url))
+                elif self._is_retryable_status(req.status_code):
+                    continue
+                else:
+                    raise OSError('Status code {}: the range can not be read {}'.format(req.status_code, file_url))
+
+                data = bytearray()
+                remaining_size = skip_size + end - start + 1
+                while remaining_size > 0:
+                    chunk = req.raw.read(min(self.buffer_size, remaining_size))
+                    if not chunk:
+                        break
+                    remaining_size -= len(chunk)
+                    self._count_received_bytes(req, len(chunk))
+                    if skip_size >= len(chunk):
+                        skip_size -= len(chunk)
+                        continue
+                    data += chunk[skip_size:]
+                    skip_size = 0
+                if remaining_size == 0:
+                    return bytes(data)
+            except requests.RequestException:
+                pass
+            finally:
+                if req is not None:
+                    self._close_response(req)
+
+        raise OSError('Sorry, the range {}-{} could not be read {}'.format(start, end, file_url))
+
+    # ###
+    # ### Sends the GET request of a file with optional range headers; validator_mirror is the base url of the mirror
+    # ### the If-Range validator came from (None- the origin)
+    # ###
+    def _request_file(self, file_url, request_headers=None, validator_mirror=None):
+        request_type = 'range' if request_headers and 'Range' in request_headers else 'file'
+        if self._mirror_pool is not None and file_url.startswith(self.url_to_download.rstrip('/') + '/'):
+            return self._request_file_from_mirrors(file_url, request_headers, request_type, validator_mirror)
+        if request_headers and 'If-Range' in request_headers and \
+                validator_mirror not in (None, self.url_to_download.rstrip('/')):
+            # A validator of a mirror that is not used any more can not be checked, the file starts again from 0
+            request_headers = self._remove_range_headers(request_headers)
+            request_type = 'file'
+        return self._send_request('GET', file_url, request_headers, request_type=request_type)
+
+    # ###
+    # ### Sends the GET request of a file to the mirror expected to serve it the soonest; a mirror that fails or sends
+    # ### a response that does not agree with the file is counted against and the next one is tried. The last response
+    # ### is given back if no mirror sends a good one, the last error raised if none answers.
+    # ###
+    def _request_file_from_mirrors(self, file_url, request_headers, request_type, validator_mirror=None):
+        # ### Bytes asked for- the range, or the rest of the file
+        size = self._mirror_file_sizes.get(file_url)
+        if request_headers and 'Range' in request_headers:
+            first_byte, _, last_byte = request_headers['Range'][len('bytes='):].partition('-')
+            if last_byte:
+                size = int(last_byte) - int(first_byte) + 1
+            elif size:
+                size -= int(first_byte)
+
+        tried_mirrors = []
+        req, error = None, None
+        while True:
+            mirror = self._mirror_pool.choose(tried_mirrors, size)
+            if mirror is None:
+                break
+            tried_mirrors.append(mirror)
+            if req is not None:
+                self._close_response(req)
+                req = None
+
+            start_time = time.perf_counter()
+            self._mirror_pool.start(mirror)
+            try:
+                # ### A validator means something only to the mirror it came from (None- the origin)
+                mirror_headers = request_headers
+                if request_headers and 'If-Range' in request_headers and \
+                        mirror != (validator_mirror or self._mirror_pool.base_urls[0]):
+                    mirror_headers = self._make_mirror_headers(mirror, file_url, request_headers)
+                    if mirror_headers is None:
+                        self._mirror_pool.record_failure(mirror)
+                        continue
+                req = self._send_request('GET', self._get_mirror_url(mirror, file_url), mirror_headers,
+                                         request_type=request_type if 'Range' in (mirror_headers or {}) else 'file')
+            except Exception as request_error:
+                self._mirror_pool.record_failure(mirror)
+                self.metrics.increment('dihc_mirror_requests_total', mirror=mirror, status='error')
+                error = request_error
+                continue
+
+            self.metrics.increment('dihc_mirror_requests_total', mirror=mirror, status=req.status_code)
+            if req.status_code in (200, 206, 416) and self._is_mirror_response_consistent(file_url, mirror, req):
+                req.mirror = mirror
+                req.mirror_start_time = start_time
+                req.mirror_received_size = 0
+                return req
+            self._mirror_pool.record_failure(mirror)
+
+        if req is None:
+            raise error or OSError('No mirror is available for {}'.format(file_url))
+        return req
+
+    # ###
+    # ### Range headers of a file request to a mirror other than the one the If-Range validator came from- the mirror
+    # ### gets its own ETag, asked for by a HEAD request if not known yet, and without one the range is left out so the
+    # ### file starts again from 0. None if the HEAD request shows the mirror does not have the same file.
+    # ###
+    def _make_mirror_headers(self, mirror, file_url, request_headers):
+        with self._mirror_lock:
+            mirror_etag = self._mirror_etags.get((mirror, file_url))
+        if mirror_etag is None:
+            req = self._send_request('HEAD', self._get_mirror_url(mirror, file_url), {'Accept-Encoding': 'identity'},
+                                     request_type='head')
+            self._close_response(req)
+            if req.status_code != 200 or not self._is_mirror_response_consistent(file_url, mirror, req):
+                return None
+            with self._mirror_lock:
+                mirror_etag = self._mirror_etags.get((mirror, file_url))
+
+        mirror_headers = self._remove_range_headers(request_headers)
+        if mirror_etag and not mirror_etag.startswith('W/'):
+            mirror_headers['Range'] = request_headers['Range']
+            mirror_headers['If-Range'] = mirror_etag
+        return mirror_headers
+
+    # ###
+    # ### Copy of request headers without the byte range and its validator
+    # ###
+    def _remove_range_headers(self, request_headers):
+        return {name: value for name, value in request_headers.items() if name not in ('Range', 'If-Range')}
+
+    # ###
+    # ### Url of a file of the origin on a mirror
+    # ###
+    def _get_mirror_url(self, mirror, file_url):
+        return mirror + file_url[len(self.url_to_download.rstrip('/')):]
+
+    # ###
+    # ### If the response of a mirror agrees with the file- the size of the crawl and the ETag the mirror gave before
+    # ###
+    def _is_mirror_response_consistent(self, file_url, mirror, req):
+        # The origin is the reference, a file changed on it is found by the usual checks; its first ETag is kept for
+        # the resumes validated by another mirror
+        if mirror == self._mirror_pool.base_urls[0]:
+            if req.headers.get('ETag') and req.status_code != 416:
+                with self._mirror_lock:
+                    self._mirror_etags.setdefault((mirror, file_url), req.headers['ETag'])
+            return True
+
+        if req.status_code == 200:
+            total_size = self._find_file_info_in_headers(req.headers)['size'] \
+                if req.headers.get('Content-Encoding', 'identity') == 'identity' else None
+        else:
+            total_size = self._find_content_range(req.headers)[1]
+        expected_size = self._mirror_file_sizes.get(file_url)
+        is_consistent = expected_size is None or total_size is None or total_size == expected_size
+
+        etag = req.headers.get('ETag')
+        if is_consistent and etag and req.status_code != 416:
+            with self._mirror_lock:
+                is_consistent = self._mirror_etags.setdefault((mirror, file_url), etag) == etag
+
+        if not is_consistent:
+            self.metrics.increment('dihc_mirror_inconsistent_total', mirror=mirror)
+            self._print_file_line('@@@ Mirror response does not agree with the file, trying another mirror {}'.format(
+                self._get_mirror_url(mirror, file_url)))
+        return is_consistent
+
+    # ###
+    # ### Headers and first bytes of a file from one mirror- its latency, throughput, size and ETag
+    # ###
+    def _probe_mirror(self, mirror, file_url, expected_size, probe_size):
+        result = {'latency': None, 'throughput': None, 'size': None, 'etag': None, 'is_consistent': False}
+        mirror_url = self._get_mirror_url(mirror, file_url)
+
+        self._mirror_pool.start(mirror)
+        req = None
+        try:
+            req = self._send_request('HEAD', mirror_url, {'Accept-Encoding': 'identity'}, request_type='head')
+            if req.status_code != 200:
+                raise OSError('Status code {}'.format(req.status_code))
+            file_info = self._find_file_info_in_headers(req.headers)
+            result['latency'] = req.elapsed.total_seconds()
+        except Exception:
+            self._mirror_pool.record_failure(mirror)
+            return result
+        finally:
+            if req is not None:
+                self._close_response(req)
+
+        result['size'], result['etag'] = file_info['size'], file_info['etag']
+        result['is_consistent'] = expected_size is None or file_info['size'] == expected_size
+        if not result['is_consistent']:
+            self._mirror_pool.record_failure(mirror)
+            self._mirror_pool.disable(mirror)
+            self.metrics.increment('dihc_mirror_inconsistent_total', mirror=mirror)
+            return result
+        if file_info['etag']:
+            with self._mirror_lock:
+                self._mirror_etags[(mirror, file_url)] = file_info['etag']
+
+        # ### Throughput of the first bytes, the time of the headers included
+        received_size = 0
+        start_time = time.perf_counter()
+        req = None
+        try:
+            if probe_size > 0:
+                req = self._send_request('GET', mirror_url, {'Range': 'bytes=0-{}'.format(probe_size - 1)},
+                                         request_type='range')
+                req.raw.decode_content = True
+                while req.status_code in (200, 206) and received_size < probe_size:
+                    data = req.raw.read(min(self.buffer_size, probe_size - received_size))
+                    if not data:
+                        break
+                    received_size += len(data)
+                    self._count_received_bytes(req, len(data))
+        except Exception:
+            pass
+        finally:
+            if req is not None:
+                self._close_response(req)
+        elapsed_time = time.perf_counter() - start_time
+        if received_size and elapsed_time > 0:
+            result['throughput'] = received_size / elapsed_time
+
+        self._mirror_pool.finish(mirror, 0, 0.0, result['latency'])
+        self._mirror_pool.record_probe(mirror, result['throughput'], result['latency'])
+        return result
+
+    # ###
+    # ### Sends a request (streamed) once the host has a free connection slot; the slot is held until the response is
+    # ### given to _close_response(). The request type ('head', 'listing', 'file', 'range'...) labels its metrics.
+    # ###
+    def _send_request(self, method, url, request_headers=None, request_type=None):
+        request_type = request_type or method.lower()
+        host_limiter = self._get_host_limiter(url)
+        if host_limiter is not None:
+            start_time = time.perf_counter()
+            host_limiter.acquire()
+            self.metrics.observe('dihc_host_slot_wait_seconds', time.perf_counter() - start_time, type=request_type)
+
+        try:
+            auth = (self.username, self._password) if self.username else None
+            req = self._get_session().request(method, url, headers=request_headers, auth=auth, stream=True,
+                                              allow_redirects=(method != 'HEAD'))
+        except Exception:
+            if host_limiter is not None:
+                host_limiter.release()
+            self.metrics.increment('dihc_requests_total', type=request_type, status='error')
+            raise
+
+        # ### Latency until the response headers
+        self.metrics.increment('dihc_requests_total', type=request_type, status=req.status_code)
+        self.metrics.observe('dihc_request_seconds', req.elapsed.total_seconds(), type=request_type)
+        req.host_limiter = host_limiter
+        return req
+
+    # ###
+    # ### Closes a response and gives its connection slot back with its status and latency
+    # ###
+    def _close_response(self, req):
+        req.close()
+        host_limiter = getattr(req, 'host_limiter', None)
+        if host_limiter is not None:
+            req.host_limiter = None
+            host_limiter.release(req.status_code, req.elapsed.total_seconds())
+        # ### Throughput and latency of the mirror that sent the response
+        mirror = getattr(req, 'mirror', None)
+        if mirror is not None:
+            req.mirror = None
+            self._mirror_pool.finish(mirror, req.mirror_received_size, time.perf_counter() - req.mirror_start_time,
+                                     req.elapsed.total_seconds())
+
+    # ###
+    # ### Limiter of the connections to the host of the url, None if the connections are not limited
+    # ###
+    def _get_host_limiter(self, url):
+        if not self.max_connections_per_host:
+            return None
+
+        host = urlparse(url).netloc
+        with self._host_limiters_lock:
+            host_limiter = self._host_limiters.get(host)
+            if host_limiter is None:
+                host_limiter = HostLimiter(self.max_connections_per_host, is_adaptive=self.adaptive_concurrency)
+                self._host_limiters[host] = host_limiter
+        return host_limiter
+
+    # ###
+    # ### Counts the received bytes for the throughput of the host and waits for the bandwidth limit if any
+    # ###
+    def _count_received_bytes(self, req, number_of_bytes):
+        self.metrics.increment('dihc_received_bytes_total', number_of_bytes)
+        host_limiter = getattr(req, 'host_limiter', None)
+        if host_limiter is not None:
+            host_limiter.add_bytes(number_of_bytes)
+        if getattr(req, 'mirror', None) is not None:
+            req.mirror_received_size += number_of_bytes
+            self.metrics.increment('dihc_mirror_received_bytes_total', number_of_bytes, mirror=req.mirror)
+        if self._bandwidth_bucket is not None:
+            self._bandwidth_bucket.consume(number_of_bytes)
+
+    # ###
+    # ### Reads the response body in large reads straight into the reusable buffers of the writer, up to max_size bytes
+    # ### if given; returns the number of bytes read
+    # ###
+    def _write_response(self, req, writer, max_size=None):
+        req.raw.decode_content = True
+        read_size = 0
+
+        while max_size is None or read_size < max_size:
+            buffer = writer.get_buffer()
+            view = memoryview(buffer)
+            if max_size is not None:
+                view = view[:max_size - read_size]
+            # Reads no bigger than the burst keep a limited bandwidth smooth
+            if self._bandwidth_bucket is not None:
+                view = view[:self._bandwidth_bucket.burst]
+
+            length = 0
+            while length < len(view):
+                number_of_bytes = req.raw.readinto(view[length:])
+                if not number_of_bytes:
+                    break
+                length += number_of_bytes
+            writer.write(buffer, length)
+            read_size += length
+            self._count_received_bytes(req, length)
+
+            if length < len(view):
+                break
+
+        return read_size
+
+    # ###
+    # ### Write-behind writer of a .tmp file at the offset, with the buffer, preallocation and fsync settings
+    # ###
+    def _open_file_writer(self, tmp_filename, offset, preallocate_size, written_callback, is_truncated=True,
+                          expected_size=None):
+        # Small files do not need buffers of the full size
+        buffer_size = self.buffer_size
+        if expected_size is not None:
+            buffer_size = max(1024, min(buffer_size, expected_size))
+
+        return DIHC_File_Writer(tmp_filename, offset=offset, is_truncated=is_truncated,
+                                preallocate_size=preallocate_size if self.preallocate else None,
+                                buffer_size=buffer_size, number_of_buffers=self.write_buffers,
+                                is_fsync_needed=self.fsync_policy != 'none', written_callback=written_callback,
+                                hasher=self._hashers.get(tmp_filename), metrics=self.metrics)
+
+    # ###
+    # ### Saves the state of a .tmp file, flushing its written bytes first with the 'checkpoint' fsync policy, so the
+    # ### state never counts bytes lost in a power cut
+    # ###
+    def _checkpoint_partial_state(self, tmp_filename, partial_state, writer):
+        if self.fsync_policy == 'checkpoint':
+            writer.fsync()
+        self._save_partial_state(tmp_filename, partial_state)
+
+    # ###
+    # ### Range header for the bytes start-end (end inclusive, None for the rest of the file) with the If-Range
+    # ### validator of the partial file, so a changed file is sent whole (200) instead of a wrong piece
+    # ###
+    def _make_range_headers(self, start, end, partial_state):
+        request_headers = {'Range': 'bytes={}-{}'.format(start, '' if end is None else end)}
+
+        if partial_state:
+            etag = partial_state.get('etag')
+            if etag and not etag.startswith('W/'):
+                request_headers['If-Range'] = etag
+            elif partial_state.get('last_modified'):
+                request_headers['If-Range'] = partial_state['last_modified']
+
+        return request_headers
+
+    # ###
+    # ### First byte and total size from the Content-Range header ('bytes 100-199/1000' or 'bytes */1000'), None if
+    # ### not found
+    # ###
+    def _find_content_range(self, headers):
+        first_byte = None
+        total_size = None
+
+        try:
+            byte_range, size = headers['Content-Range'].split()[-1].split('/')
+            if byte_range != '*':
+                first_byte = int(byte_range.split('-')[0])
+            if size != '*':
+                total_size = int(size)
+        except (KeyError, IndexError, ValueError):
+            pass
+
+        return first_byte, total_size
+
+    # ###
+    # ### Download a large file in byte range segments written in parallel into the preallocated .tmp file;
+    # ### returns (=1 complete or =0 problem downloading, None) or (None, whole file response) if the server sent the
+    # ### whole file instead of the range (ranges not accepted or the file changed)
+    # ###
+    def _download_file_in_segments(self, file_url, filename, total_size, partial_state):
+        tmp_filename = filename + self._tmp_suffix
+
+        # ### Segments of an interrupted download resume from their own positions, the bytes of an earlier single
+        # ### connection download are kept as they are
+        segments = None
+        if partial_state and partial_state.get('segments') and partial_state.get('size') == total_size:
+            segments = partial_state['segments']
+        elif partial_state and partial_state.get('segments'):
+            # The preallocated .tmp file of another version of the file is of no use
+            self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+            partial_state = None
+        if segments is None:
+            downloaded_size = 0
+            if os.path.exists(tmp_filename):
+                downloaded_size = min(self._find_downloaded_size(tmp_filename, partial_state), total_size)
+            segments = self._plan_segments(downloaded_size, total_size)
+
+        pending_segments = [segment for segment in segments if segment[2] < segment[1] - segment[0] + 1]
+        if not pending_segments:
+            self._remove_partial_state(tmp_filename)
+            return 1, None
+
+        # ### The first segment request tells if the server accepts byte ranges
+        first_segment = pending_segments[0]
+        try:
+            first_response = self._request_file(file_url, self._make_range_headers(
+                first_segment[0] + first_segment[2], first_segment[1], partial_state),
+                (partial_state or {}).get('mirror'))
+        except Exception:
+            self._print_file_line('Sorry, something went wrong requesting a file segment.')
+            return 0, None
+
+        if first_response.status_code == 200:
+            self._print_file_line('Byte range not sent, downloading in one connection %s' % file_url)
+            if os.path.exists(tmp_filename):
+                self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+            return None, first_response
+        if first_response.status_code != 206:
+            self._print_file_line('Status code {}: Something went wrong downloading file.'.format(
+                first_response.status_code))
+            self._record_failed_status(first_response.status_code)
+            self._close_response(first_response)
+            return 0, None
+
+        # ### Every segment writes at its own offset, so the .tmp file gets its whole size before (sparse at least)
+        with open(tmp_filename, 'ab') as f:
+            if self.preallocate:
+                preallocate_file(f, total_size)
+            elif os.fstat(f.fileno()).st_size < total_size:
+                f.truncate(total_size)
+        if not partial_state:
+            partial_state = {'size': total_size, 'etag': first_response.headers.get('ETag'),
+                             'last_modified': first_response.headers.get('Last-Modified'),
+                             'mirror': getattr(first_response, 'mirror', None)}
+        partial_state['segments'] = segments
+        self._save_partial_state(tmp_filename, partial_state)
+
+        segments_lock = threading.Lock()
+        saved_size = [sum(segment[2] for segment in segments)]
+        file_progress = self._open_file_progress(file_url, 'Downloading \"' + self._get_filename_from_url(file_url)
+                                                 + '\" in {} segments'.format(len(pending_segments)), total_size,
+                                                 saved_size[0])
+
+        def segment_progress(number_of_bytes, writer):
+            with segments_lock:
+                file_progress.update(number_of_bytes)
+                downloaded_size = sum(segment[2] for segment in segments)
+                if downloaded_size - saved_size[0] >= self._partial_state_save_interval:
+                    self._checkpoint_partial_state(tmp_filename, partial_state, writer)
+                    saved_size[0] = downloaded_size
+
+        with ThreadPoolExecutor(max_workers=len(pending_segments)) as executor:
+            futures = [executor.submit(self._download_segment, file_url, tmp_filename, segment, partial_state,
+                                       segment_progress, first_response if segment is first_segment else None)
+                       for segment in pending_segments]
+            segment_results = [future.result() for future in futures]
+        file_progress.close()
+
+        if all(segment_results):
+            self._remove_partial_state(tmp_filename)
+            return 1, None
+
+        # ### A file changed on the server during the download has to start again
+        if None in segment_results:
+            self._print_file_line('Changed on the server while downloading, it will start again %s' % file_url)
+            self._remove_partial_state(tmp_filename, is_tmp_removed=True)
+        else:
+            self._save_partial_state(tmp_filename, partial_state)
+        return 0, None
+
+    # ###
+    # ### Splits the bytes not downloaded yet into segments [start, end (inclusive), downloaded bytes]
+    # ###
+    def _plan_segments(self, downloaded_size, total_size):
+        segments = []
+        if downloaded_size > 0:
+            segments.append([0, downloaded_size - 1, downloaded_size])
+
+        remaining_size = total_size - downloaded_size
+        number_of_segments = max(1, min(self.segments, remaining_size // self._min_segment_size))
+        segment_size = -(-remaining_size // number_of_segments)
+        for start in range(downloaded_size, total_size, segment_size):
+            segments.append([start, min(start + segment_size, total_size) - 1, 0])
+
+        return segments
+
+    # ###
+    # ### Downloads a segment at its offset of the .tmp file, True when the segment is complete, None if the file
+    # ### changed on the server
+    # ###
+    def _download_segment(self, file_url, tmp_filename, segment, partial_state, segment_progress, req=None):
+        start, end, _ = segment
+        writer = None
+
+        # ### Only the bytes the writer has written count as downloaded
+        def written(number_of_bytes):
+            segment[2] += number_of_bytes
+            segment_progress(number_of_bytes, writer)
+
+        try:
+            if req is None:
+                req = self._request_file(file_url, self._make_range_headers(start + segment[2], end, partial_state),
+                                         partial_state.get('mirror'))
+            if req.status_code == 200:
+                return None
+            if req.status_code != 206 or self._find_content_range(req.headers)[0] != start + segment[2]:
+                self._print_file_line('Status code {}: Something went wrong downloading file segment.'.format(
+                    req.status_code))
+                return False
+
+            writer = self._open_file_writer(tmp_filename, start + segment[2], None, written, is_truncated=False,
+                                            expected_size=end - start + 1 - segment[2])
+            self._write_response(req, writer, end - start + 1 - segment[2])
+        except Exception:
+            self._print_file_line('Sorry, something went wrong downloading file segment.')
+        finally:
+            try:
+                if writer is not None:
+                    writer.close()
+            except OSError:
+                self._print_file_line('Sorry, something went wrong writing file segment.')
+            if req is not None:
+                self._close_response(req)
+
+        return segment[2] >= end - start + 1
+
+    # ###
+    # ### Saves, loads and removes the state of a .tmp file- {'size', 'etag', 'last_modified', 'segments' (None when
+    # ### the .tmp file is written from its start in one connection), 'downloaded' (bytes of a preallocated .tmp file
+    # ### written in one connection)}
+    # ###
+    def _save_partial_state(self, tmp_filename, partial_state):
+        state_filename = tmp_filename + self._partial_state_suffix
+        try:
+            with open(state_filename + '.tmp', 'w') as f:
+                json.dump(partial_state, f)
+            os.replace(state_filename + '.tmp', state_filename)
+        except (OSError, TypeError, ValueError):
+            self._print_file_line('Sorry, the download state could not be saved in %s' % state_filename)
+
+    def _find_downloaded_size(self, tmp_filename, partial_state):
+        downloaded_size = os.path.getsize(tmp_filename)
+        if partial_state and partial_state.get('downloaded') is not None:
+            downloaded_size = min(downloaded_size, partial_state['downloaded'])
+        return downloaded_size
+
+    def _load_partial_state(self, tmp_filename):
+        try:
+            with open(tmp_filename + self._partial_state_suffix) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_partial_state(self, tmp_filename, is_tmp_removed=False):
+        for filename in (tmp_filename + self._partial_state_suffix, tmp_filename if is_tmp_removed else None):
+            if filename and os.path.exists(filename):
+                os.remove(filename)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_File_Writer.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 2:40 pm
+"""
+
+
+""" Write-behind file writer of the downloads
+
+This script contains a class that writes the downloaded bytes of a file on its own thread, so the next part of the file
+is read from the network while the last one is written to the disk. The bytes are read straight into a small pool of
+large reusable buffers (readinto), which keeps the number of Python level reads and writes per file low. It also has
+the helpers that preallocate a file of known size, flush it to the disk and move the finished .tmp file in place.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import os
+import queue
+import threading
+import time
+
+
+# ###
+# ### Reserves the disk space of a file of known size
+# ###
+def preallocate_file(file, size):
+    """Reserves the disk space of a file up to the given size, so it is written without growing and fragmenting.
+    Files systems without fallocate get a sparse file of that size.
+
+    Parameters
+    ----------
+    file : file object
+        File opened for writing in binary mode
+    size : int
+        Size of the file in bytes
+
+    Returns
+    -------
+    None
+    """
+
+
+    if os.fstat(file.fileno()).st_size >= size:
+        return
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except (AttributeError, OSError):
+        file.truncate(size)
+
+
+# ###
+# ### Moves a finished .tmp file to its name, flushing the directory entry if asked
+# ###
+def move_file_in_place(tmp_filename, filename, is_fsync_needed=False):
+    """Renames the finished .tmp file atomically, the file is either missing or complete under its name
+
+    Parameters
+    ----------
+    tmp_filename : str
+        Path of the finished .tmp file
+    filename : str
+        Final path of the file
+    is_fsync_needed : bool
+        Flushes the directory, so the rename survives a power loss
+
+    Returns
+    -------
+    None
+    """
+
+
+    os.replace(tmp_filename, filename)
+    if is_fsync_needed and hasattr(os, 'O_DIRECTORY'):
+        directory_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+
+class DIHC_File_Writer:
+    """ Writer class that writes the buffers of a file on its own thread (write-behind)
+
+    The reader takes a free buffer with get_buffer(), fills it (e.g. response.raw.readinto()) and passes it to write().
+    The buffer goes back to the pool after it is written, so at most number_of_buffers buffers are in memory and the
+    reader waits when the disk is behind. Bytes objects can also be passed to write(). The first write error stops the
+    writer and is raised to the reader by the next call.
+
+    Properties
+    -----------
+    filename : str
+        Path of the file, created if missing
+    offset : int
+        Position of the first written byte
+    is_truncated : bool
+        Cuts the file at the offset before writing, so nothing of an earlier download is left after the new bytes
+    preallocate_size : int
+        Reserves the disk space of the file up to this size, if known
+    buffer_size : int
+        Size of each reusable buffer (in bytes)
+    number_of_buffers : int
+        Number of buffers in flight between the reader and the writer thread
+    is_fsync_needed : bool
+        Flushes the file to the disk when closed
+    written_callback : function
+        Called on the writer thread with the number of bytes after every write
+    hasher : object
+        Takes every written block with its file offset- update(offset, data) (e.g. DIHC_Checksum.StreamingHasher)
+    metrics : object
+        Takes the seconds of every disk write and the seconds the reader waited for the disk (e.g. DIHC_Metrics)
+
+    Methods
+    --------
+    __init()__
+        Takes- filename and optional properties from above | Returns- Object of this class | Func- Opens the file and
+        starts the writer thread
+    get_buffer()
+        Takes- none | Returns- bytearray | Func- Free buffer to fill, waits for one if all of them are in flight
+    write()
+        Takes- buffer or bytes, optional length | Returns- none | Func- Queues the bytes to be written
+    fsync()
+        Takes- none | Returns- none | Func- Flushes the written bytes to the disk
+    close()
+        Takes- none | Returns- none | Func- Writes the queued bytes, flushes them if needed and closes the file
+    """
+
+
+    # ###
+    # ### Open the file and start the writer thread
+    # ###
+    def __init__(self, filename, offset=0, is_truncated=False, preallocate_size=None, buffer_size=1024 ** 2,
+                 number_of_buffers=4, is_fsync_needed=False, written_callback=None, hasher=None, metrics=None):
+        """Opens the file at the offset and starts the writer thread
+
+        Parameters
+        ----------
+        Same as the properties of this class
+
+        Returns
+        -------
+        object
+            Object of this current class
+
+        Examples
+        --------
+            writer = DIHC_File_Writer('./a.edf.tmp', offset=0, is_truncated=True, preallocate_size=total_size)
+            buffer = writer.get_buffer()
+            writer.write(buffer, response.raw.readinto(buffer))
+            writer.close()
+        """
+
+
+        self.filename = filename
+        self.offset = offset
+        self.written_size = 0
+        self.is_fsync_needed = is_fsync_needed
+        self._written_callback = written_callback
+        self._hasher = hasher
+        self._metrics = metrics
+        self._error = None
+
+        # Unbuffered, every write reaches the OS before it is counted as written
+        self._file = open(filename, 'r+b' if os.path.exists(filename) else 'w+b', buffering=0)
+        try:
+            if is_truncated:
+                self._file.truncate(offset)
+            if preallocate_size:
+                preallocate_file(self._file, preallocate_size)
+            self._file.seek(offset)
+        except OSError:
+            self._file.close()
+            raise
+
+        # The buffers are made when first needed, a writer of bytes objects never makes any
+        self._buffer_size = buffer_size
+        self._number_of_buffers = max(1, number_of_buffers)
+        self._free_buffers = queue.Queue()
+        self._buffer_ids = set()
+        self._write_queue = queue.Queue(maxsize=max(1, number_of_buffers))
+        self._thread = threading.Thread(target=self._write_queued_buffers, daemon=True)
+        self._thread.start()
+
+    def get_buffer(self):
+        """Free buffer to fill, waits for one if all of them are in flight
+
+        Returns
+        -------
+        bytearray
+        """
+
+
+        self._raise_error()
+        try:
+            return self._free_buffers.get_nowait()
+        except queue.Empty:
+            if len(self._buffer_ids) < self._number_of_buffers:
+                buffer = bytearray(self._buffer_size)
+                self._buffer_ids.add(id(buffer))
+                return buffer
+
+        # ### All the buffers are in flight, the reader waits for the disk
+        start_time = time.perf_counter()
+        buffer = self._free_buffers.get()
+        self._count_wait_time(start_time)
+        return buffer
+
+    def write(self, data, length=None):
+        """Queues the bytes to be written, a buffer of the pool goes back to it once written
+
+        Parameters
+        ----------
+        data : bytearray or bytes
+            Buffer of get_buffer() or any bytes
+        length : int
+            Number of bytes of the buffer to write, all of them by default
+
+        Returns
+        -------
+        None
+        """
+
+
+        self._raise_error()
+        try:
+            self._write_queue.put_nowait((data, len(data) if length is None else length))
+        except queue.Full:
+            start_time = time.perf_counter()
+            self._write_queue.put((data, len(data) if length is None else length))
+            self._count_wait_time(start_time)
+
+    def fsync(self):
+        """Flushes the bytes written so far to the disk (call it from the written_callback to flush everything queued
+        before)
+
+        Returns
+        -------
+        None
+        """
+
+
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Writes the queued bytes, flushes them to the disk if needed and closes the file. Raises the write error, if
+        any.
+
+        Returns
+        -------
+        None
+        """
+
+
+        if self._thread.is_alive():
+            self._write_queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            try:
+                if self.is_fsync_needed and self._error is None:
+                    self.fsync()
+            finally:
+                self._file.close()
+        self._raise_error()
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Writes the queued buffers in order until close()
+    # ###
+    def _write_queued_buffers(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            data, length = item
+
+            if self._error is None and length > 0:
+                try:
+                    view = memoryview(data)[:length]
+                    if self._hasher is not None:
+                        self._hasher.update(self.offset + self.written_size, view)
+                    start_time = time.perf_counter()
+                    while view:
+                        view = view[self._file.write(view):]
+                    if self._metrics is not None:
+                        self._metrics.observe('dihc_disk_write_seconds', time.perf_counter() - start_time)
+                        self._metrics.increment('dihc_written_bytes_total', length)
+                    self.written_size += length
+                    if self._written_callback is not None:
+                        self._written_callback(length)
+                except Exception as error:
+                    self._error = error
+
+            if id(data) in self._buffer_ids:
+                self._free_buffers.put(data)
+
+    def _count_wait_time(self, start_time):
+        if self._metrics is not None:
+            self._metrics.increment('dihc_writer_wait_seconds_total', time.perf_counter() - start_time)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
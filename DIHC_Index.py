@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Index.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:20 am
+"""
+
+
+""" Persistent crawl and download index of a web directory
+
+This script contains a class that keeps what is known about the remote web directory in a SQLite file inside the
+download directory. For every directory listing it records the validators (ETag, Last-Modified), a digest of the page
+and the urls found in it. For every file it records the size, ETag, modification time and the local download state.
+The next run uses it to send conditional requests for the listings and to skip unchanged files without asking the
+server about them again.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import json
+import sqlite3
+import threading
+
+
+class DIHC_Index:
+    """ Index class that stores the listings and files of a web directory in a SQLite database
+
+    The same object is used by the crawler threads and the download workers, every access is serialized with a lock.
+
+    Properties
+    -----------
+    index_file : str
+        Path of the SQLite database file
+
+    Methods
+    --------
+    __init()__
+        Takes- index_file | Returns- Object of this class | Func- Opens (or creates) the database
+    get_listing()
+        Takes- url | Returns- dict or None | Func- Stored validators, digest and child urls of a directory listing
+    save_listing()
+        Takes- url, path, etag, last_modified, digest, children | Returns- none | Func- Stores a directory listing
+    get_file()
+        Takes- url | Returns- dict or None | Func- Stored size, etag, mtime and state of a file
+    save_files()
+        Takes- list of manifest entries | Returns- list of changed urls | Func- Stores the crawled files, a file that
+        changed on the server goes to the 'changed' state until it is downloaded again
+    set_file_state()
+        Takes- url, state | Returns- none | Func- Records 'complete' or 'failed' for a file after downloading
+    close()
+        Takes- none | Returns- none | Func- Closes the database
+    """
+
+
+    # States of a file in the index
+    STATE_PENDING = 'pending'
+    STATE_COMPLETE = 'complete'
+    STATE_FAILED = 'failed'
+    # Changed on the server since indexed, the local copy is stale until downloaded again
+    STATE_CHANGED = 'changed'
+
+    # ###
+    # ### Open or create the database
+    # ###
+    def __init__(self, index_file):
+        """Opens (or creates) the index database
+
+        Parameters
+        ----------
+        index_file : str
+            Path of the SQLite database file
+
+        Returns
+        -------
+        object
+            Object of this current class
+
+        Examples
+        --------
+            index = DIHC_Index('./dihc_index.sqlite')
+        """
+
+
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(index_file, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('create table if not exists listings (url text primary key, path text, '
+                                     'etag text, last_modified text, digest text, children text)')
+            self._connection.execute('create table if not exists files (url text primary key, path text, '
+                                     'size integer, etag text, mtime real, state text)')
+
+    def get_listing(self, url):
+        """Stored information of a directory listing
+
+        Parameters
+        ----------
+        url : str
+            Url of the directory
+
+        Returns
+        -------
+        dict or None
+            {'url', 'path', 'etag', 'last_modified', 'digest', 'children' (list of urls)} or None if not indexed
+        """
+
+
+        with self._lock:
+            row = self._connection.execute('select url, path, etag, last_modified, digest, children from listings '
+                                           'where url = ?', (url,)).fetchone()
+        if not row:
+            return None
+        return {'url': row[0], 'path': row[1], 'etag': row[2], 'last_modified': row[3], 'digest': row[4],
+                'children': json.loads(row[5] or '[]')}
+
+    def save_listing(self, url, path, etag, last_modified, digest, children):
+        """Stores a directory listing
+
+        Parameters
+        ----------
+        url : str
+            Url of the directory
+        path : str
+            Path of the directory relative to the download directory
+        etag : str
+            ETag header of the listing response, if any
+        last_modified : str
+            Last-Modified header of the listing response, if any
+        digest : str
+            Digest of the listing page
+        children : list(str)
+            Urls found in the listing
+
+        Returns
+        -------
+        None
+        """
+
+
+        with self._lock, self._connection:
+            self._connection.execute('insert or replace into listings (url, path, etag, last_modified, digest, '
+                                     'children) values (?, ?, ?, ?, ?, ?)',
+                                     (url, path, etag, last_modified, digest, json.dumps(children)))
+
+    def get_file(self, url):
+        """Stored information of a file
+
+        Parameters
+        ----------
+        url : str
+            Url of the file
+
+        Returns
+        -------
+        dict or None
+            {'url', 'path', 'size', 'etag', 'mtime', 'state'} or None if not indexed
+        """
+
+
+        with self._lock:
+            row = self._connection.execute('select url, path, size, etag, mtime, state from files where url = ?',
+                                           (url,)).fetchone()
+        if not row:
+            return None
+        return {'url': row[0], 'path': row[1], 'size': row[2], 'etag': row[3], 'mtime': row[4], 'state': row[5]}
+
+    def save_files(self, entries):
+        """Stores the crawled files. A file keeps its state if its size, ETag and modification time did not change,
+        otherwise it goes to the 'changed' state (and stays reported as changed by the next crawls) until its state
+        is set after downloading.
+
+        Parameters
+        ----------
+        entries : list(dict)
+            Manifest entries- {'url', 'path', 'size', 'mtime', 'etag'}
+
+        Returns
+        -------
+        list(str)
+            Urls of the files that were indexed before and changed on the server since then
+        """
+
+
+        changed_urls = []
+        with self._lock, self._connection:
+            for entry in entries:
+                row = self._connection.execute('select size, etag, mtime, state from files where url = ?',
+                                               (entry['url'],)).fetchone()
+                state = self.STATE_PENDING
+                if row and row[:3] == (entry['size'], entry.get('etag'), entry['mtime']):
+                    state = row[3]
+                elif row:
+                    state = self.STATE_CHANGED
+                if state == self.STATE_CHANGED:
+                    changed_urls.append(entry['url'])
+                self._connection.execute('insert or replace into files (url, path, size, etag, mtime, state) '
+                                         'values (?, ?, ?, ?, ?, ?)',
+                                         (entry['url'], entry['path'], entry['size'], entry.get('etag'),
+                                          entry['mtime'], state))
+        return changed_urls
+
+    def set_file_state(self, url, state):
+        """Records the download state of a file
+
+        Parameters
+        ----------
+        url : str
+            Url of the file
+        state : str
+            DIHC_Index.STATE_COMPLETE or DIHC_Index.STATE_FAILED
+
+        Returns
+        -------
+        None
+        """
+
+
+        with self._lock, self._connection:
+            self._connection.execute('update files set state = ? where url = ?', (state, url))
+
+    def close(self):
+        """Closes the database
+
+        Returns
+        -------
+        None
+        """
+
+
+        with self._lock:
+            self._connection.close()
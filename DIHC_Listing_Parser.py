@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Listing_Parser.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 12:10 pm
+"""
+
+
+""" Directory listing parser of web directories
+
+This script contains the parsers that read a directory listing page (Apache/nginx autoindex and similar) and find the
+links in it with the size and date columns shown next to them. A link ending with '/' is a directory, a link with a
+size or a date column is a file, so most urls can be classified without asking the server for their headers.
+Every parser is fed the page in text chunks (feed()) and returns the listing entries when closed (close()). The
+streaming parser works on the chunks as they arrive; the BeautifulSoup parser is kept as the fallback.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import calendar
+import html
+import re
+from functools import lru_cache
+from bs4 import BeautifulSoup, NavigableString
+
+
+# Dates shown by the autoindex pages- 17-Oct-2020 10:05(:30) or 2020-10-17 10:05(:30)
+_MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10,
+           'nov': 11, 'dec': 12}
+_DATE_DMY = re.compile(r'(\d{1,2})-([A-Za-z]{3})-(\d{4})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?')
+_DATE_YMD = re.compile(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?')
+# Size in bytes (nginx / Apache without human readable sizes) or '-' for directories, right after the date
+_SIZE = re.compile(r'^\s*(\d+|-)(?:\s|$)')
+
+
+# ###
+# ### Finds the links of a listing page with their columns
+# ###
+def parse_listing_page(web_page):
+    """Finds all the links of a directory listing page with the size and date columns next to them
+
+    Parameters
+    ----------
+    web_page : str
+        Html of the listing page
+
+    Returns
+    -------
+    list(dict)
+        One entry per link in the page order- {'href': str, 'is_dir': True/False or None if unknown,
+        'size': int bytes or None, 'mtime': float epoch seconds (UTC) or None}
+
+    Examples
+    --------
+        entries = parse_listing_page(req.text)
+    """
+
+
+    entries = []
+    soup = BeautifulSoup(web_page, 'html.parser')
+
+    for node in soup.find_all('a'):
+        href = node.get('href')
+        if href is None:
+            continue
+
+        # ### Table listings keep the columns in the cells of the row, pre listings in the text after the link
+        row = node.find_parent('tr')
+        if row is not None:
+            link_cell = node.find_parent(['td', 'th'])
+            columns = ' '.join(cell.get_text(' ') for cell in row.find_all(['td', 'th']) if cell is not link_cell)
+        else:
+            sibling = node.next_sibling
+            columns = str(sibling).split('\n')[0] if isinstance(sibling, NavigableString) else ''
+
+        entries.append(make_listing_entry(href, columns))
+
+    return entries
+
+
+# ###
+# ### Listing entry of a link from the text of its columns
+# ###
+def make_listing_entry(href, columns):
+    """Makes the listing entry of a link from the text of the columns shown next to it
+
+    Parameters
+    ----------
+    href : str
+        Link as written in the page
+    columns : str
+        Text of the columns next to the link (date and size)
+
+    Returns
+    -------
+    dict
+        {'href', 'is_dir', 'size', 'mtime'}
+    """
+
+
+    size = None
+    mtime = None
+    rest = columns
+
+    match = _DATE_DMY.search(columns)
+    if match:
+        mtime = _date_to_epoch(match.group(0), True)
+        rest = columns[match.end():]
+    else:
+        match = _DATE_YMD.search(columns)
+        if match:
+            mtime = _date_to_epoch(match.group(0), False)
+            rest = columns[match.end():]
+
+    match = _SIZE.match(rest)
+    if match and match.group(1) != '-':
+        size = int(match.group(1))
+
+    is_dir = None
+    if href.endswith('/'):
+        is_dir = True
+    elif (mtime is not None or size is not None):
+        is_dir = False
+
+    return {'href': href, 'is_dir': is_dir, 'size': size, 'mtime': mtime}
+
+
+# ###
+# ### Epoch seconds (UTC) of a listing date, the files of a listing share few distinct dates so they are cached
+# ###
+@lru_cache(maxsize=4096)
+def _date_to_epoch(date, is_day_first):
+    if is_day_first:
+        day, month, year, hour, minute, second = _DATE_DMY.match(date).groups()
+        month = _MONTHS.get(month.lower())
+        if not month:
+            return None
+    else:
+        year, month, day, hour, minute, second = _DATE_YMD.match(date).groups()
+    return float(calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second or 0))))
+
+
+class SoupListingParser:
+    """ Listing parser that keeps the whole page and reads it with BeautifulSoup (html.parser) when it is closed
+
+    It is the slow but forgiving fallback for pages the streaming parser can not read.
+
+    Methods
+    --------
+    feed()
+        Takes- text chunk of the page | Returns- none | Func- Keeps the chunk
+    close()
+        Takes- none | Returns- list of listing entries | Func- Parses the whole page
+    """
+
+
+    def __init__(self):
+        self._chunks = []
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+
+    def close(self):
+        web_page = ''.join(self._chunks)
+        self._chunks = []
+        return parse_listing_page(web_page)
+
+
+class StreamingListingParser:
+    """ Listing parser that reads the page chunk by chunk without building an html tree
+
+    The links are found with a regular expression, line by line, and the text after each link up to the end of its row
+    (end of line, next link or </tr>) is read as its date and size columns. Only the unfinished last line of the page
+    is kept between the chunks. Links it can not read (e.g. an <a> without </a>) are counted in is_incomplete, so the
+    page can be parsed again with SoupListingParser.
+
+    Properties
+    -----------
+    is_incomplete : bool
+        True if the page had links that could not be read
+
+    Methods
+    --------
+    feed()
+        Takes- text chunk of the page | Returns- none | Func- Parses all the complete lines found so far
+    close()
+        Takes- none | Returns- list of listing entries | Func- Parses the rest of the page
+    """
+
+
+    # Bytes of an unfinished line kept before parsing it anyway (pages written in one line)
+    _max_line_size = 1024 * 1024
+
+    def __init__(self):
+        self._buffer = ''
+        self._entries = []
+        self.is_incomplete = False
+
+    def feed(self, chunk):
+        self._buffer += chunk
+
+        cut = self._buffer.rfind('\n')
+        if cut == -1:
+            if len(self._buffer) < self._max_line_size:
+                return
+            cut = self._buffer.rfind('</a')
+            if cut == -1:
+                return
+
+        # ### A link that starts in the parsed part but ends after it waits for the next chunk
+        text = self._buffer[:cut]
+        last_open = max(text.rfind('<a '), text.rfind('<A '))
+        if last_open > max(text.rfind('</a'), text.rfind('</A')):
+            cut = last_open
+
+        self._parse_text(self._buffer[:cut])
+        self._buffer = self._buffer[cut:]
+
+    def close(self):
+        self._parse_text(self._buffer)
+        self._buffer = ''
+        entries = self._entries
+        self._entries = []
+        return entries
+
+    def _parse_text(self, text):
+        opened_links = len(_OPEN_LINK.findall(text))
+        found_links = 0
+
+        for match in _LINK.finditer(text):
+            found_links += 1
+            href = match.group(1)
+            if href is None:
+                href = match.group(2)
+            if href is None:
+                href = match.group(3)
+
+            row_end = _ROW_END.search(text, match.end())
+            columns = text[match.end():row_end.start() if row_end else len(text)]
+            if '<' in columns:
+                columns = _TAG.sub(' ', columns)
+            if '&' in columns:
+                columns = html.unescape(columns).replace('\xa0', ' ')
+            if '&' in href:
+                href = html.unescape(href)
+            self._entries.append(make_listing_entry(href, columns))
+
+        if found_links < opened_links:
+            self.is_incomplete = True
+
+
+# Links with their href (double, single or not quoted), the columns end at the end of the line, the next link or row
+_LINK = re.compile(r'<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+))[^>]*>.*?</a\s*>', re.I | re.S)
+_OPEN_LINK = re.compile(r'<a\s[^>]*?href\s*=', re.I)
+_ROW_END = re.compile(r'\n|</tr|<a\s', re.I)
+_TAG = re.compile(r'<[^>]*>')
+
+# Parsers that can be chosen by name
+LISTING_PARSERS = {'stream': StreamingListingParser, 'soup': SoupListingParser}
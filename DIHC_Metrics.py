@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Metrics.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 6:50 pm
+"""
+
+
+""" Metrics and progress of the downloads
+
+This script contains the instrumentation of the downloader. A metrics collector keeps counters, gauges and latency
+histograms (by name and labels) of the requests, the listing parsing, the transfers and the disk writes, and exports them
+as JSON lines or in the Prometheus text format. Any object with the same methods can be plugged in instead (e.g. to send
+them to a monitoring system); NullMetrics turns the instrumentation off.
+
+The progress of a whole job is shown on a single bar of the bytes and files done, updated at most a few times a second
+whatever the number of files, instead of one bar per file.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from tqdm import tqdm
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class DIHC_Metrics:
+    """ Thread-safe collector of counters, gauges and histograms
+
+    A series is a metric name with its labels, e.g. increment('dihc_requests_total', type='head', status=200).
+
+    Properties
+    -----------
+    buckets : tuple(float)
+        Upper bounds of the histogram buckets
+    start_time : float
+        Epoch seconds the collector was made
+
+    Methods
+    --------
+    increment()
+        Takes- name, optional value and labels | Returns- none | Func- Adds the value (1 by default) to a counter
+    set_gauge()
+        Takes- name, value, optional labels | Returns- none | Func- Sets a gauge
+    observe()
+        Takes- name, value, optional labels | Returns- none | Func- Adds a value (e.g. seconds) to a histogram
+    timer()
+        Takes- name, optional labels | Returns- context manager | Func- Observes the seconds spent in the with block
+    snapshot()
+        Takes- none | Returns- list of dict | Func- Current value of every series
+    to_json_lines()
+        Takes- none | Returns- str | Func- One JSON object per series and line
+    to_prometheus()
+        Takes- none | Returns- str | Func- All the series in the Prometheus text format
+    export()
+        Takes- filename | Returns- none | Func- Writes the Prometheus text (.prom) or appends the JSON lines (others)
+    """
+
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.start_time = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Counts per bucket (the last one is +Inf), sum and count of the values
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def snapshot(self):
+        series = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items(), key=self._get_series_key):
+                series.append({'name': name, 'type': 'counter', 'labels': dict(labels), 'value': value})
+            for (name, labels), value in sorted(self._gauges.items(), key=self._get_series_key):
+                series.append({'name': name, 'type': 'gauge', 'labels': dict(labels), 'value': value})
+            for (name, labels), (bucket_counts, total, count) in sorted(self._histograms.items(),
+                                                                        key=self._get_series_key):
+                cumulative_counts, cumulative_count = [], 0
+                for bucket_count in bucket_counts:
+                    cumulative_count += bucket_count
+                    cumulative_counts.append(cumulative_count)
+                series.append({'name': name, 'type': 'histogram', 'labels': dict(labels), 'count': count,
+                               'sum': total, 'buckets': dict(zip([str(bucket) for bucket in self.buckets] + ['+Inf'],
+                                                                 cumulative_counts))})
+        return series
+
+    def to_json_lines(self):
+        timestamp = time.time()
+        return ''.join(json.dumps(dict(series, timestamp=timestamp)) + '\n' for series in self.snapshot())
+
+    def to_prometheus(self):
+        lines = []
+        described_names = set()
+        for series in self.snapshot():
+            if series['name'] not in described_names:
+                described_names.add(series['name'])
+                lines.append('# TYPE {} {}'.format(series['name'], series['type']))
+            if series['type'] != 'histogram':
+                lines.append(self._format_sample(series['name'], series['labels'], series['value']))
+                continue
+            for bucket, cumulative_count in series['buckets'].items():
+                lines.append(self._format_sample(series['name'] + '_bucket', dict(series['labels'], le=bucket),
+                                                 cumulative_count))
+            lines.append(self._format_sample(series['name'] + '_sum', series['labels'], series['sum']))
+            lines.append(self._format_sample(series['name'] + '_count', series['labels'], series['count']))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, filename):
+        if filename.endswith('.prom'):
+            # Replaced at once, so a Prometheus textfile collector never reads half a file
+            with open(filename + '.tmp', 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(filename + '.tmp', filename)
+        else:
+            with open(filename, 'a') as f:
+                f.write(self.to_json_lines())
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Sort key of a series, the label values compared as text (a status can be a code or 'error')
+    # ###
+    def _get_series_key(self, item):
+        name, labels = item[0]
+        return name, tuple((label, str(value)) for label, value in labels)
+
+    def _format_sample(self, name, labels, value):
+        if not labels:
+            return '{} {}'.format(name, value)
+        label_text = ','.join('{}="{}"'.format(label, str(label_value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for label, label_value in sorted(labels.items()))
+        return '{}{{{}}} {}'.format(name, label_text, value)
+
+
+class NullMetrics:
+    """ Collector that keeps nothing, turns the instrumentation off
+    """
+
+
+    def increment(self, name, value=1, **labels):
+        pass
+
+    def set_gauge(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return contextlib.nullcontext()
+
+    def snapshot(self):
+        return []
+
+    def to_json_lines(self):
+        return ''
+
+    def to_prometheus(self):
+        return ''
+
+    def export(self, filename):
+        pass
+
+
+class JobProgress:
+    """ Single progress bar of a whole job- bytes done out of the known total, files done, failed and in flight
+
+    The bytes of all the files are summed up behind a lock and the bar is refreshed at most once per interval, so many
+    parallel downloads cost about the same as one.
+
+    Methods
+    --------
+    open_file()
+        Takes- file url, optional bytes already on the disk | Returns- object with update()/close() | Func- Progress of
+        one file, counted into the job
+    file_done()
+        Takes- file url, result (=1 downloaded, =2 already downloaded, =0 failed) | Returns- none | Func- Counts the
+        file as done, with its whole size
+    write()
+        Takes- message | Returns- none | Func- Prints a line above the bar without breaking it
+    close()
+        Takes- none | Returns- none | Func- Shows the final numbers and closes the bar
+    """
+
+
+    def __init__(self, sizes, interval=0.5, description='Downloading'):
+        # Size of every file of the job by url (None if unknown)
+        self._sizes = sizes
+        self._counted_sizes = {}
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._pending_size = 0
+        self._refresh_time = 0.0
+        self._files_done = 0
+        self._files_failed = 0
+        self._files_in_flight = 0
+        self._bar = tqdm(total=sum(size or 0 for size in sizes.values()), unit='B', unit_scale=True,
+                         unit_divisor=1024, desc=description)
+
+    def open_file(self, file_url, initial_size=0):
+        with self._lock:
+            self._files_in_flight += 1
+        file_progress = _JobFileProgress(self, file_url)
+        if initial_size:
+            file_progress.update(initial_size)
+        return file_progress
+
+    def file_done(self, file_url, result):
+        with self._lock:
+            if result in (1, 2):
+                self._files_done += 1
+                size = self._sizes.get(file_url)
+                if size is not None:
+                    self._pending_size += max(0, size - self._counted_sizes.get(file_url, 0))
+                    self._counted_sizes[file_url] = size
+            else:
+                self._files_failed += 1
+            self._refresh()
+
+    def write(self, message):
+        # The bar is cleared, the line printed and the bar drawn again below it
+        tqdm.write(message)
+
+    def close(self):
+        with self._lock:
+            self._refresh(is_forced=True)
+            self._bar.close()
+
+
+
+    # ######################################## Private methods zone ########################################
+    def _add_bytes(self, file_url, number_of_bytes):
+        with self._lock:
+            # A file downloaded again (after a failure) is not counted twice
+            counted_size = self._counted_sizes.get(file_url, 0)
+            size = self._sizes.get(file_url)
+            if size is not None:
+                number_of_bytes = max(0, min(number_of_bytes, size - counted_size))
+            self._counted_sizes[file_url] = counted_size + number_of_bytes
+            self._pending_size += number_of_bytes
+            self._refresh()
+
+    def _close_file(self):
+        with self._lock:
+            self._files_in_flight -= 1
+
+    def _refresh(self, is_forced=False):
+        now = time.monotonic()
+        if not is_forced and now - self._refresh_time < self._interval:
+            return
+        self._refresh_time = now
+        self._bar.set_postfix_str('files {}/{}, failed {}, active {}'.format(
+            self._files_done, len(self._sizes), self._files_failed, self._files_in_flight), refresh=False)
+        self._bar.update(self._pending_size)
+        self._pending_size = 0
+
+
+class _JobFileProgress:
+    # Progress of one file of a JobProgress
+    def __init__(self, job_progress, file_url):
+        self._job_progress = job_progress
+        self._file_url = file_url
+        self._is_closed = False
+
+    def update(self, number_of_bytes):
+        self._job_progress._add_bytes(self._file_url, number_of_bytes)
+
+    def close(self):
+        if not self._is_closed:
+            self._is_closed = True
+            self._job_progress._close_file()
+
+
+class FileProgress:
+    """ Progress bar of one file (in KB), the view of the earlier versions
+    """
+
+
+    def __init__(self, description, total_size, initial_size=0):
+        self._bar = tqdm(total=total_size / 1024, initial=initial_size / 1024, unit='KB', desc=description)
+
+    def update(self, number_of_bytes):
+        self._bar.update(number_of_bytes / 1024)
+
+    def close(self):
+        self._bar.close()
+
+
+class NullProgress:
+    """ Progress of one file that shows nothing
+    """
+
+
+    def update(self, number_of_bytes):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Mirrors.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:55 pm
+"""
+
+
+""" Mirrors of the web directory
+
+This script contains the pool of the equivalent base urls (origins and mirrors) a download is spread over. Every file
+request (and every byte range segment of a large file) goes to the mirror expected to serve it the soonest, by the
+throughput and latency measured for each mirror and the requests already in flight on it, so the total throughput can
+go beyond what one origin allows. A mirror that fails is skipped (its request goes to another one at once) and rested
+by a circuit breaker; a slow mirror keeps getting only the share of the requests its throughput is worth.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import threading
+from DIHC_Retry import CircuitBreaker
+
+
+class MirrorPool:
+    """ Pool of equivalent base urls with their measured throughput and latency
+
+    Properties
+    -----------
+    base_urls : list(str)
+        Base urls serving the same tree, the first one is the origin the directory listings come from
+
+    Methods
+    --------
+    choose()
+        Takes- optional mirrors to leave out, size of the request | Returns- base url or None | Func- Mirror expected
+        to serve the next request the soonest, None if none is available
+    start()
+        Takes- base url | Returns- none | Func- Counts a request in flight on the mirror, ended by finish() or
+        record_failure()
+    finish()
+        Takes- base url, received bytes, seconds, latency | Returns- none | Func- Ends a request and updates the
+        throughput and latency of the mirror
+    record_failure()
+        Takes- base url | Returns- none | Func- Ends a request that failed (or was inconsistent) and counts it against
+        the mirror
+    record_probe()
+        Takes- base url, throughput, latency | Returns- none | Func- Starts the estimates of the mirror with a probe
+    disable()
+        Takes- base url | Returns- none | Func- Leaves the mirror out for the rest of the download
+    get_stats()
+        Takes- none | Returns- dict | Func- Throughput, latency, requests and failures of every mirror
+    """
+
+
+    # Weight of the last measure in the moving averages of the throughput and latency
+    _smoothing = 0.3
+    # Bytes of a request whose size is not known
+    _default_request_size = 1024 ** 2
+
+    def __init__(self, base_urls, failure_threshold=2, reset_timeout=30.0):
+        self.base_urls = list(base_urls)
+        self._lock = threading.Lock()
+        self._mirrors = {}
+        for base_url in self.base_urls:
+            self._mirrors[base_url] = {'throughput': None, 'latency': None, 'in_flight': 0, 'requests': 0,
+                                       'failures': 0, 'received_bytes': 0, 'is_disabled': False,
+                                       'circuit_breaker': CircuitBreaker(failure_threshold, reset_timeout)}
+
+    def choose(self, excluded_base_urls=(), size=None):
+        with self._lock:
+            # A mirror not measured yet is taken as fast as the best one, so it gets requests and a measure
+            throughputs = [mirror['throughput'] for mirror in self._mirrors.values() if mirror['throughput']]
+            default_throughput = max(throughputs) if throughputs else 1.0
+
+            candidates = []
+            for base_url, mirror in self._mirrors.items():
+                if base_url in excluded_base_urls or mirror['is_disabled']:
+                    continue
+                # The requests in flight share the throughput of the mirror, the new one comes after its latency
+                expected_time = (mirror['in_flight'] + 1) * (size or self._default_request_size) \
+                    / (mirror['throughput'] or default_throughput) + (mirror['latency'] or 0.0)
+                candidates.append((expected_time, base_url))
+
+            # ### A resting mirror is skipped, after its rest it gets one trial request before the others
+            for _, base_url in sorted(candidates):
+                if self._mirrors[base_url]['circuit_breaker'].is_allowed():
+                    return base_url
+            return None
+
+    def start(self, base_url):
+        with self._lock:
+            self._mirrors[base_url]['in_flight'] += 1
+            self._mirrors[base_url]['requests'] += 1
+
+    def finish(self, base_url, received_size, elapsed_time, latency=None):
+        with self._lock:
+            mirror = self._mirrors[base_url]
+            mirror['in_flight'] = max(0, mirror['in_flight'] - 1)
+            mirror['received_bytes'] += received_size
+            # Small responses tell the latency, not the throughput
+            if received_size >= 64 * 1024 and elapsed_time > 0:
+                # Throughput of the whole mirror- this request had its share of it with the others in flight
+                self._update_average(mirror, 'throughput', received_size / elapsed_time * (mirror['in_flight'] + 1))
+            if latency is not None:
+                self._update_average(mirror, 'latency', latency)
+        mirror['circuit_breaker'].record_success()
+
+    def record_failure(self, base_url):
+        with self._lock:
+            mirror = self._mirrors[base_url]
+            mirror['in_flight'] = max(0, mirror['in_flight'] - 1)
+            mirror['failures'] += 1
+        self._mirrors[base_url]['circuit_breaker'].record_failure()
+
+    def record_probe(self, base_url, throughput, latency):
+        with self._lock:
+            mirror = self._mirrors[base_url]
+            mirror['throughput'] = throughput or mirror['throughput']
+            mirror['latency'] = latency if latency is not None else mirror['latency']
+
+    def disable(self, base_url):
+        with self._lock:
+            self._mirrors[base_url]['is_disabled'] = True
+
+    def get_stats(self):
+        with self._lock:
+            return {base_url: {key: value for key, value in mirror.items() if key != 'circuit_breaker'}
+                    for base_url, mirror in self._mirrors.items()}
+
+
+
+    # ######################################## Private methods zone ########################################
+    def _update_average(self, mirror, key, value):
+        if mirror[key] is None:
+            mirror[key] = value
+        else:
+            mirror[key] += self._smoothing * (value - mirror[key])
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Path_Filter.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 7:35 pm
+"""
+
+
+""" Include and exclude rules on the relative paths
+
+This script contains the path filter of the downloader. The rules are compiled once and matched on the full path of a
+file or directory relative to the url to download (e.g. 'chb01/chb01_03.edf'), not on its name only. A directory is
+pruned as soon as no include rule can match anything under it or an exclude rule covers it, so its listing is never
+requested and pulling a subset of a large corpus crawls only that subset.
+
+A rule is a glob- '*' matches within one path segment, '**' matches any number of segments, '?' and '[...]' as in
+fnmatch- or a regular expression (a compiled pattern, or a string starting with 're:') matched on the whole path.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import re
+
+
+class PathFilter:
+    """ Compiled include and exclude rules on the paths relative to the url to download
+
+    A file is wanted if it matches at least one include rule (or there are none) and no exclude rule matches it or one
+    of its directories. A directory is pruned if an exclude rule matches it (e.g. '_DOCS' or '*/_DOCS/**') or no
+    include rule can match a path under it (a regular expression include rule never prunes a directory, it can not be
+    matched on a part of a path).
+
+    Properties
+    -----------
+    include : list(str or re.Pattern)
+        Rules of the paths to download, all paths if empty
+    exclude : list(str or re.Pattern)
+        Rules of the paths not to download
+
+    Methods
+    --------
+    is_file_wanted()
+        Takes- relative path | Returns- bool | Func- If the file is to be downloaded
+    is_directory_wanted()
+        Takes- relative path | Returns- bool | Func- If the directory is to be explored, False prunes its subtree
+    """
+
+
+    def __init__(self, include=[], exclude=[]):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self._include_rules = [self._compile_rule(rule) for rule in self.include]
+        self._exclude_rules = [self._compile_rule(rule) for rule in self.exclude]
+
+    def __bool__(self):
+        return bool(self._include_rules or self._exclude_rules)
+
+    def is_file_wanted(self, path):
+        path = path.strip('/')
+        # ### Nothing under an excluded directory is wanted
+        parts = path.split('/')
+        for i in range(1, len(parts) + 1):
+            if any(pattern.fullmatch('/'.join(parts[:i])) for pattern, _ in self._exclude_rules):
+                return False
+        return not self._include_rules or any(pattern.fullmatch(path) for pattern, _ in self._include_rules)
+
+    def is_directory_wanted(self, path):
+        path = path.strip('/')
+        if not path:
+            return True
+        if any(pattern.fullmatch(path) for pattern, _ in self._exclude_rules):
+            return False
+        return not self._include_rules or any(self._may_match_under(segments, path.split('/'))
+                                              for _, segments in self._include_rules)
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Regular expression of a rule on the whole path and, for a glob, the patterns of its segments (None for a
+    # ### regular expression rule)
+    # ###
+    def _compile_rule(self, rule):
+        if isinstance(rule, re.Pattern):
+            return rule, None
+        if rule.startswith('re:'):
+            return re.compile(rule[3:]), None
+
+        rule = rule.strip('/')
+        segments = rule.split('/')
+        expression = ''
+        for i, segment in enumerate(segments):
+            is_last = i == len(segments) - 1
+            if segment == '**':
+                # Any number of segments, none included- 'a/**' also matches the directory 'a' itself
+                if is_last:
+                    expression = expression[:-1] + '(?:/.*)?' if expression else '.*'
+                else:
+                    expression += '(?:[^/]+/)*'
+            else:
+                expression += self._translate_segment(segment) + ('' if is_last else '/')
+        segment_patterns = [None if segment == '**' else re.compile(self._translate_segment(segment))
+                            for segment in segments]
+        return re.compile(expression), segment_patterns
+
+    def _translate_segment(self, segment):
+        # Like fnmatch, but '*' and '?' never cross a '/'
+        expression = ''
+        i = 0
+        while i < len(segment):
+            character = segment[i]
+            i += 1
+            if character == '*':
+                expression += '[^/]*'
+            elif character == '?':
+                expression += '[^/]'
+            elif character == '[':
+                # A ']' right after '[' or '[!' belongs to the set, a '[' without its ']' is taken as it is
+                end = i + 1 if segment[i:i + 1] == '!' else i
+                end = segment.find(']', end + 1 if segment[end:end + 1] == ']' else end)
+                if end < 0:
+                    expression += '\\['
+                    continue
+                characters = segment[i:end]
+                i = end + 1
+                if characters.startswith('!'):
+                    characters = '^' + characters[1:]
+                expression += '[' + characters.replace('\\', '\\\\') + ']'
+            else:
+                expression += re.escape(character)
+        return expression
+
+    # ###
+    # ### If a glob can match a path under the directory of the given segments
+    # ###
+    def _may_match_under(self, rule_segments, directory_segments):
+        if rule_segments is None:
+            return True
+
+        for i, directory_segment in enumerate(directory_segments):
+            if i >= len(rule_segments):
+                return False
+            if rule_segments[i] is None:
+                return True
+            if not rule_segments[i].fullmatch(directory_segment):
+                return False
+        return len(rule_segments) > len(directory_segments)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Remote_File.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 9:50 pm
+"""
+
+
+""" Lazy read-only access to the remote files
+
+This script contains the file-like object behind DIHC_Downloader.open(). A remote file is read in fixed size blocks
+fetched with byte range requests only when they are read, e.g. the header of an EDF recording or a short window of it,
+so scanning the headers of a large corpus transfers megabytes instead of the whole files. The blocks are kept in a
+bounded LRU cache in memory and, optionally, on the disk, shared by all the files opened by one downloader. Sequential
+reads fetch more blocks ahead in the same request (the window doubles up to read_ahead blocks), random reads fetch one
+block at a time.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+
+class BlockCache:
+    """ Bounded LRU cache of file blocks in memory and on the disk
+
+    A block evicted from the memory stays on the disk (if a cache directory is given), the least recently used blocks
+    on the disk are removed when it goes over disk_size. The blocks left on the disk by earlier runs are used again.
+
+    Properties
+    -----------
+    memory_size : int
+        Bytes of blocks kept in memory at most
+    directory : str
+        Directory of the blocks on the disk, None for no disk cache
+    disk_size : int
+        Bytes of blocks kept on the disk at most
+
+    Methods
+    --------
+    get()
+        Takes- key | Returns- (bytes, 'memory' or 'disk') or (None, None) | Func- Block of the key, if cached
+    put()
+        Takes- key, bytes | Returns- none | Func- Caches a block, evicting the least recently used ones
+    """
+
+
+    def __init__(self, memory_size=64 * 1024 ** 2, directory=None, disk_size=1024 ** 3):
+        self.memory_size = memory_size
+        self.directory = directory
+        self.disk_size = disk_size
+        self._memory_blocks = OrderedDict()
+        self._memory_used = 0
+        self._disk_blocks = OrderedDict()
+        self._disk_used = 0
+        self._lock = threading.Lock()
+
+        # ### Blocks of the earlier runs, oldest first
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            block_files = []
+            for filename in os.listdir(directory):
+                if filename.endswith('.block'):
+                    stat = os.stat(os.path.join(directory, filename))
+                    block_files.append((stat.st_mtime, filename, stat.st_size))
+            for _, filename, size in sorted(block_files):
+                self._disk_blocks[filename] = size
+                self._disk_used += size
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory_blocks.get(key)
+            if data is not None:
+                self._memory_blocks.move_to_end(key)
+                return data, 'memory'
+            if not self.directory:
+                return None, None
+
+            filename = self._get_block_filename(key)
+            if filename not in self._disk_blocks:
+                return None, None
+            try:
+                with open(os.path.join(self.directory, filename), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                self._disk_used -= self._disk_blocks.pop(filename)
+                return None, None
+            self._disk_blocks.move_to_end(filename)
+            self._put_in_memory(key, data)
+            return data, 'disk'
+
+    def put(self, key, data):
+        with self._lock:
+            self._put_in_memory(key, data)
+            if not self.directory:
+                return
+
+            filename = self._get_block_filename(key)
+            if filename in self._disk_blocks:
+                self._disk_blocks.move_to_end(filename)
+                return
+            try:
+                # Replaced at once, a block on the disk is always whole
+                with open(os.path.join(self.directory, filename + '.tmp'), 'wb') as f:
+                    f.write(data)
+                os.replace(os.path.join(self.directory, filename + '.tmp'), os.path.join(self.directory, filename))
+            except OSError:
+                return
+            self._disk_blocks[filename] = len(data)
+            self._disk_used += len(data)
+            while self._disk_used > self.disk_size and len(self._disk_blocks) > 1:
+                old_filename, size = self._disk_blocks.popitem(last=False)
+                self._disk_used -= size
+                try:
+                    os.remove(os.path.join(self.directory, old_filename))
+                except OSError:
+                    pass
+
+
+
+    # ######################################## Private methods zone ########################################
+    def _put_in_memory(self, key, data):
+        if key in self._memory_blocks:
+            self._memory_blocks.move_to_end(key)
+            return
+        self._memory_blocks[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_size and len(self._memory_blocks) > 1:
+            _, old_data = self._memory_blocks.popitem(last=False)
+            self._memory_used -= len(old_data)
+
+    def _get_block_filename(self, key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.block'
+
+
+class RemoteFile(io.RawIOBase):
+    """ Read-only, seekable file-like object of a remote file, read in blocks fetched on demand
+
+    The bytes come from fetch_range(start, end) (both included), which the downloader does with a byte range request
+    of its session. The blocks are cached by the version of the file (ETag, or size and mtime), so a file changed on
+    the server is never read with blocks of its old version.
+
+    Properties
+    -----------
+    name : str
+        Url of the file
+    size : int
+        Size of the file in bytes
+    block_size : int
+        Size (in bytes) of the blocks fetched and cached
+    read_ahead : int
+        Most blocks fetched in one request while the file is read sequentially
+
+    Methods
+    --------
+    read()
+        Takes- optional number of bytes | Returns- bytes | Func- Reads from the current position (all by default)
+    readinto()
+        Takes- buffer | Returns- number of bytes | Func- Reads into the buffer
+    seek()
+        Takes- offset, optional whence | Returns- new position | Func- Moves the current position
+    tell()
+        Takes- none | Returns- int | Func- Current position
+    """
+
+
+    def __init__(self, name, size, fetch_range, block_size=256 * 1024, read_ahead=16, cache=None, version=None,
+                 metrics=None):
+        super().__init__()
+        self.name = name
+        self.size = size
+        self.block_size = block_size
+        self.read_ahead = max(1, read_ahead)
+        self._fetch_range = fetch_range
+        self._cache = cache if cache is not None else BlockCache()
+        self._version = version
+        self._metrics = metrics
+        self._position = 0
+        # Block a sequential read would fetch next (none before the first read) and the number of blocks of the last
+        # fetch
+        self._next_block_index = -1
+        self._window = 1
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence ({}).'.format(whence))
+        if position < 0:
+            raise ValueError('Negative seek position {}.'.format(position))
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        view = memoryview(buffer).cast('B')
+        length = max(0, min(len(view), self.size - self._position))
+
+        read_size = 0
+        while read_size < length:
+            block_index, block_offset = divmod(self._position, self.block_size)
+            block = self._get_block(block_index)
+            number_of_bytes = min(length - read_size, len(block) - block_offset)
+            if number_of_bytes <= 0:
+                break
+            view[read_size:read_size + number_of_bytes] = block[block_offset:block_offset + number_of_bytes]
+            read_size += number_of_bytes
+            self._position += number_of_bytes
+        return read_size
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Block from the cache, or fetched with the blocks read ahead of it
+    # ###
+    def _get_block(self, block_index):
+        block, tier = self._cache.get(self._get_block_key(block_index))
+        if self._metrics is not None:
+            self._metrics.increment('dihc_block_cache_requests_total', result=tier or 'miss')
+        if block is not None:
+            self._move_window(block_index, 1)
+            return block
+
+        # ### Sequential reads fetch a growing window of the next blocks not cached yet, in one request
+        window = min(self._window * 2, self.read_ahead) if block_index == self._next_block_index else 1
+        last_block_index = min(block_index + window, (self.size + self.block_size - 1) // self.block_size) - 1
+        for i in range(block_index + 1, last_block_index + 1):
+            if self._cache.get(self._get_block_key(i))[0] is not None:
+                last_block_index = i - 1
+                break
+
+        start = block_index * self.block_size
+        data = self._fetch_range(start, min((last_block_index + 1) * self.block_size, self.size) - 1)
+        for i in range(block_index, last_block_index + 1):
+            offset = (i - block_index) * self.block_size
+            self._cache.put(self._get_block_key(i), data[offset:offset + self.block_size])
+        self._move_window(block_index, last_block_index - block_index + 1)
+        return data[:self.block_size]
+
+    def _move_window(self, block_index, number_of_blocks):
+        # Small reads come back to the block of the last read, the sequential read goes on
+        if block_index == self._next_block_index - 1 and number_of_blocks == 1:
+            return
+        if block_index != self._next_block_index:
+            self._window = 1
+        elif number_of_blocks > 1:
+            self._window = number_of_blocks
+        self._next_block_index = block_index + 1
+
+    def _get_block_key(self, block_index):
+        return self.name, self._version, self.block_size, block_index
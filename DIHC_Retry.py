@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Retry.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 4:20 pm
+"""
+
+
+""" Retry scheduling of the failed requests
+
+This script contains what the downloader needs to try the failed directory listings, header checks and file downloads
+again without stopping the rest of the run. A failed item waits in a delayed queue for its exponential backoff (with
+random jitter, so the retries of many items do not hit the server at the same moment) while the other transfers go
+on. A circuit breaker per host stops sending requests to a host that keeps failing and lets one trial request thru
+after a cool down.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+# ###
+# ### Backoff before a retry
+# ###
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """Exponential backoff with full jitter, a random delay between 0 and base_delay * 2^attempt (at most max_delay)
+
+    Parameters
+    ----------
+    attempt : int
+        Number of the failed attempts before this retry minus one (0 for the first retry)
+    base_delay : float
+        Seconds of the first backoff
+    max_delay : float
+        Seconds of the longest backoff
+
+    Returns
+    -------
+    float
+        Seconds to wait before the retry
+    """
+
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RetryScheduler:
+    """ Delayed queue of the items to retry, an item is ready once its delay is over
+
+    Methods
+    --------
+    schedule()
+        Takes- item, delay in seconds | Returns- none | Func- Queues the item until the delay is over
+    pop_ready()
+        Takes- none | Returns- list of items | Func- Takes out all the items whose delay is over
+    time_to_next()
+        Takes- none | Returns- float or None | Func- Seconds until the next item is ready, None if the queue is empty
+    """
+
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def schedule(self, item, delay):
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+
+    def pop_ready(self):
+        ready_items = []
+        now = time.monotonic()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                ready_items.append(heapq.heappop(self._heap)[2])
+        return ready_items
+
+    def time_to_next(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+class CircuitBreaker:
+    """ Circuit breaker of one host
+
+    After failure_threshold failures in a row the circuit opens and no request is sent to the host for reset_timeout
+    seconds. Then one trial request is let thru (half open): its success closes the circuit, its failure opens it again
+    for twice as long (at most max_reset_timeout).
+
+    Methods
+    --------
+    is_allowed()
+        Takes- none | Returns- bool | Func- If a request can be sent to the host now
+    time_to_retry()
+        Takes- none | Returns- float | Func- Seconds until the open circuit lets a trial request thru
+    record_success()
+        Takes- none | Returns- none | Func- Closes the circuit
+    record_failure()
+        Takes- none | Returns- bool | Func- Counts the failure, True if it opened the circuit
+    """
+
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, max_reset_timeout=600.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._failures = 0
+        self._open_timeout = reset_timeout
+        self._open_until = None
+        self._is_trial_sent = False
+        self._lock = threading.Lock()
+
+    def is_allowed(self):
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if time.monotonic() < self._open_until or self._is_trial_sent:
+                return False
+            self._is_trial_sent = True
+            return True
+
+    def time_to_retry(self):
+        with self._lock:
+            if self._open_until is None:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_timeout = self.reset_timeout
+            self._open_until = None
+            self._is_trial_sent = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._open_until is not None and self._is_trial_sent:
+                # The trial request failed, the host gets a longer rest
+                self._open_timeout = min(self._open_timeout * 2, self.max_reset_timeout)
+            elif self._open_until is not None or self._failures < self.failure_threshold:
+                return False
+            self._open_until = time.monotonic() + self._open_timeout
+            self._is_trial_sent = False
+            return True
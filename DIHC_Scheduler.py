@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Scheduler.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:15 pm
+"""
+
+
+""" Order of the downloads
+
+This script contains the scheduler between the crawl and the download workers. Once the sizes of the files are known
+(from the listings or the headers), the manifest is ordered by a policy- 'path' (the order of the manifest),
+'largest_first' (the big files start early and do not become the tail that sets the total time of a parallel download),
+'smallest_first' (many files done early) or a priority function of the entry- after the priorities of the directories,
+if any. The workers take the files in that order as they get free, and the same list scheduling is simulated to give
+the expected makespan (time until the last file is done) of an order.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import heapq
+from DIHC_Path_Filter import PathFilter
+
+
+# Policies of the order of the files, the entries with lower keys go first
+SCHEDULE_POLICIES = {
+    'path': lambda entry: entry['path'],
+    # Files of unknown size go last in both size orders
+    'largest_first': lambda entry: (entry['size'] is None, -(entry['size'] or 0), entry['path']),
+    'smallest_first': lambda entry: (entry['size'] is None, entry['size'] or 0, entry['path']),
+}
+
+
+# ###
+# ### Orders the files of the manifest
+# ###
+def order_entries(entries, policy='path', directory_priorities=None, root_directory=''):
+    """Orders the manifest entries by the priorities of their directories, then by the policy
+
+    Parameters
+    ----------
+    entries : list(dict)
+        Manifest entries- {'url', 'path', 'size', ...}
+    policy : str or function
+        Name in SCHEDULE_POLICIES or a function of an entry returning its priority (lower first)
+    directory_priorities : dict
+        {rule: priority}, rules on the paths relative to the root directory as in include_paths (like- 'chb01/**',
+        '**/*.txt'); the files matching no rule have priority 0, the ones matching several get the lowest priority
+    root_directory : str
+        First part of the manifest paths, left out when the rules are matched
+
+    Returns
+    -------
+    list(dict)
+        The entries in the order they are to be downloaded
+    """
+
+
+    priority = SCHEDULE_POLICIES[policy] if isinstance(policy, str) else policy
+    if not directory_priorities:
+        return sorted(entries, key=priority)
+
+    rule_filters = [(PathFilter(include=[rule]), rule_priority) for rule, rule_priority in directory_priorities.items()]
+
+    def directory_priority(entry):
+        path = entry['path']
+        if root_directory and path.startswith(root_directory + '/'):
+            path = path[len(root_directory) + 1:]
+        return min([rule_priority for rule_filter, rule_priority in rule_filters if rule_filter.is_file_wanted(path)]
+                   or [0])
+
+    return sorted(entries, key=lambda entry: (directory_priority(entry), priority(entry)))
+
+
+# ###
+# ### Expected makespan of an order on the workers
+# ###
+def estimate_makespan(sizes, workers, throughput=None, latency=0.0):
+    """Simulates the download of the files in the given order by the workers, each one taking the next file when it
+    is free (as the download workers do), and gives the time until the last file is done
+
+    Parameters
+    ----------
+    sizes : list(int)
+        Sizes of the files in bytes in the order they are downloaded (None- unknown, counted as 0)
+    workers : int
+        Number of files downloaded in parallel
+    throughput : float
+        Total bytes per second of all the workers, shared equally; None gives the makespan in bytes
+    latency : float
+        Seconds of every request before its first byte
+
+    Returns
+    -------
+    dict
+        {'makespan': seconds (bytes if throughput is None) until the last file is done, 'lower_bound': the makespan of
+        a perfect balance (the total over the workers, or the largest file if longer), 'efficiency': lower_bound /
+        makespan (1.0- no tail)}
+    """
+
+
+    workers = max(1, int(workers))
+    worker_speed = throughput / workers if throughput else None
+    durations = []
+    for size in sizes:
+        size = size or 0
+        durations.append(size / worker_speed + latency if worker_speed else size)
+
+    # ### Time each worker is free again, the earliest one takes the next file
+    free_times = [0.0] * workers
+    for duration in durations:
+        heapq.heappush(free_times, heapq.heappop(free_times) + duration)
+    makespan = max(free_times)
+    lower_bound = max(sum(durations) / workers, max(durations or [0.0]))
+
+    return {'makespan': makespan, 'lower_bound': lower_bound,
+            'efficiency': lower_bound / makespan if makespan else 1.0}
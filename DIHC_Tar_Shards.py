@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Tar_Shards.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 9:05 pm
+"""
+
+
+""" Tar (WebDataset style) shards of the downloaded files
+
+This script contains the tar output of the downloader. Instead of creating every small file of a dataset on its own
+(a directory, a .tmp file and a rename each), the files are appended one after the other to size-bounded tar shards
+('<prefix>-000000.tar', '<prefix>-000001.tar', ...) that the training pipelines (e.g. WebDataset) read sequentially.
+An index in JSON lines ('<prefix>-index.jsonl') maps the path of every file to its shard, the offset of its bytes and
+its size, so a single file is read back with one seek and the nested layout is recovered on demand.
+
+A member is written to the shard only when it is complete and its index line only after it, so after a crash the index
+never points to a half written member; the next writer cuts the shard back to its last indexed member and goes on.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+
+
+# Size of the blocks of a tar file, every member is padded to it
+_block_size = tarfile.BLOCKSIZE
+
+
+# ###
+# ### Reads the index of the tar shards
+# ###
+def read_tar_index(directory, prefix='dihc'):
+    """Reads the index files of the tar shards in a directory, the last line of a path wins (a file downloaded again
+    after it changed on the server)
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the shards
+    prefix : str
+        Prefix of the shards, every index file starting with it is read (so the sharded downloads are read too)
+
+    Returns
+    -------
+    dict
+        {path: {'path', 'shard' (filename), 'header_offset', 'offset', 'size', 'mtime'}}
+    """
+
+
+    members = {}
+    if not os.path.isdir(directory):
+        return members
+
+    for index_filename in sorted(os.listdir(directory)):
+        if not (index_filename.startswith(prefix) and index_filename.endswith('-index.jsonl')):
+            continue
+        with open(os.path.join(directory, index_filename)) as f:
+            for line in f:
+                try:
+                    member = json.loads(line)
+                except ValueError:
+                    # A line cut by a crash
+                    continue
+                members[member['path']] = member
+
+    return members
+
+
+class TarMemberSpool:
+    """ Body of one file before it goes into a shard, in memory up to spool_size bytes and in a temporary file after
+
+    It takes the same calls as DIHC_File_Writer (get_buffer(), write()), so a response is read into it the same way.
+
+    Properties
+    -----------
+    written_size : int
+        Number of bytes written
+    file : file object
+        Spooled file of the bytes
+
+    Methods
+    --------
+    get_buffer()
+        Takes- none | Returns- bytearray | Func- Buffer to fill
+    write()
+        Takes- buffer or bytes, optional length | Returns- none | Func- Adds the bytes (and hashes them if asked)
+    close()
+        Takes- none | Returns- none | Func- Drops the bytes
+    """
+
+
+    def __init__(self, spool_size=8 * 1024 ** 2, buffer_size=1024 ** 2, directory=None, hasher=None):
+        self.written_size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size, dir=directory)
+        self._buffer = bytearray(buffer_size)
+        self._hasher = hasher
+
+    def get_buffer(self):
+        return self._buffer
+
+    def write(self, data, length=None):
+        view = memoryview(data)[:len(data) if length is None else length]
+        if self._hasher is not None:
+            self._hasher.update(self.written_size, view)
+        self.file.write(view)
+        self.written_size += len(view)
+
+    def close(self):
+        self.file.close()
+
+
+class TarShardWriter:
+    """ Writer of the downloaded files into size-bounded tar shards with an index of where every file is
+
+    The download workers add complete files one at a time (behind a lock); a shard is closed and the next one started
+    when the next member would take it over max_shard_size, a member bigger than that gets a shard of its own.
+
+    Properties
+    -----------
+    directory : str
+        Directory of the shards and their index
+    prefix : str
+        Name of the shards ('<prefix>-000000.tar') and of the index ('<prefix>-index.jsonl')
+    max_shard_size : int
+        Size (in bytes) a shard is kept under
+    members : dict
+        {path: index entry} of the files in the shards, the ones of the earlier runs included
+
+    Methods
+    --------
+    __contains__()
+        Takes- path | Returns- bool | Func- If the file is in the shards
+    add()
+        Takes- path, file object, size, optional mtime | Returns- index entry | Func- Appends the file to the current
+        shard and records it in the index
+    close()
+        Takes- none | Returns- none | Func- Ends the current shard and closes the index
+    """
+
+
+    def __init__(self, directory, prefix='dihc', max_shard_size=1024 ** 3):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_shard_size = max_shard_size
+        self.members = read_tar_index(directory, prefix)
+        # Only the members of this prefix decide where the writing goes on, other prefixes are of other writers
+        own_members = [member for member in self.members.values()
+                       if re.fullmatch(re.escape(prefix) + r'-\d{6}\.tar', member['shard'])]
+        self._lock = threading.Lock()
+
+        # ### Goes on with the last shard, cut back to the end of its last indexed member
+        self._shard_number = max([int(member['shard'][-10:-4]) for member in own_members] or [0])
+        shard_filename = self._get_shard_filename(self._shard_number)
+        self._shard_size = max([member['offset'] + self._padded_size(member['size']) for member in own_members
+                                if member['shard'] == shard_filename] or [0])
+        self._shard_file = None
+        self._index_file = open(os.path.join(directory, '{}-index.jsonl'.format(prefix)), 'a')
+
+    def __contains__(self, path):
+        return path in self.members
+
+    def add(self, path, file, size, mtime=None):
+        tar_info = tarfile.TarInfo(path)
+        tar_info.size = size
+        tar_info.mtime = int(mtime or 0)
+        tar_info.mode = 0o644
+        header = tar_info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8')
+
+        with self._lock:
+            member_size = len(header) + self._padded_size(size)
+            if self._shard_size and self._shard_size + member_size + 2 * _block_size > self.max_shard_size:
+                self._end_shard()
+                self._shard_number += 1
+                self._shard_size = 0
+            if self._shard_file is None:
+                self._open_shard()
+
+            header_offset = self._shard_size
+            self._shard_file.write(header)
+            file.seek(0)
+            shutil.copyfileobj(file, self._shard_file, 1024 ** 2)
+            self._shard_file.write(bytes(self._padded_size(size) - size))
+            self._shard_file.flush()
+            self._shard_size += member_size
+
+            member = {'path': path, 'shard': self._get_shard_filename(self._shard_number),
+                      'header_offset': header_offset, 'offset': header_offset + len(header), 'size': size,
+                      'mtime': tar_info.mtime}
+            self._index_file.write(json.dumps(member) + '\n')
+            self._index_file.flush()
+            self.members[path] = member
+        return member
+
+    def close(self):
+        with self._lock:
+            self._end_shard()
+            if not self._index_file.closed:
+                self._index_file.close()
+
+
+
+    # ######################################## Private methods zone ########################################
+    def _get_shard_filename(self, shard_number):
+        return '{}-{:06d}.tar'.format(self.prefix, shard_number)
+
+    def _padded_size(self, size):
+        return (size + _block_size - 1) // _block_size * _block_size
+
+    def _open_shard(self):
+        shard_filename = os.path.join(self.directory, self._get_shard_filename(self._shard_number))
+        self._shard_file = open(shard_filename, 'r+b' if self._shard_size and os.path.exists(shard_filename)
+                                else 'w+b')
+        # The end blocks and anything after the last indexed member (a crash) are written over
+        self._shard_file.truncate(self._shard_size)
+        self._shard_file.seek(self._shard_size)
+
+    def _end_shard(self):
+        # Two zero blocks end a tar file; they are cut off again if the shard is continued
+        if self._shard_file is not None:
+            self._shard_file.write(bytes(2 * _block_size))
+            self._shard_file.close()
+            self._shard_file = None
+
+
+class TarShardReader:
+    """ Reader of the files in the tar shards by their index, without unpacking the shards
+
+    Properties
+    -----------
+    directory : str
+        Directory of the shards and their index
+    members : dict
+        {path: index entry} of the files in the shards
+
+    Methods
+    --------
+    paths()
+        Takes- none | Returns- list of paths | Func- Paths of the files in the shards, sorted
+    read()
+        Takes- path | Returns- bytes | Func- Bytes of a file, with one seek in its shard
+    extract()
+        Takes- output directory, optional paths | Returns- number of files | Func- Recovers the nested layout of the
+        files (all or the given ones) under the output directory
+    """
+
+
+    def __init__(self, directory, prefix='dihc'):
+        self.directory = directory
+        self.members = read_tar_index(directory, prefix)
+
+    def paths(self):
+        return sorted(self.members)
+
+    def read(self, path):
+        member = self.members[path]
+        with open(os.path.join(self.directory, member['shard']), 'rb') as f:
+            f.seek(member['offset'])
+            return f.read(member['size'])
+
+    def extract(self, output_directory, paths=None):
+        number_of_files = 0
+        for path in (self.paths() if paths is None else paths):
+            member = self.members[path]
+            filename = os.path.join(output_directory, *path.split('/'))
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(os.path.join(self.directory, member['shard']), 'rb') as shard_file, \
+                    open(filename, 'wb') as f:
+                shard_file.seek(member['offset'])
+                remaining_size = member['size']
+                while remaining_size > 0:
+                    data = shard_file.read(min(1024 ** 2, remaining_size))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining_size -= len(data)
+            if member['mtime']:
+                os.utime(filename, (member['mtime'], member['mtime']))
+            number_of_files += 1
+        return number_of_files
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: DIHC_Throttle.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 3:30 pm
+"""
+
+
+""" Connection and bandwidth limits of the downloads
+
+This script contains the classes that keep the downloader polite to the servers and to the other jobs sharing the
+network. A host limiter caps the connections open to one host at the same time; in adaptive mode it starts with a few
+connections, adds one more while the throughput keeps improving and backs off when the server answers 429/503 or its
+latency grows. A token bucket limits the total bandwidth of all the downloads.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import threading
+import time
+
+
+class TokenBucket:
+    """ Token bucket bandwidth limiter shared by all the connections
+
+    The tokens are bytes, refilled at the rate up to the burst. Taking more tokens than there are leaves the bucket in
+    debt, and the caller waits until the debt is paid, so the average rate never goes over the limit.
+
+    Properties
+    -----------
+    rate : float
+        Bytes per second
+    burst : int
+        Bytes that can be taken at once without waiting, a quarter of a second of the rate (64 KB minimum) by default
+
+    Methods
+    --------
+    reserve()
+        Takes- number of bytes | Returns- seconds to wait | Func- Takes the tokens, waiting is left to the caller (e.g.
+        asyncio.sleep())
+    consume()
+        Takes- number of bytes | Returns- none | Func- Takes the tokens and sleeps until they are paid
+    """
+
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = int(burst or max(64 * 1024, self.rate / 4))
+        self._tokens = float(self.burst)
+        self._refill_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, number_of_bytes):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refill_time) * self.rate)
+            self._refill_time = now
+            self._tokens -= number_of_bytes
+            return max(0.0, -self._tokens / self.rate)
+
+    def consume(self, number_of_bytes):
+        wait_time = self.reserve(number_of_bytes)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class HostLimiter:
+    """ Limits the connections open to one host at the same time, adapting the limit to how the host responds
+
+    Every request takes a connection slot with acquire() before it is sent and gives it back with release() after its
+    response is closed. In adaptive mode the limit is tuned once per window: it grows by one while the limit is in full
+    use and the throughput (bytes or requests per second) improved by at least 5% over the last window, it drops by
+    one when the mean response latency of the window is over twice the lowest seen, and it is halved when the host
+    answers 429 (too many requests) or 503 (unavailable).
+
+    Properties
+    -----------
+    max_connections : int
+        Connections allowed to the host at most
+    is_adaptive : bool
+        Tunes the limit between min_connections and max_connections, otherwise the limit is max_connections
+    min_connections : int
+        Connections allowed to the host at least
+    initial_connections : int
+        Starting limit in adaptive mode
+    window : float
+        Seconds between two adjustments of the limit
+    limit : int
+        Current limit
+
+    Methods
+    --------
+    acquire()
+        Takes- none | Returns- none | Func- Waits for a free connection slot and takes it
+    release()
+        Takes- optional status code and latency (seconds until the response headers) | Returns- none | Func- Gives
+        the slot back and records the response
+    add_bytes()
+        Takes- number of bytes | Returns- none | Func- Records the downloaded bytes for the throughput
+    """
+
+
+    # Statuses the host uses to ask for fewer requests
+    _backoff_status_codes = (429, 503)
+    # Throughput gain needed to add one more connection, latency growth that removes one
+    _throughput_gain = 1.05
+    _latency_growth = 2.0
+
+    def __init__(self, max_connections, is_adaptive=True, min_connections=1, initial_connections=4, window=1.0):
+        self.max_connections = max(1, int(max_connections))
+        self.is_adaptive = is_adaptive
+        self.min_connections = max(1, min(int(min_connections), self.max_connections))
+        self.window = window
+        self.limit = self.max_connections
+        if is_adaptive:
+            self.limit = max(self.min_connections, min(int(initial_connections), self.max_connections))
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._is_limit_used = False
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_requests = 0
+        self._window_latencies = []
+        self._last_throughput = None
+        self._lowest_latency = None
+        self._backoff_time = float('-inf')
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            if self._in_flight >= self.limit:
+                self._is_limit_used = True
+
+    def release(self, status_code=None, latency=None):
+        with self._condition:
+            self._in_flight -= 1
+            if self.is_adaptive:
+                self._window_requests += 1
+                # The responses to the requests already in flight do not halve the limit again
+                if status_code in self._backoff_status_codes:
+                    if time.monotonic() - self._backoff_time >= self.window:
+                        self._change_limit(-max(1, self.limit // 2))
+                        self._backoff_time = time.monotonic()
+                        self._start_window(None)
+                elif latency is not None:
+                    self._window_latencies.append(latency)
+                self._adjust_limit()
+            self._condition.notify_all()
+
+    def add_bytes(self, number_of_bytes):
+        if not self.is_adaptive:
+            return
+        with self._condition:
+            self._window_bytes += number_of_bytes
+            self._adjust_limit()
+
+
+
+    # ######################################## Private methods zone ########################################
+    # ###
+    # ### Tunes the limit once the window is over
+    # ###
+    def _adjust_limit(self):
+        now = time.monotonic()
+        elapsed_time = now - self._window_start
+        if elapsed_time < self.window:
+            return
+
+        throughput = (self._window_bytes / elapsed_time, self._window_requests / elapsed_time)
+        latency = None
+        if self._window_latencies:
+            latency = sum(self._window_latencies) / len(self._window_latencies)
+            if self._lowest_latency is None or latency < self._lowest_latency:
+                self._lowest_latency = latency
+
+        if latency is not None and latency > self._lowest_latency * self._latency_growth + 0.01:
+            self._change_limit(-1)
+        elif self._is_limit_used and self._is_improved(throughput):
+            self._change_limit(1)
+
+        self._start_window(throughput if any(throughput) else self._last_throughput)
+
+    def _is_improved(self, throughput):
+        if self._last_throughput is None:
+            return any(throughput)
+        return any(value > last_value * self._throughput_gain
+                   for value, last_value in zip(throughput, self._last_throughput))
+
+    def _change_limit(self, step):
+        self.limit = max(self.min_connections, min(self.limit + step, self.max_connections))
+        self._condition.notify_all()
+
+    def _start_window(self, last_throughput):
+        self._last_throughput = last_throughput
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_requests = 0
+        self._window_latencies = []
+        self._is_limit_used = self._in_flight >= self.limit
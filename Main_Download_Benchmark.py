@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: Main_Download_Benchmark.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 6:05 pm
+"""
+
+
+""" Offline download benchmark
+
+This script measures the downloader without a network. A local HTTP server, started in its own process, stands in for
+PhysioNet: it serves a synthetic nested autoindex tree (nginx 'pre' style listings, gzip encoded) with HEAD, Range,
+If-Range, ETag and Last-Modified, and its latency per request, bandwidth per connection, file size distribution and
+tree depth are configurable. The tree and the file bytes are made from a seed, so every run serves the same data.
+
+Every benchmark case downloads the whole tree in a fresh process into a temporary directory and reports files/s, MB/s,
+requests per file, the peak RSS of the downloader process and the crawl time. The downloaded files are checked for
+their sizes, so a faster but broken change does not pass as an improvement.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import ast
+import contextlib
+import gzip
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote
+import requests
+try:
+    import resource
+except ImportError:
+    # Not on Windows, the peak RSS is not measured there
+    resource = None
+
+
+""" Synthetic web directory tree
+"""
+# #%%
+# Modification time of every file and directory of the tree, fixed so the listings and validators never change
+_tree_mtime = 1600000000
+# Block the file bytes are cut from, every file starts at its own offset of it
+_pattern = random.Random(0).randbytes(1024 ** 2) if hasattr(random.Random, 'randbytes') else \
+    bytes(random.Random(0).getrandbits(8) for _ in range(1024 ** 2))
+
+
+def make_file_size(random_generator, size_distribution, mean_size):
+    # 'lognormal' is heavy tailed like the EEG datasets- many small annotation files and a few large recordings
+    if size_distribution == 'fixed':
+        return mean_size
+    if size_distribution == 'uniform':
+        return random_generator.randint(0, 2 * mean_size)
+    if size_distribution == 'lognormal':
+        sigma = 1.5
+        return int(random_generator.lognormvariate(0, sigma) * mean_size / 3.08)
+    if size_distribution == 'bimodal':
+        return mean_size * 19 // 10 if random_generator.random() < 0.5 else mean_size // 10
+    raise ValueError('Unknown size distribution %s' % size_distribution)
+
+
+def make_tree(depth=2, directories_per_level=3, files_per_directory=20, size_distribution='lognormal',
+              mean_size=1024 ** 2, seed=0):
+    """Synthetic tree- {directory path: (list of sub directory names, list of (file name, size))}, the paths are
+    relative to the root of the dataset ('' for the root) and end with '/'
+    """
+
+
+    random_generator = random.Random(seed)
+    tree = {}
+    directories = ['']
+    for level in range(depth + 1):
+        next_directories = []
+        for directory in directories:
+            sub_directories = []
+            if level < depth:
+                sub_directories = ['s{:02d}_{:03d}'.format(level, i) for i in range(directories_per_level)]
+            files = [('r{:04d}.edf'.format(i) if i % 4 else 'r{:04d}.txt'.format(i),
+                      make_file_size(random_generator, size_distribution, mean_size))
+                     for i in range(files_per_directory)]
+            tree[directory] = (sub_directories, files)
+            next_directories += [directory + name + '/' for name in sub_directories]
+        directories = next_directories
+    return tree
+
+
+def find_file_bytes(path, start, end):
+    # Bytes [start, end) of a file, the same on every request
+    offset = int(hashlib.md5(path.encode()).hexdigest()[:8], 16)
+    data = bytearray()
+    position = start
+    while position < end:
+        pattern_position = (offset + position) % len(_pattern)
+        length = min(end - position, len(_pattern) - pattern_position)
+        data += _pattern[pattern_position:pattern_position + length]
+        position += length
+    return bytes(data)
+
+
+""" Local HTTP stand-in server
+"""
+# #%%
+class SyntheticTreeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Keep-alive responses go out at once instead of waiting for the delayed ACK of the client (~40 ms each)
+    disable_nagle_algorithm = True
+    # Set on the subclass made by serve_tree()
+    files = {}
+    listings = {}
+    latency = 0.0
+    bandwidth = None
+    is_listing_size_shown = True
+    # Files of the tree answering with an error status instead- {path: status code}
+    failing_paths = {}
+    counters = None
+    counters_lock = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            return self._send_bytes(200, repr(dict(self.counters)).encode(), {'Content-Type': 'text/plain'}, True)
+        self._serve(True)
+
+    def _serve(self, is_body_sent):
+        with self.counters_lock:
+            self.counters[self.command] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = unquote(self.path.split('?')[0]).lstrip('/')
+        if path in self.listings:
+            return self._send_bytes(200, self.listings[path], {'Content-Type': 'text/html',
+                                                               'Content-Encoding': 'gzip'}, is_body_sent)
+        if path + '/' in self.listings:
+            return self._send_bytes(301, b'', {'Location': self.path + '/'}, is_body_sent)
+        if path in self.failing_paths:
+            return self._send_bytes(self.failing_paths[path], b'', {}, is_body_sent)
+        if path not in self.files:
+            return self._send_bytes(404, b'', {}, is_body_sent)
+
+        size = self.files[path]
+        # Every server (port) gives its own ETags, like the servers of an origin and its mirrors
+        headers = {'Content-Type': 'application/octet-stream', 'Accept-Ranges': 'bytes',
+                   'ETag': '"{:x}-{:x}-{:x}"'.format(_tree_mtime, size, self.server.server_address[1]),
+                   'Last-Modified': formatdate(_tree_mtime, usegmt=True)}
+        start, end, status_code = 0, size, 200
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if byte_range and byte_range.startswith('bytes=') and if_range in (None, headers['ETag']):
+            first, last = byte_range[6:].split(',')[0].split('-')
+            start = int(first) if first else max(0, size - int(last))
+            end = min(int(last) + 1, size) if first and last else size
+            if start >= size:
+                headers['Content-Range'] = 'bytes */{}'.format(size)
+                return self._send_bytes(416, b'', headers, is_body_sent)
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end - 1, size)
+            status_code = 206
+
+        headers['Content-Length'] = str(end - start)
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if is_body_sent:
+            self._send_file_bytes(path, start, end)
+
+    def _send_file_bytes(self, path, start, end):
+        chunk_size = 256 * 1024
+        start_time = time.monotonic()
+        # The path below the root- a file has the same bytes under every root (version) of the tree
+        relative_path = path.split('/', 1)[1]
+        for position in range(start, end, chunk_size):
+            self.wfile.write(find_file_bytes(relative_path, position, min(position + chunk_size, end)))
+            if self.bandwidth:
+                # Every connection gets the bandwidth on its own
+                wait_time = (position + chunk_size - start) / self.bandwidth - (time.monotonic() - start_time)
+                if wait_time > 0:
+                    time.sleep(wait_time)
+
+    def _send_bytes(self, status_code, data, headers, is_body_sent):
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if is_body_sent and data:
+            self.wfile.write(data)
+
+
+def make_listing(root_name, directory, sub_directories, files, is_listing_size_shown):
+    date = time.strftime('%d-%b-%Y %H:%M', time.gmtime(_tree_mtime))
+    title = '/{}/{}'.format(root_name, directory)
+    rows = ['<html><head><title>Index of {0}</title></head><body><h1>Index of {0}</h1><hr><pre>'
+            '<a href="../">../</a>'.format(title)]
+    for name in sub_directories:
+        rows.append('<a href="{0}/">{0}/</a>{1}{2}                   -'.format(name, ' ' * max(1, 50 - len(name)), date))
+    for name, size in files:
+        rows.append('<a href="{0}">{0}</a>{1}{2}  {3:>17}'.format(name, ' ' * max(1, 51 - len(name)), date,
+                                                                 size if is_listing_size_shown else '-'))
+    rows.append('</pre><hr></body></html>')
+    return gzip.compress('\n'.join(rows).encode(), mtime=0)
+
+
+def serve_tree(tree_options, root_name, latency, bandwidth, is_listing_size_shown, port_queue, failing_paths=None,
+               other_root_names=()):
+    tree = make_tree(**tree_options)
+    files, listings, root_failing_paths = {}, {}, {}
+    for name_of_root in [root_name] + list(other_root_names):
+        for directory, (sub_directories, directory_files) in tree.items():
+            listings[name_of_root + '/' + directory] = make_listing(name_of_root, directory, sub_directories,
+                                                                    directory_files, is_listing_size_shown)
+            for name, size in directory_files:
+                files[name_of_root + '/' + directory + name] = size
+        for path, status_code in (failing_paths or {}).items():
+            root_failing_paths[name_of_root + '/' + path] = status_code
+
+    handler = type('Handler', (SyntheticTreeHandler,), {
+        'files': files, 'listings': listings, 'latency': latency, 'bandwidth': bandwidth,
+        'is_listing_size_shown': is_listing_size_shown, 'counters': {'HEAD': 0, 'GET': 0},
+        'failing_paths': root_failing_paths, 'counters_lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+@contextlib.contextmanager
+def run_server(tree_options, root_name='1.0.0', latency=0.0, bandwidth=None, is_listing_size_shown=True,
+               failing_paths=None, other_root_names=()):
+    # The server runs in its own process, so its CPU time and memory are not counted for the downloader; the files of
+    # failing_paths ({path relative to the root: status code}) stay in the listings but answer with the error status,
+    # other_root_names serve the same tree again (other versions of the dataset, with the same files)
+    port_queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=serve_tree, args=(tree_options, root_name, latency, bandwidth,
+                                                                      is_listing_size_shown, port_queue,
+                                                                      failing_paths, other_root_names), daemon=True)
+    server_process.start()
+    try:
+        yield 'http://127.0.0.1:{}/{}/'.format(port_queue.get(timeout=30), root_name)
+    finally:
+        server_process.terminate()
+        server_process.join()
+
+
+def read_server_stats(url):
+    # Requests served so far- {'HEAD': int, 'GET': int}
+    server_url = '/'.join(url.split('/')[:3])
+    return ast.literal_eval(requests.get(server_url + '/__stats').text)
+
+
+""" Benchmark of one download
+"""
+# #%%
+def run_download(url, download_options, result_queue):
+    from DIHC_Downloader import DIHC_Downloader
+
+    class TimedDownloader(DIHC_Downloader):
+        crawl_time = None
+
+        def crawl(self, *args, **kwargs):
+            start_time = time.perf_counter()
+            manifest = super().crawl(*args, **kwargs)
+            self.crawl_time = time.perf_counter() - start_time
+            return manifest
+
+    download_directory = tempfile.mkdtemp(prefix='dihc_benchmark_')
+    try:
+        root_name = url.rstrip('/').split('/')[-1]
+        downloader = TimedDownloader(url, download_directory=download_directory, folder_indicator=[root_name],
+                                     **download_options)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            start_time = time.perf_counter()
+            downloader.download()
+            elapsed_time = time.perf_counter() - start_time
+
+        downloaded_sizes = {}
+        for directory, _, filenames in os.walk(download_directory):
+            for filename in filenames:
+                path = os.path.relpath(os.path.join(directory, filename), download_directory).replace('\\', '/')
+                downloaded_sizes[path] = os.path.getsize(os.path.join(directory, filename))
+
+        peak_rss = None
+        if resource is not None:
+            # Kilobytes on Linux, bytes on macOS
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if os.uname().sysname == 'Darwin'
+                                                                            else 1024)
+        result_queue.put({'elapsed_time': elapsed_time, 'crawl_time': downloader.crawl_time,
+                          'downloaded_sizes': downloaded_sizes, 'peak_rss': peak_rss})
+    finally:
+        shutil.rmtree(download_directory, ignore_errors=True)
+
+
+def run_case(tree_options, download_options, latency=0.0, bandwidth=None, is_listing_size_shown=True):
+    """Downloads the synthetic tree once in a fresh process
+
+    Returns
+    -------
+    dict
+        {'files', 'bytes', 'elapsed_time', 'crawl_time', 'files_per_second', 'mb_per_second', 'requests_per_file',
+        'peak_rss', 'missing_files'}
+    """
+
+
+    root_name = '1.0.0'
+    tree = make_tree(**tree_options)
+    expected_sizes = {root_name + '/' + directory + name: size
+                      for directory, (_, files) in tree.items() for name, size in files}
+
+    with run_server(tree_options, root_name, latency, bandwidth, is_listing_size_shown) as url:
+        stats_before = read_server_stats(url)
+        result_queue = multiprocessing.Queue()
+        download_process = multiprocessing.Process(target=run_download, args=(url, download_options, result_queue))
+        download_process.start()
+        result = result_queue.get()
+        download_process.join()
+        stats_after = read_server_stats(url)
+
+    # The stats request itself is not counted
+    number_of_requests = sum(stats_after.values()) - sum(stats_before.values()) - 1
+    total_size = sum(expected_sizes.values())
+    missing_files = [path for path, size in expected_sizes.items() if result['downloaded_sizes'].get(path) != size]
+    return {'files': len(expected_sizes), 'bytes': total_size, 'elapsed_time': result['elapsed_time'],
+            'crawl_time': result['crawl_time'], 'files_per_second': len(expected_sizes) / result['elapsed_time'],
+            'mb_per_second': total_size / 1024 ** 2 / result['elapsed_time'],
+            'requests_per_file': number_of_requests / max(1, len(expected_sizes)), 'peak_rss': result['peak_rss'],
+            'missing_files': missing_files}
+
+
+""" Benchmark cases
+"""
+# #%%
+# Name, tree options, download options, server latency (s), server bandwidth per connection (bytes/s), listing sizes
+DEFAULT_CASES = [
+    ('many small files', dict(depth=2, directories_per_level=4, files_per_directory=40, size_distribution='fixed',
+                              mean_size=16 * 1024), dict(max_workers=8), 0.005, None, True),
+    ('no sizes in listings', dict(depth=2, directories_per_level=4, files_per_directory=40, size_distribution='fixed',
+                                  mean_size=16 * 1024), dict(max_workers=8), 0.005, None, False),
+    ('eeg like sizes', dict(depth=2, directories_per_level=3, files_per_directory=12, size_distribution='lognormal',
+                            mean_size=2 * 1024 ** 2), dict(max_workers=4), 0.02, 20 * 1024 ** 2, True),
+    ('few large files', dict(depth=1, directories_per_level=2, files_per_directory=2, size_distribution='fixed',
+                             mean_size=64 * 1024 ** 2), dict(max_workers=2, segments=4,
+                                                             segment_threshold=16 * 1024 ** 2), 0.02,
+     10 * 1024 ** 2, True),
+]
+
+
+def run_benchmark(cases=DEFAULT_CASES, repeats=1):
+    print('{:<24}{:>8}{:>10}{:>10}{:>10}{:>10}{:>12}{:>12}{:>10}'.format('case', 'files', 'MB', 'time (s)',
+                                                                      'files/s', 'MB/s', 'req/file', 'crawl (s)',
+                                                                      'RSS (MB)'))
+    results = []
+    for name, tree_options, download_options, latency, bandwidth, is_listing_size_shown in cases:
+        case_results = [run_case(tree_options, download_options, latency, bandwidth, is_listing_size_shown)
+                        for _ in range(repeats)]
+        # The fastest run is the least disturbed by the rest of the machine
+        result = min(case_results, key=lambda case_result: case_result['elapsed_time'])
+        results.append((name, result))
+        print('{:<24}{:>8}{:>10.1f}{:>10.2f}{:>10.1f}{:>10.2f}{:>12.2f}{:>12.2f}{:>10}'.format(
+            name, result['files'], result['bytes'] / 1024 ** 2, result['elapsed_time'], result['files_per_second'],
+            result['mb_per_second'], result['requests_per_file'], result['crawl_time'] or 0,
+            '{:.1f}'.format(result['peak_rss'] / 1024 ** 2) if result['peak_rss'] else '-'))
+        if result['missing_files']:
+            print('@@@ {} files missing or of the wrong size in case {}'.format(len(result['missing_files']), name))
+    return results
+
+
+""" Start benchmarking
+"""
+# #%%
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: Main_Listing_Parser_Benchmark.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 1:15 pm
+"""
+
+
+""" Directory listing parser benchmark
+
+This script builds large synthetic autoindex pages (nginx/Apache 'pre' style and Apache 'table' style) and times the
+listing parsers of DIHC_Listing_Parser on them. The page is fed in chunks, as it arrives from the server, and the peak
+memory of each parser is measured with tracemalloc. Both parsers must find the same entries.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import random
+import time
+import tracemalloc
+from DIHC_Listing_Parser import LISTING_PARSERS
+
+
+""" Synthetic listing pages
+"""
+# #%%
+def make_pre_listing(number_of_entries, seed=0):
+    random_generator = random.Random(seed)
+    rows = ['<html><head><title>Index of /files/</title></head><body><h1>Index of /files/</h1><hr><pre>'
+            '<a href="../">../</a>']
+    for i in range(number_of_entries):
+        date = '{:02d}-Oct-2020 {:02d}:{:02d}'.format(random_generator.randint(1, 28), random_generator.randint(0, 23),
+                                                      random_generator.randint(0, 59))
+        if i % 50 == 0:
+            name = 'chb{:05d}/'.format(i)
+            rows.append('<a href="{0}">{0}</a>{1}{2}                   -'.format(name, ' ' * (51 - len(name)), date))
+        else:
+            name = 'chb_{:05d}_{:02d}.edf'.format(i // 50, i % 50)
+            rows.append('<a href="{0}">{0}</a>{1}{2}  {3:>17}'.format(name, ' ' * (51 - len(name)), date,
+                                                                     random_generator.randint(1, 500 * 1024 ** 2)))
+    rows.append('</pre><hr></body></html>')
+    return '\n'.join(rows)
+
+
+def make_table_listing(number_of_entries, seed=0):
+    random_generator = random.Random(seed)
+    rows = ['<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 3.2 Final//EN"><html><head><title>Index of /files</title></head>'
+            '<body><h1>Index of /files</h1><table>',
+            '<tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th><th><a href="?C=N;O=D">Name</a></th>'
+            '<th><a href="?C=M;O=A">Last modified</a></th><th><a href="?C=S;O=A">Size</a></th></tr>',
+            '<tr><td valign="top"><img src="/icons/back.gif" alt="[PARENTDIR]"></td><td><a href="/files/">Parent '
+            'Directory</a></td><td>&nbsp;</td><td align="right">  - </td></tr>']
+    for i in range(number_of_entries):
+        date = '2020-10-{:02d} {:02d}:{:02d}'.format(random_generator.randint(1, 28), random_generator.randint(0, 23),
+                                                     random_generator.randint(0, 59))
+        if i % 50 == 0:
+            name, size, icon = 'tuh{:05d}/'.format(i), '  - ', 'folder'
+        else:
+            name, size, icon = 'tuh_{:05d}_{:02d}.edf'.format(i // 50, i % 50), str(random_generator.randint(1, 1023)), \
+                               'unknown'
+        rows.append('<tr><td valign="top"><img src="/icons/{0}.gif" alt="[   ]"></td><td><a href="{1}">{1}</a></td>'
+                    '<td align="right">{2}  </td><td align="right">{3}</td><td>&nbsp;</td></tr>'.format(icon, name,
+                                                                                                     date, size))
+    rows.append('</table></body></html>')
+    return '\n'.join(rows)
+
+
+""" Benchmark of one parser on one page
+"""
+# #%%
+def run_parser(parser_class, web_page, chunk_size=64 * 1024):
+    start_time = time.perf_counter()
+
+    listing_parser = parser_class()
+    for i in range(0, len(web_page), chunk_size):
+        listing_parser.feed(web_page[i:i + chunk_size])
+    entries = listing_parser.close()
+
+    return entries, time.perf_counter() - start_time
+
+
+def measure_peak_memory(parser_class, web_page):
+    # Tracing slows the parsers down, so the memory is measured in its own run
+    tracemalloc.start()
+    run_parser(parser_class, web_page)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_memory
+
+
+def run_benchmark(sizes=(1000, 5000, 20000), repeats=3):
+    print('{:<8}{:>10}{:>10}{:>12}{:>16}{:>14}'.format('style', 'entries', 'parser', 'time (ms)', 'entries/s',
+                                                       'peak (MB)'))
+    for style, make_listing in (('pre', make_pre_listing), ('table', make_table_listing)):
+        for number_of_entries in sizes:
+            web_page = make_listing(number_of_entries)
+            results = {}
+            for name in ('soup', 'stream'):
+                timings = []
+                for _ in range(repeats):
+                    entries, elapsed_time = run_parser(LISTING_PARSERS[name], web_page)
+                    timings.append(elapsed_time)
+                results[name] = entries
+                elapsed_time = min(timings)
+                peak_memory = measure_peak_memory(LISTING_PARSERS[name], web_page)
+                print('{:<8}{:>10}{:>10}{:>12.1f}{:>16.0f}{:>14.2f}'.format(style, len(entries), name,
+                                                                          elapsed_time * 1000,
+                                                                          len(entries) / elapsed_time,
+                                                                          peak_memory / 1024 ** 2))
+            if results['soup'] != results['stream']:
+                print('@@@ The parsers found different entries for the {} page of {} entries'.format(style,
+                                                                                                  number_of_entries))
+
+
+""" Start benchmarking
+"""
+# #%%
+if __name__ == '__main__':
+    run_benchmark()
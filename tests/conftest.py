@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: conftest.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Test settings
+
+The modules of the downloader are at the top of the repository, next to the Main_ scripts.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_content_store.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the content store of the downloader
+
+Two versions of a dataset served by the local stand-in server of the benchmark share all their files; their listings
+give the size and modification time of every file but no ETag.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import os
+import stat
+from DIHC_Content_Store import ContentStore
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, find_file_bytes
+
+
+tree_options = {'depth': 1, 'directories_per_level': 2, 'files_per_directory': 3, 'size_distribution': 'fixed',
+                'mean_size': 5000}
+
+
+def download_version(url, version, tmp_path, store):
+    downloader = DIHC_Downloader(url.replace('1.0.0', version), download_directory=str(tmp_path),
+                                 folder_indicator=[version], progress=None, content_store=store)
+    downloader.download()
+    return downloader
+
+
+def test_second_version_is_hardlinked_from_the_store(tmp_path):
+    store = ContentStore(str(tmp_path / 'store'))
+    with run_server(tree_options, other_root_names=['1.0.1']) as url:
+        download_version(url, '1.0.0', tmp_path, store)
+        requests_before = read_server_stats(url)
+        download_version(url, '1.0.1', tmp_path, store)
+        requests_after = read_server_stats(url)
+    store.close()
+
+    # ### Only the listings of the second version are requested, its files are linked
+    assert requests_after['GET'] - requests_before['GET'] == 3
+    paths = [os.path.relpath(os.path.join(directory, name), str(tmp_path / '1.0.0'))
+             for directory, _, names in os.walk(str(tmp_path / '1.0.0')) for name in names]
+    assert len(paths) == 9
+    for path in paths:
+        filename = tmp_path / '1.0.1' / path
+        assert os.path.samefile(str(filename), str(tmp_path / '1.0.0' / path))
+        assert filename.read_bytes() == find_file_bytes(path, 0, 5000)
+
+
+def test_objects_are_read_only(tmp_path):
+    filename = tmp_path / 'a.edf'
+    filename.write_bytes(b'aaa')
+    store = ContentStore(str(tmp_path / 'store'), link_mode='copy')
+    object_id = store.add(['sha256:a'], str(filename))
+
+    object_filename = store._get_object_filename(object_id)
+    assert not os.stat(object_filename).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    # ### A copy stays writable and independent of the object
+    assert os.access(str(filename), os.W_OK)
+    filename.write_bytes(b'bbb')
+    with open(object_filename, 'rb') as f:
+        assert f.read() == b'aaa'
+    store.close()
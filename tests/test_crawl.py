@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_crawl.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the crawl of the web directory
+
+The tree is served by the local stand-in server of the benchmark, 3 levels of directories with 3 files in each.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import json
+import os
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, make_tree
+
+
+tree_options = {'depth': 2, 'directories_per_level': 2, 'files_per_directory': 3, 'size_distribution': 'uniform',
+                'mean_size': 1000}
+
+
+def make_downloader(url, tmp_path, crawl_workers):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           crawl_workers=crawl_workers, use_index=False)
+
+
+def test_crawl_saves_the_manifest_without_downloading(tmp_path):
+    with run_server(tree_options) as url:
+        manifest = make_downloader(url, tmp_path, 4).crawl()
+        stats = read_server_stats(url)
+
+    expected_sizes = {'1.0.0/' + directory + name: size
+                      for directory, (_, files) in make_tree(**tree_options).items() for name, size in files}
+    assert {entry['path']: entry['size'] for entry in manifest} == expected_sizes
+    assert [entry['path'] for entry in manifest] == sorted(expected_sizes)
+    assert all(entry['url'] == url + entry['path'][len('1.0.0/'):] for entry in manifest)
+    # One HEAD for the root url and one listing per directory, the files are known from the listing columns
+    assert stats == {'HEAD': 1, 'GET': 7}
+
+    with open(str(tmp_path / 'dihc_manifest.json')) as f:
+        assert json.load(f) == {'url_to_download': url, 'files': manifest}
+    assert os.listdir(str(tmp_path)) == ['dihc_manifest.json']
+
+
+def test_files_are_found_breadth_first(tmp_path):
+    with run_server(tree_options) as url:
+        paths = [entry['path'] for entry in make_downloader(url, tmp_path, 1).iter_remote_entries()]
+
+    depths = [path.count('/') for path in paths]
+    assert len(paths) == 21
+    assert depths == sorted(depths)
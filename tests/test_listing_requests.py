@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_listing_requests.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the requests a download costs- the urls are classified from the listing columns and a second run checks
+the listings against the index
+
+The tree is served by the local stand-in server of the benchmark, 3 directories with 4 files in each.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, make_tree
+
+
+tree_options = {'depth': 1, 'directories_per_level': 2, 'files_per_directory': 4, 'size_distribution': 'uniform',
+                'mean_size': 1000}
+
+
+def download(url, tmp_path):
+    DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None).download()
+
+
+def check_files(tmp_path):
+    for directory, (_, files) in make_tree(**tree_options).items():
+        for name, size in files:
+            assert (tmp_path / '1.0.0' / (directory + name)).stat().st_size == size
+
+
+def test_files_are_not_sent_a_head_request(tmp_path):
+    # The listing has no size column, its date column tells the files
+    with run_server(tree_options, is_listing_size_shown=False) as url:
+        download(url, tmp_path)
+        stats = read_server_stats(url)
+
+    check_files(tmp_path)
+    # One HEAD for the root url, 3 listings and one GET per file
+    assert stats == {'HEAD': 1, 'GET': 3 + 12}
+
+
+def test_second_run_requests_only_the_listings(tmp_path):
+    with run_server(tree_options) as url:
+        download(url, tmp_path)
+        first_stats = read_server_stats(url)
+        download(url, tmp_path)
+        second_stats = read_server_stats(url)
+
+    check_files(tmp_path)
+    # ### Unchanged listings (same digest as in the index), the complete files need no request
+    assert second_stats == {'HEAD': first_stats['HEAD'], 'GET': first_stats['GET'] + 3}
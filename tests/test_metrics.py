@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_metrics.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the metrics of the downloader
+
+A request that raises is counted with status 'error' next to the numeric status codes of the others.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+from DIHC_Metrics import DIHC_Metrics
+
+
+def test_snapshot_with_int_and_error_status_labels():
+    metrics = DIHC_Metrics()
+    for status in (200, 'error', 206):
+        metrics.increment('dihc_requests_total', type='file', status=status)
+        metrics.set_gauge('dihc_last_status', 1, status=status)
+        metrics.observe('dihc_request_seconds', 0.01, status=status)
+
+    series = metrics.snapshot()
+    counters = [item for item in series if item['name'] == 'dihc_requests_total']
+    assert [item['labels']['status'] for item in counters] == [200, 206, 'error']
+    assert len(series) == 9
+    assert 'dihc_requests_total{status="error",type="file"} 1' in metrics.to_prometheus()
+    assert len(metrics.to_json_lines().splitlines()) == 9
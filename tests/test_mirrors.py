@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_mirrors.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the downloads spread over an origin and its mirrors
+
+The origin and the mirror are two local stand-in servers of the benchmark serving the same tree, each one with its own
+ETags.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import requests
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, find_file_bytes
+
+
+tree_options = {'depth': 0, 'directories_per_level': 0, 'files_per_directory': 8, 'size_distribution': 'fixed',
+                'mean_size': 200000}
+
+
+def make_downloader(url, mirror_url, tmp_path):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           max_workers=4, retry_base_delay=0.01, mirrors=[mirror_url])
+
+
+def check_files(tmp_path):
+    for i in range(8):
+        name = 'r{:04d}.{}'.format(i, 'edf' if i % 4 else 'txt')
+        assert (tmp_path / '1.0.0' / name).read_bytes() == find_file_bytes(name, 0, 200000)
+
+
+def test_files_are_spread_over_the_mirrors(tmp_path):
+    with run_server(tree_options) as url, run_server(tree_options) as mirror_url:
+        make_downloader(url, mirror_url, tmp_path).download()
+        origin_stats, mirror_stats = read_server_stats(url), read_server_stats(mirror_url)
+
+    check_files(tmp_path)
+    # The listing comes from the origin, the files from both
+    assert origin_stats['GET'] > 1 and mirror_stats['GET'] > 0
+
+
+def test_failing_mirror_is_skipped(tmp_path):
+    failing_paths = {'r{:04d}.{}'.format(i, 'edf' if i % 4 else 'txt'): 503 for i in range(8)}
+    with run_server(tree_options) as url, run_server(tree_options, failing_paths=failing_paths) as mirror_url:
+        downloader = make_downloader(url, mirror_url, tmp_path)
+        downloader.download()
+
+    check_files(tmp_path)
+    assert downloader.given_up == []
+    assert downloader._mirror_pool.get_stats()[mirror_url.rstrip('/')]['received_bytes'] == 0
+
+
+def test_resume_validated_by_the_mirror_the_bytes_came_from(tmp_path):
+    # ### The first half of the file came from the mirror (its bytes are zeros here, so a resume keeps them), the
+    # ### mirror does not answer any more and the origin sends the rest
+    with run_server(tree_options) as url, \
+            run_server(tree_options, failing_paths={'r0001.edf': 503}) as mirror_url:
+        downloader = make_downloader(url, mirror_url, tmp_path)
+        tmp_filename = str(tmp_path / '1.0.0' / 'r0001.edf.tmp')
+        (tmp_path / '1.0.0').mkdir()
+        with open(tmp_filename, 'wb') as f:
+            f.write(bytes(100000))
+        # The files of the tree have the same size and mtime, so the same ETag on one server
+        mirror_etag = requests.head(mirror_url + 'r0000.txt').headers['ETag']
+        downloader._save_partial_state(tmp_filename, {'size': 200000, 'etag': mirror_etag, 'last_modified': None,
+                                                      'segments': None, 'mirror': mirror_url.rstrip('/')})
+        downloader.download()
+
+    data = (tmp_path / '1.0.0' / 'r0001.edf').read_bytes()
+    assert data[:100000] == bytes(100000)
+    assert data[100000:] == find_file_bytes('r0001.edf', 100000, 200000)
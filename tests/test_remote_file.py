@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_remote_file.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the remote files opened without downloading them
+
+One 1 MB file is served by the local stand-in server of the benchmark and read in blocks of 64 KB.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, find_file_bytes
+
+
+file_size = 1024 ** 2
+block_size = 64 * 1024
+tree_options = {'depth': 0, 'directories_per_level': 0, 'files_per_directory': 1, 'size_distribution': 'fixed',
+                'mean_size': file_size}
+
+
+def make_downloader(url, tmp_path):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None)
+
+
+def test_random_reads_fetch_only_their_blocks(tmp_path):
+    with run_server(tree_options) as url:
+        with make_downloader(url, tmp_path).open('r0000.txt', block_size=block_size) as f:
+            assert f.size == file_size
+            f.seek(500000)
+            data = f.read(100)
+            f.seek(-10, 2)
+            end_data = f.read()
+        stats = read_server_stats(url)
+
+    assert data == find_file_bytes('r0000.txt', 500000, 500100)
+    assert end_data == find_file_bytes('r0000.txt', file_size - 10, file_size)
+    # One block for each read
+    assert stats['GET'] == 2
+
+
+def test_sequential_reads_fetch_the_next_blocks_ahead(tmp_path):
+    with run_server(tree_options) as url:
+        with make_downloader(url, tmp_path).open(url + 'r0000.txt', block_size=block_size) as f:
+            data = b''.join(iter(lambda: f.read(10000), b''))
+        stats = read_server_stats(url)
+
+    assert data == find_file_bytes('r0000.txt', 0, file_size)
+    # ### 16 blocks in windows of 1, 2, 4 and 8 blocks, and the last one
+    assert stats['GET'] == 5
+
+
+def test_blocks_are_read_again_from_the_cache(tmp_path):
+    with run_server(tree_options) as url:
+        with make_downloader(url, tmp_path).open('r0000.txt', block_size=block_size) as f:
+            f.read(3 * block_size)
+        stats = read_server_stats(url)
+
+        # A new object reads the blocks from the cache on the disk, only the HEAD of the file is sent
+        with make_downloader(url, tmp_path).open('r0000.txt', block_size=block_size) as f:
+            data = f.read(3 * block_size)
+        second_stats = read_server_stats(url)
+
+    assert data == find_file_bytes('r0000.txt', 0, 3 * block_size)
+    assert second_stats['GET'] == stats['GET']
+    assert second_stats['HEAD'] == stats['HEAD'] + 1
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_resume.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the resume of partial downloads with Range and If-Range
+
+The bytes already in a .tmp file are zeros here, so a resume keeps them and a download of the whole file replaces them
+with the bytes served by the local stand-in server of the benchmark.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import requests
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, find_file_bytes
+
+
+file_size = 200000
+tree_options = {'depth': 0, 'directories_per_level': 0, 'files_per_directory': 1, 'size_distribution': 'fixed',
+                'mean_size': file_size}
+
+
+def download_with_tmp_file(tmp_path, tmp_size, etag):
+    # Runs a download with a .tmp file of tmp_size zeros, saved with the given ETag (None- the one of the server)
+    with run_server(tree_options) as url:
+        downloader = DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'],
+                                     progress=None)
+        tmp_filename = str(tmp_path / '1.0.0' / 'r0000.txt.tmp')
+        (tmp_path / '1.0.0').mkdir()
+        with open(tmp_filename, 'wb') as f:
+            f.write(bytes(tmp_size))
+        downloader._save_partial_state(tmp_filename, {
+            'size': file_size, 'etag': etag or requests.head(url + 'r0000.txt').headers['ETag'],
+            'last_modified': None, 'segments': None})
+        downloader.download()
+        stats = read_server_stats(url)
+    return (tmp_path / '1.0.0' / 'r0000.txt').read_bytes(), stats
+
+
+def test_same_version_is_resumed(tmp_path):
+    data, _ = download_with_tmp_file(tmp_path, 50000, None)
+
+    assert data[:50000] == bytes(50000)
+    assert data[50000:] == find_file_bytes('r0000.txt', 50000, file_size)
+
+
+def test_changed_file_is_downloaded_whole(tmp_path):
+    # ### The server has another version than the .tmp file, If-Range gets the whole file back
+    data, stats = download_with_tmp_file(tmp_path, 50000, '"other-version"')
+
+    assert data == find_file_bytes('r0000.txt', 0, file_size)
+    assert stats['GET'] == 1 + 1
+
+
+def test_complete_tmp_file_needs_no_request(tmp_path):
+    data, stats = download_with_tmp_file(tmp_path, file_size, None)
+
+    assert data == bytes(file_size)
+    # The listing only (the ETag was read by a HEAD before the download)
+    assert stats == {'HEAD': 2, 'GET': 1}
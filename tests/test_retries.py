@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_retries.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the retries of failed downloads
+
+The files are served by the local stand-in server of the benchmark; some of them stay in the listing but answer with
+an error status.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+from DIHC_Downloader import DIHC_Downloader
+from DIHC_Metrics import DIHC_Metrics
+from Main_Download_Benchmark import run_server, read_server_stats
+
+
+tree_options = {'depth': 0, 'directories_per_level': 0, 'files_per_directory': 8, 'size_distribution': 'fixed',
+                'mean_size': 1000}
+
+
+def make_downloader(url, tmp_path):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           max_retries=2, retry_base_delay=0.01, metrics=DIHC_Metrics())
+
+
+def find_counter(downloader, name):
+    return sum(series['value'] for series in downloader.metrics.snapshot() if series['name'] == name)
+
+
+def test_missing_files_are_not_retried(tmp_path):
+    # ### More missing files than the failures that open the circuit breaker of the host
+    missing_names = ['r{:04d}.edf'.format(i) for i in (1, 2, 3, 5, 6, 7)]
+    with run_server(tree_options, failing_paths={name: 404 for name in missing_names}) as url:
+        downloader = make_downloader(url, tmp_path)
+        downloader.download()
+        stats = read_server_stats(url)
+
+    # One listing and one GET per file
+    assert stats['GET'] == 1 + 8
+    assert find_counter(downloader, 'dihc_retries_total') == 0
+    assert downloader.given_up == []
+    assert [downloader._download_results[url + name] for name in missing_names] == [0] * len(missing_names)
+    assert downloader._download_results[url + 'r0000.txt'] == 1
+    assert downloader._get_circuit_breaker(url).is_allowed()
+    assert (tmp_path / '1.0.0' / 'r0004.txt').stat().st_size == 1000
+
+
+def test_server_errors_are_retried(tmp_path):
+    with run_server(tree_options, failing_paths={'r0001.edf': 503}) as url:
+        downloader = make_downloader(url, tmp_path)
+        downloader.download()
+        stats = read_server_stats(url)
+
+    assert stats['GET'] == 1 + 8 + downloader.max_retries
+    assert find_counter(downloader, 'dihc_retries_total') == downloader.max_retries
+    assert downloader.given_up == [{'url': url + 'r0001.edf', 'kind': 'file', 'attempts': downloader.max_retries + 1}]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_scheduler.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the order the files are downloaded in
+
+The tree is served by the local stand-in server of the benchmark, 3 directories with 4 files of different sizes in
+each; one download worker lands the files in the order they are handed to it.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import os
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, make_tree
+
+
+tree_options = {'depth': 1, 'directories_per_level': 2, 'files_per_directory': 4, 'size_distribution': 'uniform',
+                'mean_size': 1000}
+file_sizes = {directory + name: size for directory, (_, files) in make_tree(**tree_options).items()
+              for name, size in files}
+
+
+def download_in_order(url, tmp_path, **options):
+    tmp_path.mkdir(exist_ok=True)
+    downloader = DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                                 **options)
+    root_directory = str(tmp_path / '1.0.0') + os.sep
+    paths = [filename[len(root_directory):].replace(os.sep, '/')
+             for filename in downloader.iter_downloads(max_workers=1)]
+    return paths, downloader.schedule_estimate
+
+
+def test_largest_and_smallest_files_first(tmp_path):
+    with run_server(tree_options) as url:
+        largest_paths, _ = download_in_order(url, tmp_path / 'largest', schedule='largest_first')
+        smallest_paths, _ = download_in_order(url, tmp_path / 'smallest', schedule='smallest_first')
+
+    assert largest_paths == sorted(file_sizes, key=lambda path: -file_sizes[path])
+    assert smallest_paths == sorted(file_sizes, key=lambda path: file_sizes[path])
+
+
+def test_directory_priorities_go_before_the_schedule(tmp_path):
+    with run_server(tree_options) as url:
+        paths, _ = download_in_order(url, tmp_path, schedule='largest_first',
+                                     directory_priorities={'s00_001/**': -1, '*.txt': 1})
+
+    def priority(path):
+        return -1 if path.startswith('s00_001/') else (1 if '/' not in path and path.endswith('.txt') else 0)
+    assert paths == sorted(file_sizes, key=lambda path: (priority(path), -file_sizes[path]))
+
+
+def test_schedule_estimate_of_the_order(tmp_path):
+    with run_server(tree_options) as url:
+        _, estimate = download_in_order(url, tmp_path, schedule='largest_first')
+
+    # ### One worker downloads the bytes one after the other, a perfect balance
+    assert estimate['makespan'] == sum(file_sizes.values())
+    assert estimate['efficiency'] == 1.0
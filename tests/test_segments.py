@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_segments.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the segmented downloads of large files
+
+One 32 MB file is served by the local stand-in server of the benchmark and downloaded in 4 byte range segments.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import requests
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, find_file_bytes
+
+
+file_size = 32 * 1024 ** 2
+segment_size = file_size // 4
+tree_options = {'depth': 0, 'directories_per_level': 0, 'files_per_directory': 1, 'size_distribution': 'fixed',
+                'mean_size': file_size}
+
+
+def make_downloader(url, tmp_path):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           segments=4, segment_threshold=16 * 1024 ** 2)
+
+
+def test_large_file_is_downloaded_in_segments(tmp_path):
+    with run_server(tree_options) as url:
+        make_downloader(url, tmp_path).download()
+        stats = read_server_stats(url)
+
+    assert (tmp_path / '1.0.0' / 'r0000.txt').read_bytes() == find_file_bytes('r0000.txt', 0, file_size)
+    # One listing and one GET per segment
+    assert stats['GET'] == 1 + 4
+
+
+def test_interrupted_segments_resume_from_their_state(tmp_path):
+    with run_server(tree_options) as url:
+        downloader = make_downloader(url, tmp_path)
+        # ### The first segment is complete (zeros here, so a resume keeps them), the others not started
+        tmp_filename = str(tmp_path / '1.0.0' / 'r0000.txt.tmp')
+        (tmp_path / '1.0.0').mkdir()
+        with open(tmp_filename, 'wb') as f:
+            f.truncate(file_size)
+        headers = requests.head(url + 'r0000.txt').headers
+        segments = [[start, start + segment_size - 1, segment_size if start == 0 else 0]
+                    for start in range(0, file_size, segment_size)]
+        downloader._save_partial_state(tmp_filename, {'size': file_size, 'etag': headers['ETag'],
+                                                      'last_modified': headers['Last-Modified'],
+                                                      'segments': segments})
+        downloader.download()
+        stats = read_server_stats(url)
+
+    data = (tmp_path / '1.0.0' / 'r0000.txt').read_bytes()
+    assert data[:segment_size] == bytes(segment_size)
+    assert data[segment_size:] == find_file_bytes('r0000.txt', segment_size, file_size)
+    assert stats['GET'] == 1 + 3
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_shards.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the sharded downloads and their merge
+
+Every shard downloads its part of a tree served by the local stand-in server of the benchmark into the same
+directory, as separate processes or machines would.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import json
+from DIHC_Downloader import DIHC_Downloader
+from Main_Download_Benchmark import run_server, read_server_stats, make_tree
+
+
+tree_options = {'depth': 1, 'directories_per_level': 2, 'files_per_directory': 4, 'size_distribution': 'uniform',
+                'mean_size': 1000}
+
+
+def make_downloader(url, tmp_path, shard_index=0, num_shards=1, shard_by='hash'):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           shard_index=shard_index, num_shards=num_shards, shard_by=shard_by)
+
+
+def check_files(tmp_path):
+    for directory, (_, files) in make_tree(**tree_options).items():
+        for name, size in files:
+            assert (tmp_path / '1.0.0' / (directory + name)).stat().st_size == size
+
+
+def test_shards_download_every_file_once(tmp_path):
+    for shard_by in ('hash', 'size'):
+        directory = tmp_path / shard_by
+        directory.mkdir()
+        with run_server(tree_options) as url:
+            for shard_index in range(3):
+                make_downloader(url, directory, shard_index, 3, shard_by).download()
+            stats = read_server_stats(url)
+
+        check_files(directory)
+        # Every shard reads the 3 listings, the 12 files are requested once in all
+        assert stats['GET'] == 3 * 3 + 12
+
+
+def test_merge_shards(tmp_path):
+    with run_server(tree_options) as url:
+        for shard_index in range(2):
+            make_downloader(url, tmp_path, shard_index, 3).download()
+        summary = make_downloader(url, tmp_path, 0, 3).merge_shards()
+        assert summary['missing_shards'] == [2]
+
+        make_downloader(url, tmp_path, 2, 3).download()
+        summary = make_downloader(url, tmp_path, 0, 3).merge_shards()
+        stats = read_server_stats(url)
+
+        # ### The merged index lets an unsharded run skip every file
+        make_downloader(url, tmp_path).download()
+        resync_stats = read_server_stats(url)
+
+    assert summary == {'num_shards': 3, 'missing_shards': [], 'files': 12, 'complete': 12, 'failed': []}
+    with open(str(tmp_path / 'dihc_manifest.json')) as f:
+        assert len(json.load(f)['files']) == 12
+    assert resync_stats['GET'] - stats['GET'] == 3
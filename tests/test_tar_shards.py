@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: test_tar_shards.py
+Author: WWM Emran (Emran Ali)
+Involvement: HumachLab (HML) & Deakin- Innovation in Healthcare (DIHC)
+Email: wwm.emran@gmail.com, emran.ali@research.deakin.edu.au
+Date: 17/10/2026 11:58 pm
+"""
+
+
+""" Tests of the tar output of the downloads
+
+The tree is served by the local stand-in server of the benchmark, 3 directories with 4 files of 5000 bytes in each,
+and its files are appended to tar shards of 30000 bytes at most.
+"""
+
+
+
+""" Importing necessary modules
+"""
+# #%%
+import os
+import tarfile
+from DIHC_Downloader import DIHC_Downloader
+from DIHC_Tar_Shards import TarShardReader
+from Main_Download_Benchmark import run_server, read_server_stats, make_tree, find_file_bytes
+
+
+file_size = 5000
+tree_options = {'depth': 1, 'directories_per_level': 2, 'files_per_directory': 4, 'size_distribution': 'fixed',
+                'mean_size': file_size}
+
+
+def make_downloader(url, tmp_path):
+    return DIHC_Downloader(url, download_directory=str(tmp_path), folder_indicator=['1.0.0'], progress=None,
+                           output_format='tar', tar_shard_size=30000)
+
+
+def get_relative_paths():
+    return sorted(directory + name for directory, (_, files) in make_tree(**tree_options).items()
+                  for name, _ in files)
+
+
+def test_files_are_appended_to_tar_shards(tmp_path):
+    with run_server(tree_options) as url:
+        make_downloader(url, tmp_path).download()
+
+    reader = TarShardReader(str(tmp_path))
+    assert reader.paths() == ['1.0.0/' + path for path in get_relative_paths()]
+    for path in get_relative_paths():
+        assert reader.read('1.0.0/' + path) == find_file_bytes(path, 0, file_size)
+    assert not os.path.exists(str(tmp_path / '1.0.0'))
+
+    # ### Every shard is a plain tar file under the shard size, with the members at their indexed offsets
+    shard_filenames = sorted({member['shard'] for member in reader.members.values()})
+    assert len(shard_filenames) > 1
+    for shard_filename in shard_filenames:
+        assert os.path.getsize(str(tmp_path / shard_filename)) <= 30000
+        with tarfile.open(str(tmp_path / shard_filename)) as tar_file:
+            for tar_info in tar_file.getmembers():
+                member = reader.members[tar_info.name]
+                assert (member['shard'], member['offset'], member['size']) == (shard_filename, tar_info.offset_data,
+                                                                               file_size)
+
+
+def test_second_run_skips_the_files_in_the_shards(tmp_path):
+    with run_server(tree_options) as url:
+        make_downloader(url, tmp_path).download()
+        first_stats = read_server_stats(url)
+        make_downloader(url, tmp_path).download()
+        second_stats = read_server_stats(url)
+
+    assert second_stats['GET'] - first_stats['GET'] == 3
+    assert len(TarShardReader(str(tmp_path)).paths()) == 12
+
+
+def test_large_files_are_saved_as_files(tmp_path):
+    with run_server(tree_options) as url:
+        downloader = make_downloader(url, tmp_path)
+        downloader.tar_member_max_size = file_size - 1
+        downloader.download()
+
+    assert TarShardReader(str(tmp_path)).paths() == []
+    for path in get_relative_paths():
+        assert (tmp_path / '1.0.0' / path).read_bytes() == find_file_bytes(path, 0, file_size)